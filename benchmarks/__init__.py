@@ -0,0 +1,4 @@
+"""
+Benchmarks for the NewStore Connector.
+Run a benchmark module directly, IE: `python -m benchmarks.bench_validation`
+"""
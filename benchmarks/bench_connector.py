@@ -0,0 +1,267 @@
+"""
+Throughput and latency benchmark for NewStoreConnector against a local mock server.
+
+Runs create_order, validation only, token fetch and order notes operations at
+several concurrency levels and reports operations/sec, p50/p99 latency and
+peak traced memory. Results can be saved as a baseline and later runs checked
+against it, failing when a result regresses by more than the threshold.
+
+Usage: python -m benchmarks.bench_connector [--concurrency 1 8 32] [--operations 2000]
+       [--latency 0.005] [--error-rate 0.01] [--throttle-rate 0.01]
+       [--save-baseline | --check] [--baseline benchmarks/baselines.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from .bench_validation import load_fixture
+from .mock_server import MockNewStoreServer, MockServerConnector
+
+SCENARIOS = ('validation', 'token', 'create_order', 'notes')
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+THRESHOLD = 0.2
+MEMORY_OPERATIONS = 200
+
+
+def build_operation(scenario, ns_conn):
+    """
+    Return a callable running one operation of scenario with the connector
+    """
+    payload = load_fixture('valid_order_payload.json')
+
+    if scenario == 'validation':
+        order_injection = ns_conn.order_injection
+
+        def operation(_):
+            if not order_injection.validate_create_order_payload(payload):
+                raise ValueError("Fixture payload failed validation")
+    elif scenario == 'token':
+        def operation(_):
+            ns_conn._fetch_token() # pylint: disable=protected-access
+    elif scenario == 'create_order':
+        order_injection = ns_conn.order_injection
+
+        def operation(_):
+            order_injection.create_order(payload=payload)
+    elif scenario == 'notes':
+        order_notes = ns_conn.order_notes
+
+        def operation(i):
+            order_uuid = f"order-{i}"
+            if i % 2:
+                order_notes.create_order_note(order_uuid, text="Benchmark note",
+                                              source="benchmark")
+            else:
+                order_notes.get_order_notes(order_uuid).raise_for_status()
+    else:
+        raise ValueError({"scenario": f"Unknown scenario: {scenario}"})
+
+    return operation
+
+
+def percentile(sorted_values, percent):
+    """
+    Return the nearest-rank percentile of an already sorted list
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(percent / 100 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def measure(operation, operations, concurrency):
+    """
+    Run operation operations times with concurrency threads, returning
+    throughput, latency percentiles and the number of failed operations
+    """
+    def timed(i):
+        start = time.perf_counter()
+        try:
+            operation(i)
+            failed = False
+        except Exception: # pylint: disable=broad-exception-caught
+            failed = True
+        return time.perf_counter() - start, failed
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        timings = list(executor.map(timed, range(operations)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, _ in timings)
+    return {
+        "operations": operations,
+        "errors": sum(1 for _, failed in timings if failed),
+        "per_second": operations / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000
+    }
+
+
+def measure_memory(operation, operations, concurrency):
+    """
+    Return the peak memory in KiB traced while running operation. Run apart
+    from measure() because tracing slows every allocation down.
+    """
+    tracemalloc.start()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for _ in executor.map(_ignore_errors(operation), range(operations)):
+                pass
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return peak / 1024
+
+
+def _ignore_errors(operation):
+    def run(i):
+        try:
+            operation(i)
+        except Exception: # pylint: disable=broad-exception-caught
+            pass
+    return run
+
+
+def run_benchmarks(server, scenarios, concurrency_levels, operations, **kwargs):
+    """
+    Run every scenario at every concurrency level against server.
+    Returns {"<scenario>@<concurrency>": result}
+    """
+    results = {}
+    for concurrency in concurrency_levels:
+        ns_conn = MockServerConnector(server, pool_maxsize=max(concurrency, 1),
+                                      max_retries=kwargs.get('max_retries', 0),
+                                      backoff_factor=kwargs.get('backoff_factor', 0))
+        for scenario in scenarios:
+            operation = build_operation(scenario, ns_conn)
+            # Warm up connections and caches outside of the measurement
+            measure(operation, min(concurrency * 2, operations), concurrency)
+            result = measure(operation, operations, concurrency)
+            result["peak_memory_kb"] = measure_memory(
+                operation, min(MEMORY_OPERATIONS, operations), concurrency)
+            results[f"{scenario}@{concurrency}"] = result
+
+        ns_conn.session.close()
+
+    return results
+
+
+def compare(results, baselines, threshold=THRESHOLD):
+    """
+    Return a list of regressions of results against baselines. Throughput may
+    not drop, and p99 latency and peak memory may not grow, by more than threshold.
+    """
+    regressions = []
+    for key, result in results.items():
+        baseline = baselines.get(key)
+        if baseline is None:
+            continue
+
+        if result["per_second"] < baseline["per_second"] * (1 - threshold):
+            regressions.append(f"{key}: {result['per_second']:.0f}/s is below baseline "
+                               f"{baseline['per_second']:.0f}/s")
+        for metric in ("p99_ms", "peak_memory_kb"):
+            if metric in baseline and result[metric] > baseline[metric] * (1 + threshold):
+                regressions.append(f"{key}: {metric} {result[metric]:.1f} is above baseline "
+                                   f"{baseline[metric]:.1f}")
+
+    return regressions
+
+
+def load_baselines(path):
+    """
+    Load stored baselines, returns an empty dict if there are none
+    """
+    try:
+        with open(path, "r", encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def save_baselines(path, results):
+    """
+    Store results as baselines, keeping stored baselines of other runs
+    """
+    baselines = load_baselines(path)
+    baselines.update(results)
+    with open(path, "w", encoding='utf-8') as file:
+        json.dump(baselines, file, indent=2, sort_keys=True)
+        file.write('\n')
+
+
+def print_results(results):
+    """
+    Print a table of the results
+    """
+    print(f"{'benchmark':<18} {'ops/s':>10} {'p50 ms':>9} {'p99 ms':>9} "
+          f"{'errors':>7} {'peak KiB':>9}")
+    for key, result in results.items():
+        print(f"{key:<18} {result['per_second']:>10.0f} {result['p50_ms']:>9.2f} "
+              f"{result['p99_ms']:>9.2f} {result['errors']:>7} "
+              f"{result['peak_memory_kb']:>9.0f}")
+
+
+def main(argv=None):
+    """
+    Run the benchmarks, print the results and save or check baselines.
+    Returns 1 if --check finds a regression.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--operations', type=int, default=2000,
+                        help='Operations per scenario and concurrency level')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Seconds the mock server delays every response')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='Up to this many extra seconds of random delay')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Share of requests answered with 500')
+    parser.add_argument('--throttle-rate', type=float, default=0.0,
+                        help='Share of requests answered with 429')
+    parser.add_argument('--max-retries', type=int, default=0,
+                        help='Connector retries for errors and 429s')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='Baselines file')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Store the results as the new baselines')
+    parser.add_argument('--check', action='store_true',
+                        help='Exit with 1 if a result regressed from the baselines')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help='Allowed regression from the baselines, IE: 0.2 for 20%%')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args(argv)
+
+    with MockNewStoreServer(latency=args.latency, jitter=args.jitter,
+                            error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+                            retry_after=0, seed=0) as server:
+        results = run_benchmarks(server, args.scenarios, args.concurrency, args.operations,
+                                 max_retries=args.max_retries)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_results(results)
+
+    if args.save_baseline:
+        save_baselines(args.baseline, results)
+        print(f"Baselines saved to {args.baseline}")
+
+    if args.check:
+        regressions = compare(results, load_baselines(args.baseline), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+Benchmark for fail-fast validation of invalid-heavy batches.
+
+Times validate_many over a batch where a share of the orders is invalid, with
+full validation and with fail_fast. Invalid orders have a missing required
+field, a wrong type or an error deep in an item, in equal parts. The 0% row
+shows the cost of fail_fast on valid orders, which must not exceed full.
+
+Usage: python -m benchmarks.bench_fail_fast [--orders 10000] [--invalid-share 0.9]
+"""
+import argparse
+import copy
+import time
+
+from newstore_connector.order_injection import OrderInjectionV01
+from .bench_validation import load_fixture
+
+
+def _missing_field(order):
+    del order['shop']
+
+
+def _wrong_type(order):
+    order['is_offline'] = "false"
+
+
+def _deep_error(order):
+    order['shipments'][0]['items'][0]['price']['item_tax_lines'][0]['rate'] = 2.0
+
+
+BREAKAGES = (_missing_field, _wrong_type, _deep_error)
+
+
+def build_orders(count, invalid_share):
+    """
+    Build count orders from the valid order fixture, invalid_share of them invalid
+    """
+    valid_payload = load_fixture('valid_order_payload.json')
+    invalid_every = 1 / invalid_share if invalid_share else None
+    orders = []
+    invalid = 0
+    for i in range(count):
+        order = copy.deepcopy(valid_payload)
+        order['external_id'] = f"order-{i}"
+        if invalid_every and invalid < (i + 1) / invalid_every:
+            BREAKAGES[invalid % len(BREAKAGES)](order)
+            invalid += 1
+        orders.append(order)
+
+    return orders
+
+
+def time_validation(order_injection, orders, fail_fast):
+    """
+    Return the seconds taken to validate orders in this process
+    """
+    start = time.perf_counter()
+    order_injection.validate_many(orders, workers=1, fail_fast=fail_fast)
+    return time.perf_counter() - start
+
+
+def main():
+    """
+    Run the benchmark and print the per-order cost of each mode
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--orders', type=int, default=10000,
+                        help='Number of orders in the batch')
+    parser.add_argument('--invalid-share', type=float, nargs='+', default=[0.0, 0.5, 0.9],
+                        help='Shares of invalid orders to benchmark')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of runs, the fastest run is reported')
+    args = parser.parse_args()
+
+    order_injection = OrderInjectionV01()
+    print(f"{'invalid':>8} {'full':>14} {'fail_fast':>14} {'speedup':>9}")
+    for share in args.invalid_share:
+        orders = build_orders(args.orders, share)
+        full, fail_fast = (
+            min(time_validation(order_injection, orders, mode) for _ in range(args.repeat))
+            / args.orders * 1e6
+            for mode in (False, True))
+        print(f"{share:>8.0%} {full:>9.1f} us/op {fail_fast:>9.1f} us/op {full / fail_fast:>8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
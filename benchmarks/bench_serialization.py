@@ -0,0 +1,111 @@
+"""
+Benchmark for create_order request body serialization on large orders.
+
+Compares the body encoding of the previous path (requests serializing the dict
+with the standard library json module on every send) against
+serialization.dumps (orjson when installed) and gzip compressed bodies, then
+times create_order end to end against the mock server with a dict, with
+pre-serialized bytes and with compression.
+
+Usage: python -m benchmarks.bench_serialization [--attributes 100] [--value-size 8192]
+       [--orders 200] [--compress-threshold 65536]
+"""
+import argparse
+import copy
+import json
+import timeit
+
+from newstore_connector import serialization
+from .bench_validation import load_fixture
+from .mock_server import MockNewStoreServer, MockServerConnector
+
+
+def build_large_order(attributes, value_size):
+    """
+    Build an order from the valid fixture with extended attributes at the order
+    and item level
+    """
+    order = copy.deepcopy(load_fixture('valid_order_payload.json'))
+    extended_attributes = [{"name": f"attribute_{i}", "value": f"{i:04d}" * (value_size // 4)}
+                           for i in range(attributes)]
+    order['extended_attributes'] = extended_attributes
+    for shipment in order.get('shipments', []):
+        for item in shipment.get('items', []):
+            item['extended_attributes'] = copy.deepcopy(extended_attributes[:10])
+
+    return order
+
+
+def stdlib_body(payload):
+    """
+    Encode the body the way requests does for json=payload
+    """
+    return json.dumps(payload, allow_nan=False).encode('utf-8')
+
+
+def time_encoders(order, compress_threshold, number):
+    """
+    Return [(name, microseconds per body, body bytes)] for each encoder
+    """
+    encoders = [
+        ("stdlib json (previous)", lambda: stdlib_body(order)),
+        (f"dumps ({'orjson' if serialization.orjson else 'stdlib'})",
+         lambda: serialization.dumps(order)),
+        ("dumps + gzip", lambda: serialization.encode_body(
+            order, compress_threshold=compress_threshold)[0]),
+    ]
+    return [(name, timeit.timeit(encode, number=number) / number * 1e6, len(encode()))
+            for name, encode in encoders]
+
+
+def time_create_order(order, orders, compress_threshold):
+    """
+    Return [(name, microseconds per create_order)] against the mock server
+    """
+    body = serialization.dumps(order)
+    results = []
+    with MockNewStoreServer() as server:
+        for name, payload, threshold in (("dict", order, None),
+                                         ("pre-serialized bytes", body, None),
+                                         ("dict + gzip", order, compress_threshold)):
+            ns_conn = MockServerConnector(server, compress_threshold=threshold)
+            order_injection = ns_conn.order_injection
+
+            def send(payload=payload, order_injection=order_injection):
+                order_injection.create_order(payload=payload, skip_validation=True)
+
+            send()
+            results.append((name, timeit.timeit(send, number=orders) / orders * 1e6))
+            ns_conn.session.close()
+
+    return results
+
+
+def main():
+    """
+    Run the benchmark and print the timings
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--attributes', type=int, default=100,
+                        help='Extended attributes on the order')
+    parser.add_argument('--value-size', type=int, default=8192,
+                        help='Characters in each extended attribute value')
+    parser.add_argument('--orders', type=int, default=200,
+                        help='Orders encoded and sent per measurement')
+    parser.add_argument('--compress-threshold', type=int, default=64 * 1024,
+                        help='Bytes from which bodies are gzipped')
+    args = parser.parse_args()
+
+    order = build_large_order(args.attributes, args.value_size)
+
+    print("Body encoding")
+    for name, micros, size in time_encoders(order, args.compress_threshold, args.orders):
+        print(f"  {name:<24} {micros:>10.1f} us/order {size:>10} bytes")
+
+    print("create_order against the mock server, validation skipped")
+    for name, micros in time_create_order(order, args.orders, args.compress_threshold):
+        print(f"  {name:<24} {micros:>10.1f} us/order")
+
+
+if __name__ == '__main__':
+    main()
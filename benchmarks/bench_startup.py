@@ -0,0 +1,193 @@
+"""
+Startup benchmark for NewStoreConnector: import time, construction and first call latency.
+
+Imports are timed in fresh interpreters, so nothing is cached by earlier runs,
+and the heavy modules each import loaded are listed. Connectors are created
+against a local mock server with every auth_mode, timing the constructor and
+the first create_order, which waits for the token when it was not fetched yet.
+Results can be saved as a baseline and later runs checked against it like
+bench_connector.
+
+Usage: python -m benchmarks.bench_startup [--runs 10] [--latency 0.005] [--idle 0.05]
+       [--save-baseline | --check] [--baseline benchmarks/baselines.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from newstore_connector.ns_connector import AUTH_EAGER, AUTH_LAZY, AUTH_BACKGROUND
+
+from .bench_connector import BASELINE_PATH, THRESHOLD, load_baselines, save_baselines
+from .bench_validation import load_fixture
+from .mock_server import MockNewStoreServer, MockServerConnector
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORTS = {
+    "package": "import newstore_connector",
+    "validation": "from newstore_connector.order_injection import OrderInjectionV01",
+    "connector": "from newstore_connector import NewStoreConnector"
+}
+HEAVY_MODULES = ('requests', 'urllib3', 'httpx', 'asyncio', 'sqlite3', 'api_toolkit.connector')
+AUTH_MODES = (AUTH_EAGER, AUTH_LAZY, AUTH_BACKGROUND)
+
+_IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+{statement}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds,
+                   "loaded": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+def measure_import(statement, runs):
+    """
+    Run statement in runs fresh interpreters, returning the median time it
+    took and the heavy modules it loaded
+    """
+    script = _IMPORT_SCRIPT.format(statement=statement, heavy=HEAVY_MODULES)
+    timings = []
+    loaded = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", script], cwd=ROOT, check=True,
+                                capture_output=True, text=True).stdout
+        result = json.loads(output)
+        timings.append(result["seconds"])
+        loaded = result["loaded"]
+
+    return {"median_ms": statistics.median(timings) * 1000, "loaded": loaded}
+
+
+def measure_first_call(server, auth_mode, runs, idle=0.0):
+    """
+    Create runs connectors with auth_mode and send one create_order with each,
+    idle seconds after construction, IE: the rest of an application starting.
+    Returns the median construction, first call and total times.
+    """
+    payload = load_fixture('valid_order_payload.json')
+    constructs, first_calls, totals = [], [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        ns_conn = MockServerConnector(server, auth_mode=auth_mode)
+        constructed = time.perf_counter()
+        if idle:
+            time.sleep(idle)
+        called = time.perf_counter()
+        ns_conn.order_injection.create_order(payload=payload)
+        done = time.perf_counter()
+        ns_conn.session.close()
+
+        constructs.append(constructed - start)
+        first_calls.append(done - called)
+        totals.append(done - start - idle)
+
+    return {
+        "construct_ms": statistics.median(constructs) * 1000,
+        "first_call_ms": statistics.median(first_calls) * 1000,
+        "total_ms": statistics.median(totals) * 1000
+    }
+
+
+def run_benchmarks(server, runs, idle=0.0):
+    """
+    Time every import and auth_mode. Returns {"startup:<name>": result}
+    """
+    results = {}
+    for name, statement in IMPORTS.items():
+        results[f"startup:import:{name}"] = measure_import(statement, runs)
+
+    for auth_mode in AUTH_MODES:
+        results[f"startup:{auth_mode}"] = measure_first_call(server, auth_mode, runs, idle)
+
+    return results
+
+
+def compare(results, baselines, threshold=THRESHOLD):
+    """
+    Return a list of regressions of results against baselines. No time may
+    grow by more than threshold, and an import may not load more heavy modules.
+    """
+    regressions = []
+    for key, result in results.items():
+        baseline = baselines.get(key)
+        if baseline is None:
+            continue
+
+        for metric, value in result.items():
+            if metric.endswith("_ms") and metric in baseline and \
+                    value > baseline[metric] * (1 + threshold):
+                regressions.append(f"{key}: {metric} {value:.1f} is above baseline "
+                                   f"{baseline[metric]:.1f}")
+        added = set(result.get("loaded", ())) - set(baseline.get("loaded", ()))
+        if added:
+            regressions.append(f"{key}: now loads {', '.join(sorted(added))}")
+
+    return regressions
+
+
+def print_results(results):
+    """
+    Print a table of the results
+    """
+    print(f"{'import':<12} {'median ms':>10}  loads")
+    for name in IMPORTS:
+        result = results[f"startup:import:{name}"]
+        print(f"{name:<12} {result['median_ms']:>10.1f}  {', '.join(result['loaded']) or '-'}")
+
+    print(f"\n{'auth_mode':<12} {'construct ms':>13} {'first call ms':>14} {'total ms':>9}")
+    for auth_mode in AUTH_MODES:
+        result = results[f"startup:{auth_mode}"]
+        print(f"{auth_mode:<12} {result['construct_ms']:>13.2f} "
+              f"{result['first_call_ms']:>14.2f} {result['total_ms']:>9.2f}")
+
+
+def main(argv=None):
+    """
+    Run the benchmark, print the results and save or check baselines.
+    Returns 1 if --check finds a regression.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--runs', type=int, default=10,
+                        help='Interpreters and connectors timed, the median is reported')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Seconds the mock server delays every response')
+    parser.add_argument('--idle', type=float, default=0.0,
+                        help='Seconds between creating a connector and its first call')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='Baselines file')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Store the results as the new baselines')
+    parser.add_argument('--check', action='store_true',
+                        help='Exit with 1 if a result regressed from the baselines')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help='Allowed regression from the baselines, IE: 0.2 for 20%%')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args(argv)
+
+    with MockNewStoreServer(latency=args.latency, seed=0) as server:
+        results = run_benchmarks(server, args.runs, args.idle)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_results(results)
+
+    if args.save_baseline:
+        save_baselines(args.baseline, results)
+        print(f"Baselines saved to {args.baseline}")
+
+    if args.check:
+        regressions = compare(results, load_baselines(args.baseline), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""
+Benchmark for multi-process validation with OrderInjectionV01.validate_many.
+
+Times validation of batches of different sizes in a single process and across
+worker processes, to find the batch size where the process pool starts to win.
+
+Usage: python -m benchmarks.bench_validate_many [--sizes 1000 10000 100000] [--workers 2 4 8]
+"""
+import argparse
+import copy
+import json
+import os
+import time
+
+from newstore_connector.order_injection import OrderInjectionV01
+from .bench_validation import load_fixture
+
+
+def build_orders(count):
+    """
+    Build count orders from the valid order fixture, every tenth one invalid
+    """
+    valid_payload = load_fixture('valid_order_payload.json')
+    invalid_payload = load_fixture('invalid_order_payload.json')
+    orders = []
+    for i in range(count):
+        order = copy.deepcopy(invalid_payload if i % 10 == 0 else valid_payload)
+        order['external_id'] = f"order-{i}"
+        orders.append(order)
+
+    return orders
+
+
+def time_validation(order_injection, orders, workers, chunksize):
+    """
+    Return the seconds taken to validate orders with the given number of workers
+    """
+    start = time.perf_counter()
+    order_injection.validate_many(orders, workers=workers, chunksize=chunksize)
+    return time.perf_counter() - start
+
+
+def main():
+    """
+    Run the benchmark and print a table of orders/sec per batch size and workers
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='Batch sizes to validate')
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({2, 4, os.cpu_count() or 1} - {1}),
+                        help='Worker process counts to compare with a single process')
+    parser.add_argument('--chunksize', type=int, default=256,
+                        help='Payloads sent to a worker at a time')
+    parser.add_argument('--json', action='store_true',
+                        help='Pass payloads as JSON text instead of dicts')
+    args = parser.parse_args()
+
+    order_injection = OrderInjectionV01()
+    worker_counts = [1] + args.workers
+    print(f"{'orders':>8} " + " ".join(f"{f'{w} proc':>12}" for w in worker_counts))
+    for size in args.sizes:
+        orders = build_orders(size)
+        if args.json:
+            orders = [json.dumps(order) for order in orders]
+        rates = [size / time_validation(order_injection, orders, workers, args.chunksize)
+                 for workers in worker_counts]
+        best = worker_counts[rates.index(max(rates))]
+        print(f"{size:>8} " + " ".join(f"{rate:>10.0f}/s" for rate in rates) +
+              f"   fastest: {best} proc")
+
+
+if __name__ == '__main__':
+    main()
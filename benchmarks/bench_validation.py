@@ -0,0 +1,89 @@
+"""
+Micro-benchmark for create_order payload validation.
+
+Compares the per-order cost of validating with a freshly built ruleset tree
+(the behaviour before rulesets were cached) against the cached ruleset tree,
+and the cached tree with repeated sub-documents memoized.
+
+Usage: python -m benchmarks.bench_validation [--orders N]
+"""
+import argparse
+import json
+import os
+import timeit
+
+from newstore_connector.order_injection import OrderInjectionV01
+from newstore_connector.order_injection.order_injection_0_1 import clear_validation_cache
+from newstore_connector.validation_cache import (enable_subdocument_cache,
+                                                 disable_subdocument_cache)
+
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             'tests', 'test_order_injection', 'fixtures')
+
+
+def load_fixture(name):
+    """
+    Load a json fixture from the order injection tests
+    """
+    with open(os.path.join(FIXTURES_PATH, name), "r", encoding='utf-8') as file:
+        return json.load(file)
+
+
+def validate_uncached(order_injection, payload):
+    """
+    Validate a payload after dropping the cached rulesets, so the whole tree is
+    rebuilt the way it was on every call before caching
+    """
+    clear_validation_cache()
+    return bool(order_injection.validate_create_order_payload(payload))
+
+
+def validate_cached(order_injection, payload):
+    """
+    Validate a payload with the cached rulesets
+    """
+    return bool(order_injection.validate_create_order_payload(payload))
+
+
+def validate_memoized(order_injection, payload):
+    """
+    Validate a payload with the cached rulesets and the sub-document cache.
+    The addresses, shipping options and tax lines of the fixture repeat on
+    every call, as they do across orders from the same customers and shops.
+    """
+    return bool(order_injection.validate_create_order_payload(payload))
+
+
+def main():
+    """
+    Run the benchmark and print the per-order cost of each path
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--orders', type=int, default=2000,
+                        help='Number of orders to validate per run')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of runs, the fastest run is reported')
+    args = parser.parse_args()
+
+    order_injection = OrderInjectionV01()
+    for fixture in ('valid_order_payload.json', 'invalid_order_payload.json'):
+        payload = load_fixture(fixture)
+        results = {}
+        for name, func in (('uncached', validate_uncached), ('cached', validate_cached),
+                           ('memoized', validate_memoized)):
+            if func is validate_memoized:
+                enable_subdocument_cache()
+            timer = timeit.Timer(lambda func=func: func(order_injection, payload))
+            best = min(timer.repeat(repeat=args.repeat, number=args.orders))
+            results[name] = best / args.orders * 1e6
+            disable_subdocument_cache()
+
+        print(f"{fixture}:")
+        for name, per_order in results.items():
+            print(f"  {name:<10} {per_order:10.1f} us/order")
+        print(f"  speedup    {results['uncached'] / results['cached']:10.2f}x")
+        print(f"  memoized   {results['cached'] / results['memoized']:10.2f}x faster than cached")
+
+
+if __name__ == '__main__':
+    main()
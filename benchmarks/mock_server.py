@@ -0,0 +1,187 @@
+"""
+Local in-process stand-in for the NewStore API used by the benchmarks.
+
+Serves the token endpoint, order injection and order notes with configurable
+latency, and can answer a share of requests with errors or 429s so retries
+and rate limiting can be measured without a real tenant.
+"""
+import gzip
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from newstore_connector import NewStoreConnector
+
+TOKEN_PATH = re.compile(r'^/auth/realms/(?P<tenant>[^/]+)/protocol/openid-connect/token$')
+NOTES_PATH = re.compile(r'^/v0/d/orders/(?P<order_uuid>[^/]+)(/items/[^/]+)?/notes$')
+NOTE_PATH = re.compile(r'^/v0/d/orders/(?P<order_uuid>[^/]+)/notes/(?P<note_uuid>[^/]+)$')
+
+
+class MockNewStoreServer:
+    """
+    Threaded HTTP server on a free local port answering like NewStore.
+    Args:
+        latency(float): (optional) Seconds every response is delayed
+        jitter(float): (optional) Up to this many extra seconds, chosen at random
+        error_rate(float): (optional) Share of API requests answered with 500
+        throttle_rate(float): (optional) Share of API requests answered with 429
+        retry_after(int): (optional) Retry-After header sent with 429s
+        token_ttl(int): (optional) expires_in of the issued tokens
+        seed(int): (optional) Seed for the error, throttle and jitter choices
+    Counts of the responses sent are kept in `counts` by status code.
+    """
+
+    def __init__(self, **kwargs):
+        self.latency = kwargs.get('latency', 0.0)
+        self.jitter = kwargs.get('jitter', 0.0)
+        self.error_rate = kwargs.get('error_rate', 0.0)
+        self.throttle_rate = kwargs.get('throttle_rate', 0.0)
+        self.retry_after = kwargs.get('retry_after')
+        self.token_ttl = kwargs.get('token_ttl', 3600)
+        self.counts = {}
+        self._random = random.Random(kwargs.get('seed'))
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._build_request_handler())
+        self._server.daemon_threads = True
+        self._server.request_queue_size = 128
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        """
+        Base URL of the running server, with the trailing slash NewStore URLs have
+        """
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def auth_url(self, tenant):
+        """
+        URL of the token endpoint for tenant
+        """
+        return f"{self.base_url}auth/realms/{tenant}/protocol/openid-connect/token"
+
+    def reset_counts(self):
+        """
+        Clear the response counts
+        """
+        with self._lock:
+            self.counts = {}
+
+    def respond(self, method, path, body):
+        """
+        Return (status_code, headers, json_body) for a request
+        """
+        path = re.sub('/+', '/', path.split('?')[0])
+
+        if method == "POST" and TOKEN_PATH.match(path):
+            return 200, {}, {"access_token": uuid.uuid4().hex,
+                             "expires_in": self.token_ttl,
+                             "scope": "iam:providers:read"}
+
+        with self._lock:
+            roll = self._random.random()
+        if roll < self.throttle_rate:
+            headers = {}
+            if self.retry_after is not None:
+                headers['Retry-After'] = str(self.retry_after)
+            return 429, headers, {"message": "Too Many Requests"}
+        if roll < self.throttle_rate + self.error_rate:
+            return 500, {}, {"message": "Internal Server Error"}
+
+        if method == "POST" and path == "/v0/d/fulfill_order":
+            payload = json.loads(body or b'{}')
+            return 200, {}, {"id": str(uuid.uuid4()),
+                             "external_id": payload.get("external_id")}
+
+        match = NOTES_PATH.match(path)
+        if match and method == "GET":
+            return 200, {}, {"notes": [{"id": str(uuid.uuid4()),
+                                        "text": "Benchmark note",
+                                        "source": "benchmark",
+                                        "tags": []}]}
+        if match and method == "POST":
+            return 201, {}, {"id": str(uuid.uuid4())}
+
+        if NOTE_PATH.match(path) and method in ("PATCH", "DELETE"):
+            return 200, {}, {}
+
+        return 404, {}, {"message": "Not Found"}
+
+    def _delay(self):
+        if not self.latency and not self.jitter:
+            return
+        with self._lock:
+            extra = self._random.uniform(0, self.jitter) if self.jitter else 0.0
+        time.sleep(self.latency + extra)
+
+    def _build_request_handler(self):
+        mock = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            """
+            Answer every request with MockNewStoreServer.respond
+            """
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately, without this every
+            # response waits on the delayed ACK of the client
+            disable_nagle_algorithm = True
+
+            def _respond(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                if self.headers.get('Content-Encoding') == 'gzip':
+                    body = gzip.decompress(body)
+
+                status_code, headers, response_body = mock.respond(self.command,
+                                                                   self.path, body)
+                mock._delay() # pylint: disable=protected-access
+                with mock._lock: # pylint: disable=protected-access
+                    mock.counts[status_code] = mock.counts.get(status_code, 0) + 1
+
+                data = json.dumps(response_body).encode('utf-8')
+                self.send_response(status_code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PATCH = do_DELETE = _respond
+
+            def log_message(self, *args): # pylint: disable=arguments-differ
+                pass
+
+        return RequestHandler
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class MockServerConnector(NewStoreConnector):
+    """
+    NewStoreConnector sending its token and API requests to a MockNewStoreServer
+    """
+
+    def __init__(self, mock_server, **kwargs):
+        # Set before NewStoreConnector.__init__ fetches the first token
+        self.mock_server = mock_server
+        kwargs.setdefault("tenant", "benchmark")
+        if not kwargs.get("token"):
+            kwargs.setdefault("client_id", "benchmark")
+            kwargs.setdefault("client_secret", "benchmark")
+        super().__init__(**kwargs)
+        self._base_url = mock_server.base_url
+
+    def _auth_request(self):
+        _, headers, payload = super()._auth_request()
+        return self.mock_server.auth_url(self.tenant), headers, payload
@@ -0,0 +1,199 @@
+"""
+Replay traffic recorded with newstore_connector.recorder.TrafficRecorder
+against a local mock NewStore server.
+
+Calls are sent with create_order and the order notes methods at the pace they
+were recorded, sped up by --speed, from --concurrency threads. Reports
+throughput, the latency distribution per endpoint, and how far calls fell
+behind their schedule because every thread was busy.
+
+Usage: python -m benchmarks.replay traffic.ndjson.gz [--speed 1] [--concurrency 16]
+       [--latency 0.005] [--error-rate 0.01] [--json]
+"""
+import argparse
+import json
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from newstore_connector.recorder import load_traffic
+
+from .bench_connector import percentile
+from .bench_validation import load_fixture
+from .mock_server import MockNewStoreServer, MockServerConnector
+
+NOTES_PATH = re.compile(r'/orders/(?P<order_uuid>[^/]+)(/items/(?P<item_uuid>[^/]+))?'
+                        r'/notes(/(?P<note_uuid>[^/]+))?$')
+ENDPOINTS = ('create_order', 'get_order_notes', 'create_order_note', 'create_item_note',
+             'update_note', 'delete_note')
+
+
+def build_call(record, ns_conn, payload):
+    """
+    Return a callable making the API call of record with the connector, or
+    None if the record can't be replayed. payload is sent for orders recorded
+    without their body.
+    """
+    endpoint = record["endpoint"]
+    body = record.get("body")
+    if endpoint == 'create_order':
+        if body is None:
+            return lambda: ns_conn.order_injection.create_order(payload=payload)
+        # Redacted orders keep their shape but not valid values
+        skip_validation = record.get("redacted", False)
+        return lambda: ns_conn.order_injection.create_order(payload=body,
+                                                            skip_validation=skip_validation)
+
+    match = NOTES_PATH.search(record.get("path") or "")
+    if endpoint not in ENDPOINTS or match is None:
+        return None
+
+    order_notes = ns_conn.order_notes
+    order_uuid, item_uuid, note_uuid = match.group('order_uuid', 'item_uuid', 'note_uuid')
+    note = body if isinstance(body, dict) else {"text": "Replayed note", "source": "replay",
+                                                "tags": ["replay"]}
+    if endpoint == 'get_order_notes':
+        return lambda: order_notes.get_order_notes(order_uuid)
+    if endpoint == 'create_order_note':
+        return lambda: order_notes.create_order_note(order_uuid, **note)
+    if endpoint == 'create_item_note':
+        return lambda: order_notes.create_item_note(order_uuid, item_uuid, **note)
+    if endpoint == 'update_note':
+        return lambda: order_notes.update_note(order_uuid, note_uuid, **note)
+    return lambda: order_notes.delete_note(order_uuid, note_uuid)
+
+
+def replay(records, ns_conn, speed=1.0, concurrency=16):
+    """
+    Replay records with the connector. A speed of 2 sends calls twice as
+    fast as recorded, 0 sends them as fast as the threads allow.
+    Returns the report of replay_report
+    """
+    payload = load_fixture('valid_order_payload.json')
+    calls = [(record, build_call(record, ns_conn, payload)) for record in records]
+    skipped = sum(1 for _, call in calls if call is None)
+    calls = [(record, call) for record, call in calls if call is not None]
+
+    lock = threading.Lock()
+    results = []
+    first = calls[0][0]["start"] if calls else 0.0
+
+    def run(record, call, due):
+        sent = time.perf_counter()
+        try:
+            response = call()
+            status = getattr(response, 'status_code', None)
+        except Exception as error: # pylint: disable=broad-exception-caught
+            response = getattr(error, 'response', None)
+            status = getattr(response, 'status_code', None) or type(error).__name__
+        latency = time.perf_counter() - sent
+        with lock:
+            results.append((record["endpoint"], latency, max(sent - due, 0.0), status))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for record, call in calls:
+            due = start + (record["start"] - first) / speed if speed else start
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(run, record, call, due)
+    elapsed = time.perf_counter() - start
+
+    return replay_report(results, elapsed, skipped)
+
+
+def _distribution(latencies):
+    latencies = sorted(latencies)
+    return {
+        "calls": len(latencies),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p90_ms": percentile(latencies, 90) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": (latencies[-1] if latencies else 0.0) * 1000
+    }
+
+
+def replay_report(results, elapsed, skipped=0):
+    """
+    Summarize the (endpoint, latency, lag, status) of replayed calls
+    """
+    endpoints = {}
+    statuses = {}
+    for endpoint, latency, _, status in results:
+        endpoints.setdefault(endpoint, []).append(latency)
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    report = _distribution([latency for _, latency, _, _ in results])
+    report.update({
+        "skipped": skipped,
+        "seconds": elapsed,
+        "per_second": len(results) / elapsed if elapsed else 0.0,
+        "lag_p99_ms": percentile(sorted(lag for _, _, lag, _ in results), 99) * 1000,
+        "statuses": statuses,
+        "endpoints": {endpoint: _distribution(latencies)
+                      for endpoint, latencies in sorted(endpoints.items())}
+    })
+    return report
+
+
+def print_report(report):
+    """
+    Print the report as a table
+    """
+    print(f"{report['calls']} calls in {report['seconds']:.2f}s, "
+          f"{report['per_second']:.0f}/s, {report['skipped']} skipped, "
+          f"p99 schedule lag {report['lag_p99_ms']:.1f} ms")
+    print(f"statuses: {report['statuses']}")
+    print(f"{'endpoint':<18} {'calls':>7} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} "
+          f"{'max ms':>9}")
+    for endpoint, result in [("all", report)] + list(report["endpoints"].items()):
+        print(f"{endpoint:<18} {result['calls']:>7} {result['p50_ms']:>9.2f} "
+              f"{result['p90_ms']:>9.2f} {result['p99_ms']:>9.2f} {result['max_ms']:>9.2f}")
+
+
+def main(argv=None):
+    """
+    Replay a recording against the mock server and print the report
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('recording', help='File written by TrafficRecorder')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='Replay this many times faster than recorded, 0 for '
+                             'as fast as possible. Default: 1')
+    parser.add_argument('--concurrency', type=int, default=16,
+                        help='Threads sending calls. Default: 16')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Seconds the mock server delays every response')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='Up to this many extra seconds of random delay')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Share of requests answered with 500')
+    parser.add_argument('--throttle-rate', type=float, default=0.0,
+                        help='Share of requests answered with 429')
+    parser.add_argument('--max-retries', type=int, default=0,
+                        help='Connector retries for errors and 429s')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args(argv)
+
+    records = load_traffic(args.recording)
+    with MockNewStoreServer(latency=args.latency, jitter=args.jitter,
+                            error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+                            retry_after=0, seed=0) as server:
+        ns_conn = MockServerConnector(server, pool_maxsize=max(args.concurrency, 1),
+                                      max_retries=args.max_retries, backoff_factor=0)
+        report = replay(records, ns_conn, args.speed, args.concurrency)
+        ns_conn.session.close()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
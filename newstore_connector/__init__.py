@@ -1,4 +1,29 @@
 """
 Classes and functionality for interacting with thte NewStore REST API
+
+The connectors are imported on first use, so importing a submodule, IE: to
+validate orders with newstore_connector.order_injection, does not load the
+HTTP clients.
 """
-from .ns_connector import NewStoreConnector
+import importlib
+
+_EXPORTS = {
+    "NewStoreConnector": ".ns_connector",
+    "AsyncNewStoreConnector": ".ns_async_connector",
+    "NewStoreConnectorRegistry": ".registry"
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,263 @@
+"""
+Module for running many NewStore API calls concurrently over a shared session,
+and CPU bound work such as validation across processes
+"""
+import collections
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from .circuit_breaker import CircuitOpenError
+from .deadline import DeadlineExceeded
+
+
+def bounded_map(func, items, max_in_flight):
+    """
+    Call func on every item using a thread pool, with at most max_in_flight
+    calls running at once. Items are pulled from the iterable only as workers
+    free up, so memory stays flat for long or lazy iterables.
+    Yields (item, future) pairs in the order the calls complete.
+    """
+    if max_in_flight < 1:
+        raise ValueError({"max_in_flight": "Must be greater than or equal to 1"})
+
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        in_flight = {}
+        for item in items:
+            in_flight[executor.submit(func, item)] = item
+            if len(in_flight) >= max_in_flight:
+                break
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield in_flight.pop(future), future
+
+            # Refill the pool with as many items as completed
+            for item in items:
+                in_flight[executor.submit(func, item)] = item
+                if len(in_flight) >= max_in_flight:
+                    break
+
+
+async def async_bounded_map(func, items, max_in_flight):
+    """
+    Asyncio counterpart of bounded_map. Awaits func(item) for every item with
+    at most max_in_flight coroutines running at once.
+    Yields (item, task) pairs in the order the calls complete.
+    """
+    if max_in_flight < 1:
+        raise ValueError({"max_in_flight": "Must be greater than or equal to 1"})
+
+    # asyncio is only loaded by async callers, the sync API classes import
+    # this module too
+    import asyncio # pylint: disable=import-outside-toplevel
+
+    items = iter(items)
+    in_flight = {}
+    try:
+        for item in items:
+            in_flight[asyncio.ensure_future(func(item))] = item
+            if len(in_flight) >= max_in_flight:
+                break
+
+        while in_flight:
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield in_flight.pop(task), task
+
+            for item in items:
+                in_flight[asyncio.ensure_future(func(item))] = item
+                if len(in_flight) >= max_in_flight:
+                    break
+    finally:
+        # Cancel outstanding calls if the consumer stops early
+        for task in in_flight:
+            task.cancel()
+
+
+def chunked(items, size):
+    """
+    Yield lists of up to size items from an iterable
+    """
+    items = iter(items)
+    chunk = list(itertools.islice(items, size))
+    while chunk:
+        yield chunk
+        chunk = list(itertools.islice(items, size))
+
+
+def process_map(func, items, workers, chunksize):
+    """
+    Call func on chunks of chunksize items in a pool of worker processes.
+    func takes a list of items and returns a list of results. Results are
+    yielded one per item, in input order. Only a few chunks per worker are
+    pulled from items at a time, so memory stays flat for lazy iterables.
+    """
+    from concurrent.futures import ProcessPoolExecutor # pylint: disable=import-outside-toplevel
+
+    max_pending = workers * 2
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = collections.deque()
+        for chunk in chunked(items, chunksize):
+            pending.append(executor.submit(func, chunk))
+            if len(pending) >= max_pending:
+                yield from pending.popleft().result()
+
+        while pending:
+            yield from pending.popleft().result()
+
+
+def error_details(error):
+    """
+    Convert an exception raised by an API call into a structured error dict
+    """
+    # requests and httpx status errors both carry the response
+    response = getattr(error, "response", None)
+    if response is not None and hasattr(response, "status_code"):
+        return {
+            "type": "http",
+            "status_code": response.status_code,
+            "message": response.text
+        }
+    if isinstance(error, ValueError) and error.args and isinstance(error.args[0], dict):
+        return {
+            "type": "validation",
+            "errors": error.args[0]
+        }
+    if isinstance(error, CircuitOpenError):
+        return {
+            "type": "circuit_open",
+            "endpoint": error.endpoint,
+            "message": str(error)
+        }
+    if isinstance(error, DeadlineExceeded):
+        return {
+            "type": "deadline",
+            "phase": error.phase,
+            "phases": error.phases,
+            "message": str(error)
+        }
+
+    return {
+        "type": "exception",
+        "exception": type(error).__name__,
+        "message": str(error)
+    }
+
+
+def order_result(payload, future):
+    """
+    Build the result dict for an order from the completed future that injected it
+    """
+    if isinstance(payload, dict):
+        external_id = payload.get("external_id")
+    else:
+        # Order models carry it as an attribute, serialized orders are not decoded
+        external_id = getattr(payload, "external_id", None)
+    try:
+        return {
+            "external_id": external_id,
+            "success": True,
+            "response": future.result()
+        }
+    except Exception as error: # pylint: disable=broad-exception-caught
+        return {
+            "external_id": external_id,
+            "success": False,
+            "error": error_details(error)
+        }
+
+
+class BulkStats:
+    """
+    Running counts and throughput for a bulk operation
+    """
+
+    def __init__(self):
+        self.succeeded = 0
+        self.failed = 0
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def completed(self):
+        """
+        Total number of operations that have finished, successfully or not
+        """
+        return self.succeeded + self.failed
+
+    @property
+    def elapsed(self):
+        """
+        Seconds since the operation started, or its total run time once finished
+        """
+        if self.started_at is None:
+            return 0.0
+
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    @property
+    def per_second(self):
+        """
+        Completed operations per second
+        """
+        elapsed = self.elapsed
+        return self.completed / elapsed if elapsed else 0.0
+
+    def as_dict(self):
+        """
+        Return the stats as a dictionary
+        """
+        return {
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "completed": self.completed,
+            "elapsed": self.elapsed,
+            "per_second": self.per_second
+        }
+
+
+class BulkResults:
+    """
+    Iterable of per-item results from a bulk operation. Results are produced
+    lazily as they complete, and `stats` is updated as they are consumed.
+    """
+
+    def __init__(self, results):
+        self._results = results
+        self.stats = BulkStats()
+
+    def __iter__(self):
+        self.stats.started_at = time.perf_counter()
+        try:
+            for result in self._results:
+                if result.get("success"):
+                    self.stats.succeeded += 1
+                else:
+                    self.stats.failed += 1
+                yield result
+        finally:
+            self.stats.finished_at = time.perf_counter()
+
+
+class AsyncBulkResults(BulkResults):
+    """
+    Async iterable of per-item results from a bulk operation
+    """
+
+    def __iter__(self):
+        raise TypeError("AsyncBulkResults must be iterated with 'async for'")
+
+    async def __aiter__(self):
+        self.stats.started_at = time.perf_counter()
+        try:
+            async for result in self._results:
+                if result.get("success"):
+                    self.stats.succeeded += 1
+                else:
+                    self.stats.failed += 1
+                yield result
+        finally:
+            self.stats.finished_at = time.perf_counter()
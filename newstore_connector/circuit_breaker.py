@@ -0,0 +1,263 @@
+"""
+Module for failing fast on NewStore API endpoints that keep failing
+"""
+import collections
+import contextlib
+import threading
+import time
+
+from .deadline import DeadlineExceeded, REQUEST
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of sending a request to an endpoint whose circuit is open.
+    Attributes:
+        endpoint(str): Endpoint of the request
+        retry_in(float): Seconds until the circuit lets a probe request through
+    """
+
+    def __init__(self, endpoint, retry_in):
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+        super().__init__(f"Circuit of {endpoint} is open, retry in {retry_in:.1f}s")
+
+
+class CircuitPolicy:
+    """
+    Circuit breaker settings for an endpoint, or the default for all endpoints.
+    Args:
+        failure_rate(float): Share of failed requests in the window that opens
+            the circuit
+        min_requests(int): Requests in the window needed before it can open
+        window(float): Seconds of requests the failure rate is measured over
+        reset_timeout(float): Seconds the circuit stays open before probing
+        half_open_requests(int): Probe requests let through at once while
+            half open
+    A request fails when it raises or is answered with a 5xx status.
+    """
+
+    def __init__(self, failure_rate=0.5, **kwargs):
+        self.failure_rate = failure_rate
+        self.min_requests = kwargs.get('min_requests', 20)
+        self.window = kwargs.get('window', 30)
+        self.reset_timeout = kwargs.get('reset_timeout', 30)
+        self.half_open_requests = kwargs.get('half_open_requests', 1)
+
+
+class _Circuit:
+    """
+    State of one endpoint. Closed circuits count the outcomes of the window,
+    open circuits reject every request until reset_timeout has passed, then
+    half open circuits let probe requests through. A successful probe closes
+    the circuit, a failed one opens it again.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.state = CLOSED
+        self._lock = threading.Lock()
+        self._outcomes = collections.deque()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self.opened = 0
+        self.rejected = 0
+        self.probed = 0
+
+    def after_fork(self):
+        """
+        Replace the lock, which a thread of the parent process may have held.
+        Probes sent by the parent never finish in the child.
+        """
+        self._lock = threading.Lock()
+        self._probes = 0
+
+    def allow(self, endpoint):
+        """
+        Let a request through or raise CircuitOpenError. Returns True for a probe
+        """
+        with self._lock:
+            if self.state == OPEN:
+                retry_in = self._opened_at + self.config.reset_timeout - time.monotonic()
+                if retry_in > 0:
+                    self.rejected += 1
+                    raise CircuitOpenError(endpoint, retry_in)
+                self.state = HALF_OPEN
+
+            if self.state == HALF_OPEN:
+                if self._probes >= self.config.half_open_requests:
+                    self.rejected += 1
+                    raise CircuitOpenError(endpoint, 0.0)
+                self._probes += 1
+                self.probed += 1
+                return True
+
+            return False
+
+    def finish(self, probe, failed):
+        """
+        Record the outcome of a request let through by allow. A None outcome,
+        IE: a cancelled request, is not counted.
+        """
+        with self._lock:
+            if probe:
+                self._probes -= 1
+                if failed is None or self.state != HALF_OPEN:
+                    return
+                if failed:
+                    self._open()
+                else:
+                    self.state = CLOSED
+                    self._outcomes.clear()
+                    self._failures = 0
+                return
+
+            if failed is None or self.state != CLOSED:
+                return
+
+            now = time.monotonic()
+            self._outcomes.append((now, failed))
+            self._failures += failed
+            while self._outcomes and self._outcomes[0][0] <= now - self.config.window:
+                self._failures -= self._outcomes.popleft()[1]
+
+            if len(self._outcomes) >= self.config.min_requests and \
+                    self._failures / len(self._outcomes) >= self.config.failure_rate:
+                self._open()
+
+    def current_state(self):
+        """
+        State of the circuit, half open once an open circuit may be probed
+        """
+        with self._lock:
+            if self.state == OPEN and \
+                    time.monotonic() >= self._opened_at + self.config.reset_timeout:
+                return HALF_OPEN
+            return self.state
+
+    def _open(self):
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self._failures = 0
+        self.opened += 1
+
+    def stats(self):
+        """
+        Return the current state of the circuit
+        """
+        with self._lock:
+            requests = len(self._outcomes)
+            return {
+                "state": self.state,
+                "requests": requests,
+                "failures": self._failures,
+                "failure_rate": self._failures / requests if requests else 0.0,
+                "opened": self.opened,
+                "rejected": self.rejected,
+                "probed": self.probed
+            }
+
+
+class _Guard:
+    """
+    Outcome of a request passed through CircuitBreaker.guard
+    """
+    __slots__ = ('failed',)
+
+    def __init__(self):
+        self.failed = None
+
+    def record(self, status_code):
+        """
+        Record the status of the response
+        """
+        self.failed = status_code >= 500
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker shared by all API classes of a connector, with a circuit
+    per endpoint.
+    Args:
+        default(CircuitPolicy): (optional) Policy of every endpoint that is
+            not configured in endpoints
+        endpoints(dict): (optional) CircuitPolicy per endpoint. Endpoints are
+            named after the API method, IE: "create_order", "get_order_notes"
+    Unlike the rate limiter, endpoints never share a circuit, so a failing
+    endpoint does not stop the others.
+    """
+
+    def __init__(self, default=None, endpoints=None):
+        self.default = default or CircuitPolicy()
+        self.endpoints = endpoints or {}
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    def after_fork(self):
+        """
+        Give the breaker and its circuits new locks in a forked child process
+        """
+        self._lock = threading.Lock()
+        for circuit in list(self._circuits.values()):
+            circuit.after_fork()
+
+    def _circuit(self, endpoint):
+        circuit = self._circuits.get(endpoint)
+        if circuit is None:
+            with self._lock:
+                circuit = self._circuits.setdefault(
+                    endpoint, _Circuit(self.endpoints.get(endpoint, self.default)))
+        return circuit
+
+    @contextlib.contextmanager
+    def guard(self, endpoint):
+        """
+        Raise CircuitOpenError if the circuit of endpoint is open, otherwise
+        run the request in the block. The response status must be passed to
+        record() of the yielded object. Exceptions count as failures, except
+        deadlines that ran out before the request was sent.
+        """
+        circuit = self._circuit(endpoint)
+        probe = circuit.allow(endpoint)
+        outcome = _Guard()
+        try:
+            yield outcome
+        except DeadlineExceeded as error:
+            outcome.failed = True if error.phase == REQUEST else None
+            raise
+        except Exception:
+            outcome.failed = True
+            raise
+        finally:
+            circuit.finish(probe, outcome.failed)
+
+    def state(self, endpoint):
+        """
+        State of the circuit of endpoint: "closed", "open" or "half_open"
+        """
+        return self._circuit(endpoint).current_state()
+
+    def reset(self, endpoint=None):
+        """
+        Close the circuit of endpoint, or of every endpoint
+        """
+        with self._lock:
+            if endpoint is None:
+                self._circuits.clear()
+            else:
+                self._circuits.pop(endpoint, None)
+
+    def stats(self):
+        """
+        Return the state of the circuit of every endpoint that was requested
+        """
+        with self._lock:
+            circuits = dict(self._circuits)
+
+        return {endpoint: circuit.stats() for endpoint, circuit in circuits.items()}
@@ -0,0 +1,115 @@
+"""
+Command line entry points for the NewStore Connector
+"""
+import argparse
+import contextlib
+import os
+import sys
+
+from .journal import OrderJournal
+from .ns_connector import NewStoreConnector
+from .pipeline import stream_orders, inject_orders, print_progress, write_ndjson
+
+
+def _build_inject_parser():
+    parser = argparse.ArgumentParser(
+        prog="newstore-inject",
+        description="Stream orders from an NDJSON file or JSON array into NewStore")
+    parser.add_argument("input", help="Order file to read, '-' for stdin")
+    parser.add_argument("--tenant", required=True, help="NewStore tenant")
+    parser.add_argument("--env", default="p", help="NewStore environment. Default: p")
+    parser.add_argument("--role", default="iam:providers:read",
+                        help="Role requested for the token")
+    parser.add_argument("--client-id", default=os.environ.get("NEWSTORE_CLIENT_ID"),
+                        help="Client ID. Default: $NEWSTORE_CLIENT_ID")
+    parser.add_argument("--client-secret", default=os.environ.get("NEWSTORE_CLIENT_SECRET"),
+                        help="Client secret. Default: $NEWSTORE_CLIENT_SECRET")
+    parser.add_argument("--token", default=os.environ.get("NEWSTORE_TOKEN"),
+                        help="Bearer token used instead of client credentials. "
+                             "Default: $NEWSTORE_TOKEN")
+    parser.add_argument("--results", default="results.ndjson",
+                        help="NDJSON file for injected orders. Default: results.ndjson")
+    parser.add_argument("--rejections", default="rejections.ndjson",
+                        help="NDJSON file for rejected orders. Default: rejections.ndjson")
+    parser.add_argument("--max-in-flight", type=int, default=8,
+                        help="Maximum number of orders sent at once. Default: 8")
+    parser.add_argument("--max-retries", type=int, default=0,
+                        help="Retries for failed requests. Default: 0")
+    parser.add_argument("--deadline", type=float,
+                        help="Seconds each order may take, including the token fetch "
+                             "and retries. Default: no deadline")
+    parser.add_argument("--validation-workers", type=int, default=1,
+                        help="Validate orders in this many processes before sending. "
+                             "Default: 1, orders are validated by the threads sending them")
+    parser.add_argument("--skip-validation", action="store_true",
+                        help="Send orders without validating them first")
+    parser.add_argument("--journal",
+                        help="SQLite journal of injected orders. Orders it records as "
+                             "injected are not sent again when the file is re-run")
+    parser.add_argument("--retry-in-flight", action="store_true",
+                        help="Send journaled orders again whose outcome is unknown, IE: "
+                             "after a 5xx. Default: they are rejected to be checked by hand")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Only validate the orders, nothing is sent to NewStore")
+    parser.add_argument("--progress-interval", type=float, default=5,
+                        help="Seconds between progress reports. Default: 5")
+    return parser
+
+
+def inject(argv=None):
+    """
+    Entry point for newstore-inject
+    """
+    args = _build_inject_parser().parse_args(argv)
+
+    journal = None
+    if args.dry_run:
+        # Validation does not need a connection to NewStore
+        from .order_injection import OrderInjectionV01 # pylint: disable=import-outside-toplevel
+        order_injection = OrderInjectionV01()
+    else:
+        journal = OrderJournal(args.journal, retry_in_flight=args.retry_in_flight) \
+            if args.journal else None
+        ns_conn = NewStoreConnector(tenant=args.tenant, env=args.env, role=args.role,
+                                    client_id=args.client_id,
+                                    client_secret=args.client_secret,
+                                    token=args.token,
+                                    max_retries=args.max_retries,
+                                    deadline=args.deadline,
+                                    journal=journal)
+        order_injection = ns_conn.order_injection
+
+    with contextlib.ExitStack() as stack:
+        if journal is not None:
+            stack.enter_context(journal)
+        if args.input == "-":
+            input_file = sys.stdin
+        else:
+            input_file = stack.enter_context(open(args.input, "r", encoding='utf-8'))
+        results_file = stack.enter_context(open(args.results, "w", encoding='utf-8'))
+        rejections_file = stack.enter_context(open(args.rejections, "w", encoding='utf-8'))
+
+        parse_errors = []
+
+        def on_parse_error(line_number, message):
+            parse_errors.append(line_number)
+            write_ndjson(rejections_file, {"line": line_number,
+                                           "success": False,
+                                           "error": {"type": "parse", "message": message}})
+
+        stats = inject_orders(order_injection,
+                              stream_orders(input_file, on_error=on_parse_error),
+                              results_file,
+                              rejections_file,
+                              max_in_flight=args.max_in_flight,
+                              skip_validation=args.skip_validation,
+                              validation_workers=args.validation_workers,
+                              dry_run=args.dry_run,
+                              progress=print_progress,
+                              progress_interval=args.progress_interval)
+
+    return 1 if stats.failed or parse_errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(inject())
@@ -0,0 +1,102 @@
+"""
+Module for bounding the total time of a NewStore API call
+"""
+import contextlib
+import time
+
+TOKEN = "token"
+RATE_LIMIT = "rate_limit"
+REQUEST = "request"
+BACKOFF = "backoff"
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+    Raised when an API call runs out of its deadline.
+    Attributes:
+        budget(float): Seconds the call was given
+        phase(str): Phase that ran out of time, one of "token", "rate_limit",
+            "request" or "backoff"
+        phases(dict): Seconds spent in each phase
+    """
+
+    def __init__(self, deadline, phase):
+        self.budget = deadline.budget
+        self.phase = phase
+        self.phases = dict(deadline.phases)
+        spent = ", ".join(f"{name} {seconds:.3f}s" for name, seconds in self.phases.items())
+        super().__init__(f"Deadline of {self.budget}s exceeded during {phase}"
+                         + (f" ({spent})" if spent else ""))
+
+
+class Deadline:
+    """
+    Time budget of one API call, shared by its token fetch, rate limiter
+    wait, requests and retries. Records the time spent in each phase.
+    Args:
+        budget(float): Seconds the call may take
+    """
+    __slots__ = ('budget', 'expires', 'phases')
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.expires = time.monotonic() + budget
+        self.phases = {}
+
+    def remaining(self):
+        """
+        Seconds left, 0 once expired
+        """
+        return max(self.expires - time.monotonic(), 0.0)
+
+    def expired(self):
+        """
+        True once the budget is used up
+        """
+        return time.monotonic() >= self.expires
+
+    def check(self, phase):
+        """
+        Raise DeadlineExceeded if the budget is used up before phase
+        """
+        if self.expired():
+            raise DeadlineExceeded(self, phase)
+
+    def timeout(self, phase, timeout=None):
+        """
+        Return the timeout for phase, the time left capped by timeout
+        """
+        self.check(phase)
+        remaining = self.remaining()
+        return remaining if timeout is None else min(timeout, remaining)
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Add the time spent in the block to phase name
+        """
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.monotonic() - start
+
+
+def as_deadline(deadline):
+    """
+    Return a Deadline for a number of seconds, the Deadline passed, or None
+    """
+    if deadline is None or isinstance(deadline, Deadline):
+        return deadline
+
+    return Deadline(deadline)
+
+
+def phase(deadline, name):
+    """
+    Deadline.phase of deadline, or a block that records nothing without one
+    """
+    if deadline is None:
+        return contextlib.nullcontext()
+
+    return deadline.phase(name)
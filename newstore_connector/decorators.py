@@ -0,0 +1,41 @@
+"""
+Decorators shared by the NewStore API Classes
+"""
+import functools
+
+
+def json_or_full(func):
+    """
+    Same as api_toolkit's json_or_full, without importing api_toolkit.connector
+    and requests with it. The decorated method returns the full response, or
+    only its JSON if called with return_json=True
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return_json = kwargs.pop('return_json', False)
+        response = func(*args, **kwargs)
+
+        if return_json:
+            return response.json()
+
+        return response
+
+    return wrapper
+
+
+def async_json_or_full(func):
+    """
+    Async counterpart of api_toolkit's json_or_full. The decorated coroutine
+    returns the full response, or only its JSON if called with return_json=True
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return_json = kwargs.pop('return_json', False)
+        response = await func(*args, **kwargs)
+
+        if return_json:
+            return response.json()
+
+        return response
+
+    return wrapper
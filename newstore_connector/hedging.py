@@ -0,0 +1,306 @@
+"""
+Module for hedging idempotent NewStore API requests against tail latency
+"""
+import asyncio
+import collections
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HEDGE_PERCENTILE = 95
+HEDGE_MAX_WORKERS = 32
+
+
+class Hedger:
+    """
+    Sends a second attempt of an idempotent request when the first has not
+    answered after the p95 latency of the endpoint, and returns the first
+    response. Shared by all API classes of a connector.
+    Args:
+        percentile(float): (optional) Percentile of recent latencies to wait
+            before hedging. Default: 95
+        min_samples(int): (optional) Latencies needed before the percentile is
+            used, max_delay is waited until then. Default: 20
+        window(int): (optional) Recent latencies kept per endpoint. Default: 200
+        min_delay(float): (optional) Seconds always waited. Default: 0.01
+        max_delay(float): (optional) Seconds never exceeded. Default: 1
+        max_hedge_ratio(float): (optional) Share of requests that may be
+            hedged, so an overloaded server does not get twice the load. Default: 0.1
+        max_workers(int): (optional) Threads sending the hedges of sync
+            requests, the first attempt is sent from the calling thread. Default: 32
+    """
+
+    def __init__(self, percentile=HEDGE_PERCENTILE, **kwargs):
+        self.percentile = percentile
+        self.min_samples = kwargs.get('min_samples', 20)
+        self.window = kwargs.get('window', 200)
+        self.min_delay = kwargs.get('min_delay', 0.01)
+        self.max_delay = kwargs.get('max_delay', 1)
+        self.max_hedge_ratio = kwargs.get('max_hedge_ratio', 0.1)
+        self.max_workers = kwargs.get('max_workers', HEDGE_MAX_WORKERS)
+        self._latencies = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._timer = None
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def delay(self, endpoint):
+        """
+        Seconds to wait for the first attempt of a request to endpoint
+        """
+        with self._lock:
+            latencies = sorted(self._latencies.get(endpoint, ()))
+
+        if len(latencies) < self.min_samples:
+            return self.max_delay
+
+        index = min(int(len(latencies) * self.percentile / 100), len(latencies) - 1)
+        return min(max(latencies[index], self.min_delay), self.max_delay)
+
+    def record(self, endpoint, seconds):
+        """
+        Add the latency of a completed attempt
+        """
+        with self._lock:
+            latencies = self._latencies.get(endpoint)
+            if latencies is None:
+                latencies = self._latencies[endpoint] = collections.deque(maxlen=self.window)
+            latencies.append(seconds)
+
+    def _start(self):
+        """
+        Count a request, returns True if it may be hedged
+        """
+        with self._lock:
+            self.requests += 1
+            return self.hedged < self.requests * self.max_hedge_ratio
+
+    def _hedge(self, won):
+        """
+        Count a hedge sent when won is None, else whether it won the race
+        """
+        with self._lock:
+            if won is None:
+                self.hedged += 1
+            elif won:
+                self.hedge_wins += 1
+
+    def run(self, endpoint, func):
+        """
+        Call func from the calling thread, and call it again from a hedger
+        thread if it has not returned after the hedge delay. When the first
+        call returns, the result of the hedge is used if it was already there,
+        and the other response is closed. If the first call raised, the hedge
+        is waited for.
+        """
+        if not self._start():
+            return self._timed(endpoint, func)
+
+        hedges = []
+
+        def send_hedge():
+            self._hedge(None)
+            hedges.append(self._get_executor().submit(self._timed, endpoint, func))
+
+        timer = self._get_timer()
+        scheduled = timer.schedule(self.delay(endpoint), send_hedge)
+        try:
+            result = self._timed(endpoint, func)
+        except Exception:
+            if timer.cancel(scheduled) or hedges[0].exception() is not None:
+                raise
+            self._hedge(True)
+            return hedges[0].result()
+
+        if timer.cancel(scheduled):
+            return result
+
+        hedge = hedges[0]
+        won = hedge.done() and hedge.exception() is None
+        self._hedge(won)
+        if won:
+            _close(result)
+            return hedge.result()
+
+        hedge.add_done_callback(_close_response)
+        return result
+
+    async def async_run(self, endpoint, func):
+        """
+        Asyncio counterpart of run, func returns a coroutine. The slower
+        attempt is cancelled.
+        """
+        if not self._start():
+            return await self._async_timed(endpoint, func)
+
+        primary = asyncio.ensure_future(self._async_timed(endpoint, func))
+        done, _ = await asyncio.wait([primary], timeout=self.delay(endpoint))
+        if done:
+            return primary.result()
+
+        self._hedge(None)
+        hedge = asyncio.ensure_future(self._async_timed(endpoint, func))
+        try:
+            done, pending = await asyncio.wait([primary, hedge],
+                                               return_when=asyncio.FIRST_COMPLETED)
+            first = primary if primary in done else hedge
+            if first.exception() is not None and pending:
+                await asyncio.wait(pending)
+                other = pending.pop()
+                if other.exception() is None:
+                    first = other
+        finally:
+            for task in (primary, hedge):
+                task.cancel()
+
+        self._hedge(first is hedge)
+        return first.result()
+
+    def _timed(self, endpoint, func):
+        start = time.perf_counter()
+        result = func()
+        self.record(endpoint, time.perf_counter() - start)
+        return result
+
+    async def _async_timed(self, endpoint, func):
+        start = time.perf_counter()
+        result = await func()
+        self.record(endpoint, time.perf_counter() - start)
+        return result
+
+    def _get_timer(self):
+        if self._timer is None:
+            with self._lock:
+                if self._timer is None:
+                    self._timer = _Timer()
+        return self._timer
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                        thread_name_prefix="newstore-hedge")
+        return self._executor
+
+    def after_fork(self):
+        """
+        Drop the threads of the parent process, new ones are started on use
+        """
+        self._lock = threading.Lock()
+        self._executor = None
+        self._timer = None
+
+    def stats(self):
+        """
+        Return the request and hedge counters, and the current hedge delay of
+        every endpoint
+        """
+        with self._lock:
+            endpoints = list(self._latencies)
+            stats = {
+                "requests": self.requests,
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins,
+                "hedge_win_rate": self.hedge_wins / self.hedged if self.hedged else 0.0
+            }
+
+        stats["delays"] = {endpoint: self.delay(endpoint) for endpoint in endpoints}
+        return stats
+
+    def close(self):
+        """
+        Stop the threads of the hedger once running attempts are done
+        """
+        if self._timer is not None:
+            self._timer.stop()
+            self._timer = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+class _Timer:
+    """
+    Thread calling scheduled functions once their delay has passed, unless
+    they were cancelled first. One thread waits for the hedge delays of every
+    request, so requests answered in time never leave the calling thread.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._scheduled = []
+        self._sequence = itertools.count()
+        self._stopped = False
+        self._thread = None
+
+    def schedule(self, delay, func):
+        """
+        Call func in delay seconds. Returns the entry to pass to cancel.
+        """
+        entry = [time.monotonic() + delay, next(self._sequence), func]
+        with self._condition:
+            heapq.heappush(self._scheduled, entry)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True,
+                                                name="newstore-hedge-timer")
+                self._thread.start()
+            self._condition.notify()
+
+        return entry
+
+    def cancel(self, entry):
+        """
+        Cancel a scheduled call. Returns False if it was already made.
+        """
+        with self._condition:
+            pending = entry[2] is not None
+            entry[2] = None
+
+        return pending
+
+    def stop(self):
+        """
+        Stop the thread, scheduled calls are not made
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+    def _run(self):
+        with self._condition:
+            while not self._stopped:
+                if self._scheduled and self._scheduled[0][2] is None:
+                    heapq.heappop(self._scheduled)
+                    continue
+                if not self._scheduled:
+                    self._condition.wait()
+                    continue
+
+                timeout = self._scheduled[0][0] - time.monotonic()
+                if timeout > 0:
+                    self._condition.wait(timeout)
+                    continue
+
+                entry = heapq.heappop(self._scheduled)
+                func, entry[2] = entry[2], None
+                # Made holding the lock, so cancel returning False means it was made
+                func()
+
+
+def _close(response):
+    close = getattr(response, "close", None)
+    if close is not None:
+        close()
+
+
+def _close_response(future):
+    """
+    Close the response of an attempt that lost the race, releasing its connection
+    """
+    if not future.cancelled() and future.exception() is None:
+        _close(future.result())
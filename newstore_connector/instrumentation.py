@@ -0,0 +1,280 @@
+"""
+Module for instrumenting NewStore API requests.
+
+API classes call the hooks in their `hooks` list around every request. With
+no hooks set nothing is timed or measured, so instrumentation costs a single
+check per request when disabled.
+"""
+import bisect
+import threading
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class RequestHooks:
+    """
+    Base class for request hooks. Subclasses override the events they need,
+    every event is a no-op by default. Hooks are called from the threads or
+    event loop sending the requests, so they must be thread safe and fast.
+    """
+
+    def before_request(self, endpoint, method, url):
+        """
+        Called before a request is sent
+        """
+
+    def after_request(self, endpoint, response, elapsed):
+        """
+        Called with the final response and the seconds the request took,
+        including retries and rate limiting
+        """
+
+    def on_retry(self, endpoint, attempt, reason):
+        """
+        Called for every retry of a request. reason is the status code of the
+        retried response, or the name of the connection error
+        """
+
+    def on_error(self, endpoint, error, elapsed):
+        """
+        Called when a request raises instead of returning a response
+        """
+
+    def on_validation(self, endpoint, elapsed, valid):
+        """
+        Called after a payload is validated before being sent
+        """
+
+
+def request_size(response):
+    """
+    Return the size in bytes of the body sent for a requests or httpx response
+    """
+    request = getattr(response, 'request', None)
+    body = getattr(request, 'body', None)
+    if body is None:
+        try:
+            body = getattr(request, 'content', None)
+        except Exception: # pylint: disable=broad-exception-caught
+            # Streamed httpx request bodies can't be measured
+            body = None
+    if body is None:
+        return 0
+    if isinstance(body, str):
+        return len(body.encode('utf-8'))
+    if isinstance(body, (bytes, bytearray)):
+        return len(body)
+
+    return 0
+
+
+class Histogram:
+    """
+    Histogram of observed values with fixed upper bounds, as used by Prometheus
+    """
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """
+        Add a value to the histogram
+        """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """
+        Return [(upper_bound, count of values <= upper_bound)], ending with "+Inf"
+        """
+        bounds = [str(bucket) for bucket in self.buckets] + ["+Inf"]
+        totals = []
+        total = 0
+        for count in self.counts:
+            total += count
+            totals.append(total)
+
+        return list(zip(bounds, totals))
+
+    def as_dict(self):
+        """
+        Return the histogram as a dictionary
+        """
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": dict(self.cumulative())
+        }
+
+
+class MetricsCollector(RequestHooks):
+    """
+    Request hooks recording per endpoint latency histograms, validation time,
+    request and response bytes, retries, errors and status codes.
+    Args:
+        buckets(tuple): (optional) Upper bounds of the duration histograms in seconds
+        prefix(str): (optional) Prefix of the Prometheus metric names. Default: "newstore"
+    """
+
+    def __init__(self, buckets=DURATION_BUCKETS, prefix="newstore"):
+        self.buckets = buckets
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.reset()
+
+    def after_fork(self):
+        """
+        Replace the lock, which a thread of the parent process may have held
+        """
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """
+        Clear every recorded metric
+        """
+        with self._lock:
+            self.durations = {}
+            self.validation_durations = {}
+            self.statuses = {}
+            self.retries = {}
+            self.errors = {}
+            self.validation_failures = {}
+            self.request_bytes = {}
+            self.response_bytes = {}
+
+    def after_request(self, endpoint, response, elapsed):
+        sent = request_size(response)
+        received = len(response.content or b'')
+        with self._lock:
+            self._observe(self.durations, endpoint, elapsed)
+            _increment(self.statuses, (endpoint, response.status_code))
+            _increment(self.request_bytes, endpoint, sent)
+            _increment(self.response_bytes, endpoint, received)
+
+    def on_retry(self, endpoint, attempt, reason):
+        with self._lock:
+            _increment(self.retries, (endpoint, reason))
+
+    def on_error(self, endpoint, error, elapsed):
+        with self._lock:
+            self._observe(self.durations, endpoint, elapsed)
+            _increment(self.errors, (endpoint, type(error).__name__))
+
+    def on_validation(self, endpoint, elapsed, valid):
+        with self._lock:
+            self._observe(self.validation_durations, endpoint, elapsed)
+            if not valid:
+                _increment(self.validation_failures, endpoint)
+
+    def _observe(self, histograms, endpoint, value):
+        histogram = histograms.get(endpoint)
+        if histogram is None:
+            histogram = histograms[endpoint] = Histogram(self.buckets)
+        histogram.observe(value)
+
+    def as_dict(self):
+        """
+        Return the metrics per endpoint as a dictionary
+        """
+        with self._lock:
+            endpoints = set(self.durations) | set(self.validation_durations) | \
+                {endpoint for endpoint, _ in self.errors}
+            metrics = {}
+            for endpoint in sorted(endpoints, key=str):
+                metrics[endpoint] = {
+                    "duration": _histogram_dict(self.durations.get(endpoint)),
+                    "validation_duration": _histogram_dict(
+                        self.validation_durations.get(endpoint)),
+                    "validation_failures": self.validation_failures.get(endpoint, 0),
+                    "status_codes": _labelled(self.statuses, endpoint),
+                    "retries": _labelled(self.retries, endpoint),
+                    "errors": _labelled(self.errors, endpoint),
+                    "request_bytes": self.request_bytes.get(endpoint, 0),
+                    "response_bytes": self.response_bytes.get(endpoint, 0)
+                }
+
+            return metrics
+
+    def prometheus(self):
+        """
+        Return the metrics in the Prometheus text exposition format
+        """
+        prefix = self.prefix
+        lines = []
+        with self._lock:
+            _histogram_lines(lines, f"{prefix}_request_duration_seconds",
+                             "Duration of NewStore API requests including retries",
+                             self.durations)
+            _histogram_lines(lines, f"{prefix}_validation_duration_seconds",
+                             "Duration of payload validation before sending",
+                             self.validation_durations)
+            _counter_lines(lines, f"{prefix}_validation_failures_total",
+                           "Payloads rejected by validation",
+                           {(endpoint,): value
+                            for endpoint, value in self.validation_failures.items()},
+                           ("endpoint",))
+            _counter_lines(lines, f"{prefix}_requests_total",
+                           "NewStore API responses by status code",
+                           self.statuses, ("endpoint", "status"))
+            _counter_lines(lines, f"{prefix}_retries_total",
+                           "Retried NewStore API requests by reason",
+                           self.retries, ("endpoint", "reason"))
+            _counter_lines(lines, f"{prefix}_errors_total",
+                           "NewStore API requests that raised an exception",
+                           self.errors, ("endpoint", "error"))
+            _counter_lines(lines, f"{prefix}_request_bytes_total",
+                           "Bytes sent in NewStore API request bodies",
+                           {(endpoint,): value for endpoint, value in self.request_bytes.items()},
+                           ("endpoint",))
+            _counter_lines(lines, f"{prefix}_response_bytes_total",
+                           "Bytes received in NewStore API response bodies",
+                           {(endpoint,): value
+                            for endpoint, value in self.response_bytes.items()},
+                           ("endpoint",))
+
+        return "\n".join(lines) + "\n"
+
+
+def _increment(counters, key, value=1):
+    counters[key] = counters.get(key, 0) + value
+
+
+def _histogram_dict(histogram):
+    return histogram.as_dict() if histogram is not None else None
+
+
+def _labelled(counters, endpoint):
+    """
+    Return {label: value} for the (endpoint, label) keys of endpoint
+    """
+    return {label: value for (key, label), value in counters.items() if key == endpoint}
+
+
+def _labels(names, values):
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{escaped}"')
+    return ",".join(pairs)
+
+
+def _histogram_lines(lines, name, description, histograms):
+    lines.append(f"# HELP {name} {description}")
+    lines.append(f"# TYPE {name} histogram")
+    for endpoint, histogram in sorted(histograms.items(), key=lambda item: str(item[0])):
+        labels = _labels(("endpoint",), (endpoint,))
+        for bound, total in histogram.cumulative():
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {total}')
+        lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+        lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+
+def _counter_lines(lines, name, description, counters, label_names):
+    lines.append(f"# HELP {name} {description}")
+    lines.append(f"# TYPE {name} counter")
+    for key, value in sorted(counters.items(), key=lambda item: tuple(map(str, item[0]))):
+        lines.append(f"{name}{{{_labels(label_names, key)}}} {value}")
@@ -0,0 +1,204 @@
+"""
+Module for journaling injected orders so they are never sent twice.
+
+The journal records the state of every order sent with create_order, keyed by
+its external_id and a hash of the body sent. Orders NewStore already accepted
+are answered from the journal instead of being sent again, so a retried or
+restarted batch only sends the orders that have not been injected yet.
+"""
+import collections
+import hashlib
+import threading
+import time
+
+IN_FLIGHT = "in_flight"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+JournalEntry = collections.namedtuple(
+    "JournalEntry",
+    ["external_id", "payload_hash", "state", "attempts", "status_code", "response",
+     "error", "updated_at"])
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    external_id TEXT NOT NULL,
+    payload_hash TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    status_code INTEGER,
+    response BLOB,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (external_id, payload_hash)
+)
+"""
+
+
+def payload_hash(body):
+    """
+    Return the hash identifying a serialized order body
+    """
+    return hashlib.sha256(body).hexdigest()
+
+
+class OrderJournal:
+    """
+    SQLite journal of the orders sent by create_order. One journal can be
+    shared by every thread of a connector.
+    Args:
+        path(str): Journal file, created if it does not exist
+        retry_in_flight(bool): (optional) Send orders again whose outcome is
+            unknown: in flight when a previous run stopped, or answered with a
+            5xx or a connection error. NewStore may or may not have created
+            them. If False they are rejected with a ValueError so they can be
+            checked by hand. Default: False
+    """
+
+    def __init__(self, path, retry_in_flight=False):
+        self.path = path
+        self.retry_in_flight = retry_in_flight
+        self._lock = threading.Lock()
+        # Orders being sent by this process, anything else left in flight
+        # in the journal was interrupted
+        self._active = set()
+        self.skipped = 0
+        # Connection of the parent process in a forked child, see after_fork
+        self._parent_connection = None
+        self._connection = self._connect()
+
+    def _connect(self):
+        import sqlite3 # pylint: disable=import-outside-toplevel
+
+        connection = sqlite3.connect(self.path, check_same_thread=False,
+                                     isolation_level=None)
+        # WAL without a sync on every commit keeps writes fast, an entry is
+        # only lost if the machine itself crashes
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(_SCHEMA)
+        return connection
+
+    def after_fork(self):
+        """
+        Open a connection of the forked child process, SQLite connections
+        must not be used across a fork. Orders sent by the parent are not
+        active in the child.
+        """
+        self._lock = threading.Lock()
+        self._active = set()
+        # Closing the parent's connection in the child could checkpoint or
+        # remove the WAL the parent is still using, so it is only kept
+        self._parent_connection = self._connection
+        self._connection = self._connect()
+
+    def get(self, external_id, body_hash):
+        """
+        Return the JournalEntry of an order, or None if it was never sent
+        """
+        with self._lock:
+            return self._get(external_id, body_hash)
+
+    def _get(self, external_id, body_hash):
+        row = self._connection.execute(
+            "SELECT * FROM orders WHERE external_id = ? AND payload_hash = ?",
+            (external_id, body_hash)).fetchone()
+
+        return JournalEntry(*row) if row else None
+
+    def begin(self, external_id, body_hash):
+        """
+        Record that an order is about to be sent. Returns the JournalEntry if
+        the order was already injected and must not be sent, else None.
+        Raises ValueError if the same order is already being sent, or if its
+        outcome is unknown and retry_in_flight is False.
+        """
+        key = (external_id, body_hash)
+        with self._lock:
+            entry = self._get(external_id, body_hash)
+            if entry is not None and entry.state == SUCCEEDED:
+                self.skipped += 1
+                return entry
+            if key in self._active:
+                raise ValueError({"external_id": "Order is already being sent"})
+            if entry is not None and entry.state == IN_FLIGHT and not self.retry_in_flight:
+                raise ValueError({"external_id": "Order may have been created by a previous "
+                                                 "attempt, check it in NewStore"})
+
+            self._connection.execute(
+                "INSERT INTO orders (external_id, payload_hash, state, attempts, updated_at) "
+                "VALUES (?, ?, ?, 1, ?) "
+                "ON CONFLICT (external_id, payload_hash) DO UPDATE SET "
+                "state = excluded.state, attempts = attempts + 1, "
+                "updated_at = excluded.updated_at",
+                (external_id, body_hash, IN_FLIGHT, time.time()))
+            self._active.add(key)
+
+        return None
+
+    def succeed(self, external_id, body_hash, status_code, response):
+        """
+        Record that NewStore accepted an order, with the response body
+        """
+        self._finish(external_id, body_hash, SUCCEEDED, status_code, response, None)
+
+    def fail(self, external_id, body_hash, status_code=None, error=None):
+        """
+        Record that an order was rejected before NewStore created it, IE: by
+        validation or with a 4xx. Failed orders are sent again by begin
+        """
+        self._finish(external_id, body_hash, FAILED, status_code, None, error)
+
+    def abandon(self, external_id, body_hash, status_code=None, error=None):
+        """
+        Record an order whose outcome is unknown, IE: after a 5xx, a timeout or
+        a connection error. It stays in flight, as if the process had stopped.
+        """
+        self._finish(external_id, body_hash, IN_FLIGHT, status_code, None, error)
+
+    def _finish(self, external_id, body_hash, state, status_code, response, error):
+        with self._lock:
+            self._connection.execute(
+                "UPDATE orders SET state = ?, status_code = ?, response = ?, error = ?, "
+                "updated_at = ? WHERE external_id = ? AND payload_hash = ?",
+                (state, status_code, response, error, time.time(), external_id, body_hash))
+            self._active.discard((external_id, body_hash))
+
+    def counts(self):
+        """
+        Return the number of journaled orders in each state
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT state, COUNT(*) FROM orders GROUP BY state").fetchall()
+
+        counts = {IN_FLIGHT: 0, SUCCEEDED: 0, FAILED: 0}
+        counts.update(rows)
+        return counts
+
+    def entries(self, state=None):
+        """
+        Return the JournalEntries of every order, or only those in state
+        """
+        query = "SELECT * FROM orders"
+        params = ()
+        if state is not None:
+            query += " WHERE state = ?"
+            params = (state,)
+        with self._lock:
+            rows = self._connection.execute(query, params).fetchall()
+
+        return [JournalEntry(*row) for row in rows]
+
+    def close(self):
+        """
+        Close the journal file
+        """
+        with self._lock:
+            self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,6 +1,63 @@
 """
 Parent class for the NewStore API Classes
 """
+import sys
+import time
+
+from .deadline import DeadlineExceeded, as_deadline, phase, BACKOFF, REQUEST, TOKEN
+from .rate_limiter import RATE_LIMITED_STATUS
+from .serialization import encode_body
+
+# Kinds of transport errors, see transport_error
+CONNECT_ERROR = "connect"
+READ_ERROR = "read"
+
+# Methods sent again after a read error, the request may have been processed
+IDEMPOTENT_METHODS = frozenset(('HEAD', 'GET', 'PUT', 'DELETE', 'OPTIONS', 'TRACE'))
+
+
+def transport_error(error):
+    """
+    Return CONNECT_ERROR if error was raised by the transport before the
+    request was sent, READ_ERROR if the request may have been sent, IE: a read
+    timeout, or None if it is not a transport error. The exceptions are looked
+    up in the modules already loaded, so no HTTP client is imported.
+    """
+    requests = sys.modules.get('requests')
+    if requests is not None and isinstance(error, requests.RequestException):
+        if isinstance(error, requests.ConnectTimeout):
+            return CONNECT_ERROR
+        if isinstance(error, requests.ConnectionError):
+            urllib3 = sys.modules.get('urllib3')
+            reason = getattr(error.args[0], 'reason', None) if error.args else None
+            if urllib3 is not None and \
+                    isinstance(reason, urllib3.exceptions.NewConnectionError):
+                return CONNECT_ERROR
+            return READ_ERROR
+        if isinstance(error, requests.Timeout):
+            return READ_ERROR
+        return None
+
+    httpx = sys.modules.get('httpx')
+    if httpx is not None and isinstance(error, httpx.TransportError):
+        if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+            return CONNECT_ERROR
+        return READ_ERROR
+
+    return None
+
+
+def retry_delay(backoff_factor, retry, response=None):
+    """
+    Return the seconds to wait before retry, from the Retry-After header of
+    response if there is one, or backoff_factor * (2 ** (retry - 1))
+    """
+    retry_after = response.headers.get('Retry-After') if response is not None else None
+    if retry_after and retry_after.isdigit():
+        return int(retry_after)
+
+    return backoff_factor * (2 ** (retry - 1))
+
 
 class NewStoreAPIBase:
     """
@@ -11,5 +68,416 @@ class NewStoreAPIBase:
 
         self.base_url = kwargs.get('base_url')
         self.session = kwargs.get('session')
+        # Transport sending the requests, see transports.py. Default: the session
+        self.transport = kwargs.get('transport') or self.session
         self.headers = kwargs.get('headers')
-        
\ No newline at end of file
+        # Callable returning the current token, set by the connector so
+        # refreshed tokens are used without recreating the API class
+        self.token_provider = kwargs.get('token_provider')
+        # AdaptiveRateLimiter shared by all API classes of the connector
+        self.rate_limiter = kwargs.get('rate_limiter')
+        # RequestHooks called around every request, see instrumentation.py
+        self.hooks = kwargs.get('hooks') or []
+        # Serializer for JSON bodies, serialization.dumps (orjson if installed) if not set
+        self.json_dumps = kwargs.get('json_dumps')
+        # Gzip request bodies of at least this many bytes, None to never compress
+        self.compress_threshold = kwargs.get('compress_threshold')
+        # OrderJournal used by create_order to never send an injected order twice
+        self.journal = kwargs.get('journal')
+        # Seconds every call may take when it is not given a deadline, None for no limit
+        self.deadline = kwargs.get('deadline')
+        # Responses with a status in status_forcelist are sent again, see _send_with_retries
+        self.max_retries = kwargs.get('max_retries', 0)
+        self.backoff_factor = kwargs.get('backoff_factor', 0)
+        self.status_forcelist = kwargs.get('status_forcelist', [])
+        # Methods retried, None for every method
+        self.allowed_methods = kwargs.get('allowed_methods')
+        # CircuitBreaker shared by all API classes of the connector, see circuit_breaker.py
+        self.circuit_breaker = kwargs.get('circuit_breaker')
+        # Hedger sending idempotent reads twice when they are slow, see hedging.py
+        self.hedger = kwargs.get('hedger')
+
+    def _start_deadline(self, deadline=None):
+        """
+        Return the Deadline of a call given deadline, or the default deadline
+        """
+        return as_deadline(self.deadline if deadline is None else deadline)
+
+    def _request_headers(self, deadline=None):
+        """
+        Return the headers for a request, fetching the token within deadline
+        """
+        if deadline is None or self.token_provider is None:
+            return self.headers
+
+        with deadline.phase(TOKEN):
+            token = self.token_provider(deadline=deadline)
+        headers = dict(self._headers or {})
+        headers['Authorization'] = f'Bearer {token}'
+        return headers
+
+    def _request(self, method, url, endpoint=None, deadline=None, **kwargs):
+        """
+        Send a request with the transport, calling the hooks around it if any are set
+        """
+        if not self.hooks:
+            return self._send_with_retries(method, url, endpoint, deadline, **kwargs)
+
+        for hook in self.hooks:
+            hook.before_request(endpoint, method, url)
+
+        start = time.perf_counter()
+        try:
+            response = self._send_with_retries(method, url, endpoint, deadline, **kwargs)
+        except Exception as error:
+            elapsed = time.perf_counter() - start
+            for hook in self.hooks:
+                hook.on_error(endpoint, error, elapsed)
+            raise
+
+        elapsed = time.perf_counter() - start
+        for hook in self.hooks:
+            hook.after_request(endpoint, response, elapsed)
+
+        return response
+
+    def _hedged_request(self, method, url, endpoint=None, deadline=None, **kwargs):
+        """
+        Send an idempotent request like _request, hedged by the hedger if one is set
+        """
+        if self.hedger is None:
+            return self._request(method, url, endpoint, deadline, **kwargs)
+
+        return self.hedger.run(
+            endpoint, lambda: self._request(method, url, endpoint, deadline, **kwargs))
+
+    def _send_with_retries(self, method, url, endpoint, deadline=None, **kwargs):
+        """
+        Send a request. Responses with a status in status_forcelist are
+        retried up to max_retries times, waiting backoff_factor * (2 ** (retry - 1))
+        seconds or the Retry-After header between attempts. With a
+        rate_limiter set, 429 responses are retried by the rate limiter instead,
+        up to rate_limiter.max_retries. Transport errors are retried like
+        statuses, see _should_retry_error. With a deadline, retries stop with
+        DeadlineExceeded once the wait would not fit in the time left.
+        """
+        retry = 0
+        throttled = 0
+        while True:
+            try:
+                response = self._send(method, url, endpoint, deadline, **kwargs)
+            except Exception as error:
+                if not self._should_retry_error(method, error, retry):
+                    raise
+                retry += 1
+                self._emit_retry(endpoint, retry, type(error).__name__)
+                self._backoff(retry, None, deadline)
+                continue
+
+            if self.rate_limiter is not None and response.status_code == RATE_LIMITED_STATUS:
+                if throttled >= self.rate_limiter.max_retries:
+                    return response
+                throttled += 1
+                self._emit_retry(endpoint, throttled, response.status_code)
+                continue
+
+            if not self._should_retry(method, response, retry):
+                return response
+
+            retry += 1
+            self._emit_retry(endpoint, retry, response.status_code)
+            self._backoff(retry, response, deadline)
+
+    def _should_retry(self, method, response, retry):
+        """
+        True if the response status is retried for method and retries are left
+        """
+        return response.status_code in self.status_forcelist and retry < self.max_retries \
+            and (self.allowed_methods is None or method in self.allowed_methods)
+
+    def _should_retry_error(self, method, error, retry):
+        """
+        True if the transport error is retried for method and retries are left.
+        Connection errors are retried for every method, nothing was sent.
+        Read errors only for idempotent methods in allowed_methods.
+        """
+        kind = transport_error(error)
+        if kind is None or retry >= self.max_retries:
+            return False
+        if kind == CONNECT_ERROR:
+            return True
+
+        return method in IDEMPOTENT_METHODS and \
+            (self.allowed_methods is None or method in self.allowed_methods)
+
+    def _send(self, method, url, endpoint, deadline=None, **kwargs):
+        """
+        Send a single request, failing fast with CircuitOpenError if the
+        circuit breaker is open for endpoint
+        """
+        if self.circuit_breaker is None:
+            return self._send_limited(method, url, endpoint, deadline, **kwargs)
+
+        with self.circuit_breaker.guard(endpoint) as circuit:
+            response = self._send_limited(method, url, endpoint, deadline, **kwargs)
+            circuit.record(response.status_code)
+
+        return response
+
+    def _send_limited(self, method, url, endpoint, deadline=None, **kwargs):
+        """
+        Send a single request with the transport, through the rate limiter if one is set
+        """
+        if self.rate_limiter is None:
+            return self._send_within(method, url, deadline, **kwargs)
+
+        with self.rate_limiter.acquire(endpoint, deadline) as bucket:
+            response = self._send_within(method, url, deadline, **kwargs)
+            bucket.record(response.status_code, response.headers.get('Retry-After'))
+
+        return response
+
+    def _send_within(self, method, url, deadline=None, **kwargs):
+        """
+        Send a request with its timeout capped by the time left of deadline
+        """
+        if deadline is None:
+            return self.transport.request(method, url, **kwargs)
+
+        kwargs['timeout'] = deadline.timeout(REQUEST, kwargs.get('timeout'))
+        with deadline.phase(REQUEST):
+            try:
+                return self.transport.request(method, url, **kwargs)
+            except Exception as error:
+                if deadline.expired():
+                    raise DeadlineExceeded(deadline, REQUEST) from error
+                raise
+
+    def _backoff(self, retry, response, deadline=None):
+        """
+        Wait before sending retry again
+        """
+        delay = self._retry_delay(retry, response)
+        if deadline is not None and delay >= deadline.remaining():
+            raise DeadlineExceeded(deadline, BACKOFF)
+
+        with phase(deadline, BACKOFF):
+            time.sleep(delay)
+
+    def _retry_delay(self, retry, response):
+        """
+        Return the seconds to wait before retry, see retry_delay
+        """
+        return retry_delay(self.backoff_factor, retry, response)
+
+    def _emit_retry(self, endpoint, attempt, reason):
+        for hook in self.hooks:
+            hook.on_retry(endpoint, attempt, reason)
+
+    def _json_body(self, payload, headers=None):
+        """
+        Return (data, headers) to send payload as a JSON body. Payloads that
+        are already serialized to bytes or str are sent as they are.
+        """
+        data, content_encoding = encode_body(payload, self.json_dumps, self.compress_threshold)
+        headers = dict(headers or {})
+        headers['Content-Type'] = 'application/json'
+        if content_encoding:
+            headers['Content-Encoding'] = content_encoding
+
+        return data, headers
+
+    def _check_rule_set(self, endpoint, rule_set):
+        """
+        Return True if the payload of rule_set is valid, reporting the time
+        the validation took to the hooks
+        """
+        if not self.hooks:
+            return bool(rule_set)
+
+        start = time.perf_counter()
+        valid = bool(rule_set)
+        elapsed = time.perf_counter() - start
+        for hook in self.hooks:
+            hook.on_validation(endpoint, elapsed, valid)
+
+        return valid
+
+    @property
+    def headers(self):
+        """
+        Return the headers for a request, with the current token if a
+        token_provider is set
+        """
+        if self.token_provider is None:
+            return self._headers
+
+        headers = dict(self._headers or {})
+        headers['Authorization'] = f'Bearer {self.token_provider()}'
+        return headers
+
+    @headers.setter
+    def headers(self, value):
+        self._headers = value
+
+
+class AsyncNewStoreAPIBase(NewStoreAPIBase):
+    """
+    Parent class for the async NewStore API classes. `session` is the
+    httpx.AsyncClient owned by AsyncNewStoreConnector, and the default
+    `transport` sending the requests.
+    """
+
+    def __init__(self, **kwargs) -> None:
+
+        super().__init__(**kwargs)
+        # The async token_provider is a coroutine function, awaited in _request
+        self.async_token_provider = kwargs.get('async_token_provider')
+
+    async def _request(self, method, url, endpoint=None, deadline=None, **kwargs):
+        """
+        Send a request with the async transport, retrying it like
+        NewStoreAPIBase._send_with_retries
+        """
+        if self.async_token_provider is not None:
+            headers = dict(kwargs.get('headers') or {})
+            headers['Authorization'] = f'Bearer {await self._async_token(deadline)}'
+            kwargs['headers'] = headers
+
+        if not self.hooks:
+            return await self._send_with_retries(method, url, endpoint, deadline, **kwargs)
+
+        for hook in self.hooks:
+            hook.before_request(endpoint, method, url)
+
+        start = time.perf_counter()
+        try:
+            response = await self._send_with_retries(method, url, endpoint, deadline, **kwargs)
+        except Exception as error:
+            elapsed = time.perf_counter() - start
+            for hook in self.hooks:
+                hook.on_error(endpoint, error, elapsed)
+            raise
+
+        elapsed = time.perf_counter() - start
+        for hook in self.hooks:
+            hook.after_request(endpoint, response, elapsed)
+
+        return response
+
+    async def _hedged_request(self, method, url, endpoint=None, deadline=None, **kwargs):
+        """
+        Send an idempotent request like _request, hedged by the hedger if one is set
+        """
+        if self.hedger is None:
+            return await self._request(method, url, endpoint, deadline, **kwargs)
+
+        return await self.hedger.async_run(
+            endpoint, lambda: self._request(method, url, endpoint, deadline, **kwargs))
+
+    async def _async_token(self, deadline=None):
+        """
+        Return the token, fetching it within deadline
+        """
+        import asyncio # pylint: disable=import-outside-toplevel
+
+        if deadline is None:
+            return await self.async_token_provider()
+
+        with deadline.phase(TOKEN):
+            try:
+                return await asyncio.wait_for(self.async_token_provider(),
+                                              deadline.timeout(TOKEN))
+            except asyncio.TimeoutError as error:
+                raise DeadlineExceeded(deadline, TOKEN) from error
+
+    # pylint: disable=invalid-overridden-method
+    async def _send_with_retries(self, method, url, endpoint, deadline=None, **kwargs):
+        """
+        Send a request, retrying it as described in NewStoreAPIBase._send_with_retries
+        """
+        retry = 0
+        throttled = 0
+        while True:
+            try:
+                response = await self._send(method, url, endpoint, deadline, **kwargs)
+            except Exception as error:
+                if not self._should_retry_error(method, error, retry):
+                    raise
+                retry += 1
+                self._emit_retry(endpoint, retry, type(error).__name__)
+                await self._backoff(retry, None, deadline)
+                continue
+
+            if self.rate_limiter is not None and response.status_code == RATE_LIMITED_STATUS:
+                if throttled >= self.rate_limiter.max_retries:
+                    return response
+                throttled += 1
+                self._emit_retry(endpoint, throttled, response.status_code)
+                continue
+
+            if not self._should_retry(method, response, retry):
+                return response
+
+            retry += 1
+            self._emit_retry(endpoint, retry, response.status_code)
+            await self._backoff(retry, response, deadline)
+
+    async def _send(self, method, url, endpoint, deadline=None, **kwargs):
+        """
+        Send a single request, through the circuit breaker if one is set
+        """
+        if self.circuit_breaker is None:
+            return await self._send_limited(method, url, endpoint, deadline, **kwargs)
+
+        with self.circuit_breaker.guard(endpoint) as circuit:
+            response = await self._send_limited(method, url, endpoint, deadline, **kwargs)
+            circuit.record(response.status_code)
+
+        return response
+
+    async def _send_limited(self, method, url, endpoint, deadline=None, **kwargs):
+        """
+        Send a single request, through the rate limiter if one is set
+        """
+        if self.rate_limiter is None:
+            return await self._send_within(method, url, deadline, **kwargs)
+
+        async with self.rate_limiter.async_acquire(endpoint, deadline) as bucket:
+            response = await self._send_within(method, url, deadline, **kwargs)
+            bucket.record(response.status_code, response.headers.get('Retry-After'))
+
+        return response
+
+    async def _send_within(self, method, url, deadline=None, **kwargs):
+        """
+        Send a request, cancelling it once deadline has no time left
+        """
+        import asyncio # pylint: disable=import-outside-toplevel
+
+        if deadline is None:
+            return await self.transport.request(method, url, **kwargs)
+
+        remaining = deadline.timeout(REQUEST)
+        kwargs['timeout'] = deadline.timeout(REQUEST, kwargs.get('timeout'))
+        with deadline.phase(REQUEST):
+            try:
+                return await asyncio.wait_for(self.transport.request(method, url, **kwargs),
+                                              remaining)
+            except Exception as error:
+                if deadline.expired():
+                    raise DeadlineExceeded(deadline, REQUEST) from error
+                raise
+
+    async def _backoff(self, retry, response, deadline=None):
+        """
+        Wait before sending retry again
+        """
+        import asyncio # pylint: disable=import-outside-toplevel
+
+        delay = self._retry_delay(retry, response)
+        if deadline is not None and delay >= deadline.remaining():
+            raise DeadlineExceeded(deadline, BACKOFF)
+
+        with phase(deadline, BACKOFF):
+            await asyncio.sleep(delay)
@@ -0,0 +1,202 @@
+"""
+Module for defining the AsyncNewStoreConnector Class
+"""
+
+try:
+    import httpx
+except ImportError: # pragma: no cover
+    httpx = None
+
+from .ns_connector import STATUS_FORCELIST, BACKOFF_FACTOR
+from .ns_connector_base_class import NewStoreConnectorBase
+from .token_manager import AsyncTokenManager, FileTokenCache, TOKEN_REFRESH_MARGIN
+
+MAX_CONNECTIONS = 100
+MAX_KEEPALIVE_CONNECTIONS = 20
+TIMEOUT = 30
+
+
+class AsyncNewStoreConnector(NewStoreConnectorBase):
+    """
+    Asyncio class for interacting with the NewStore API. All API classes share
+    one pooled httpx.AsyncClient, so many concurrent calls run on a single
+    event loop.
+    """
+    def __init__(self, **kwargs):
+        """
+        Initialize the AsyncNewStoreConnector Class
+        """
+        if httpx is None:
+            raise ImportError("AsyncNewStoreConnector requires httpx. "
+                              "Install it with `pip install newstore_connector[async]`")
+
+        self._validate_init_params(**kwargs)
+        self._configure(**kwargs)
+
+        # Retry settings mirror the sync connector
+        self.rate_limiter = kwargs.get("rate_limiter")
+        self.hooks = kwargs.get("hooks") or []
+        self.max_retries = kwargs.get("max_retries", 0)
+        self.backoff_factor = kwargs.get("backoff_factor", BACKOFF_FACTOR)
+        self.status_forcelist = kwargs.get("status_forcelist", STATUS_FORCELIST)
+
+        # Request body encoding shared by every API class
+        self.json_dumps = kwargs.get("json_dumps")
+        self.compress_threshold = kwargs.get("compress_threshold")
+
+        # OrderJournal recording injected orders, see journal.py
+        self.journal = kwargs.get("journal")
+
+        # NotesCache of get_order_notes responses, see order_notes/notes_cache.py
+        self.notes_cache = kwargs.get("notes_cache")
+
+        # CircuitBreaker failing fast on failing endpoints, see circuit_breaker.py
+        self.circuit_breaker = kwargs.get("circuit_breaker")
+
+        # Hedger for idempotent reads, see hedging.py
+        self.hedger = kwargs.get("hedger")
+
+        # Seconds every API call may take, see deadline.py
+        self.deadline = kwargs.get("deadline")
+
+        self.session = kwargs.get("session") or httpx.AsyncClient(
+            http2=kwargs.get("http2", False),
+            limits=httpx.Limits(
+                max_connections=kwargs.get("max_connections", MAX_CONNECTIONS),
+                max_keepalive_connections=kwargs.get("max_keepalive_connections",
+                                                     MAX_KEEPALIVE_CONNECTIONS)
+            ),
+            timeout=kwargs.get("timeout", TIMEOUT)
+        )
+        # Transport sending every request, an object whose request(method, url,
+        # **kwargs) is a coroutine taking the arguments of httpx.AsyncClient.request.
+        # Default: the session
+        self.transport = kwargs.get("transport") or self.session
+
+        # The token can't be fetched in __init__, it is fetched by authenticate()
+        # or on the first request, and refreshed ahead of expiry
+        self.token_manager = AsyncTokenManager(
+            self._fetch_token,
+            refresh_margin=kwargs.get("token_refresh_margin", TOKEN_REFRESH_MARGIN),
+            cache=kwargs.get("token_cache"),
+            cache_key=FileTokenCache.build_key(self.tenant, self.role, self.client_id)
+        )
+        if kwargs.get("token"):
+            self.token = kwargs.get("token")
+
+    @property
+    def token(self):
+        """
+        Return the current token. Await authenticate() to refresh it if needed
+        """
+        return self.token_manager.token
+
+    @token.setter
+    def token(self, value):
+        """
+        Set a token from an external authentication manager. It is not refreshed
+        """
+        self.token_manager.set_token(value)
+
+    async def authenticate(self):
+        """
+        Fetch an authentication token if there is none or it is due for a refresh
+        """
+        return await self.token_manager.get_token()
+
+    async def _fetch_token(self):
+        """
+        Fetch a new token, returns (token, expires_in) for the AsyncTokenManager
+        """
+        token = await self._get_auth_token()
+        return token, self.token_ttl
+
+    async def _get_auth_token(self):
+        """
+        Get the authentication token for the NewStore API
+        """
+        url, headers, payload = self._auth_request()
+        response = await self.transport.request("POST", url, headers=headers, content=payload)
+        response.raise_for_status()
+        return self._parse_auth_response(response.json())
+
+    async def aclose(self):
+        """
+        Close the pooled connections of the connector
+        """
+        await self.session.aclose()
+
+    async def __aenter__(self):
+        await self.authenticate()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    def _setup_api_class(self, api_class):
+        """
+        Return an instance of api_class sharing the connector session and settings
+        """
+        return api_class(base_url=self.base_url,
+                         session=self.session,
+                         transport=self.transport,
+                         async_token_provider=self.token_manager.get_token,
+                         rate_limiter=self.rate_limiter,
+                         hooks=self.hooks,
+                         json_dumps=self.json_dumps,
+                         compress_threshold=self.compress_threshold,
+                         journal=self.journal,
+                         notes_cache=self.notes_cache,
+                         circuit_breaker=self.circuit_breaker,
+                         hedger=self.hedger,
+                         deadline=self.deadline,
+                         max_retries=self.max_retries,
+                         backoff_factor=self.backoff_factor,
+                         status_forcelist=self.status_forcelist)
+
+    # Define the API Classes as Properties Here
+    # This allows us to only initialize the API Classes when they are needed
+    # pylint: disable=import-outside-toplevel
+    @property
+    def order_injection(self):
+        """
+        Return the appropriate async OrderInjection Class for the NewStore API
+        """
+        if not self._order_injection:
+            self.order_injection = "0.1"
+
+        return self._order_injection
+
+    @order_injection.setter
+    def order_injection(self, value):
+        """
+        Set the async OrderInjection Class based on the version passed to the setter
+        """
+        if value == "0.1":
+            from .order_injection import AsyncOrderInjectionV01
+
+            self._order_injection = self._setup_api_class(AsyncOrderInjectionV01)
+        else:
+            raise ValueError(f"Invalid OrderInjection Version: {value}")
+
+    @property
+    def order_notes(self):
+        """
+        Return the appropriate async OrderNotes Class for the NewStore API
+        """
+        if not self._order_notes:
+            self.order_notes = "0.1.0"
+
+        return self._order_notes
+
+    @order_notes.setter
+    def order_notes(self, value):
+        """
+        Set the async OrderNotes Class based on the version passed to the setter
+        """
+        if value == "0.1.0":
+            from .order_notes import AsyncOrderNotesV010
+
+            self._order_notes = self._setup_api_class(AsyncOrderNotesV010)
+        else:
+            raise ValueError(f"Invalid OrderNotes Version: {value}")
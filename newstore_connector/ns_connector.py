@@ -1,15 +1,125 @@
 """
 Module for defining the NewStoreConnector Class
 """
+import os
+import threading
+import time
+import weakref
 
+import requests
 from api_toolkit.connector import APIConnector
-from api_toolkit import modifiers as m
+from requests.adapters import HTTPAdapter
+
+from .deadline import DeadlineExceeded, as_deadline, TOKEN
+from .ns_api_base_class import retry_delay, transport_error
+from .ns_connector_base_class import NewStoreConnectorBase
+from .token_manager import TokenManager, FileTokenCache, TOKEN_REFRESH_MARGIN
+from .transports import CONNECTION_STATS
 
 STATUS_FORCELIST = [408, 413, 429, 500, 502, 503, 504, 521, 522, 524]
 BACKOFF_FACTOR = 2
-class NewStoreConnector(APIConnector):
+POOL_CONNECTIONS = 10
+POOL_MAXSIZE = 20
+# When the connector fetches its token, see NewStoreConnector.auth_mode
+AUTH_EAGER = "eager"
+AUTH_LAZY = "lazy"
+AUTH_BACKGROUND = "background"
+# Settings bound to this process, a pickled connector is created without them
+PROCESS_LOCAL = ("session", "transport", "auth_session", "hooks", "rate_limiter",
+                 "circuit_breaker", "hedger", "journal", "notes_cache", "token")
+
+# Connectors of this process, given their own connections in forked children
+_CONNECTORS = weakref.WeakSet()
+
+
+def _after_fork_in_child():
+    for connector in list(_CONNECTORS):
+        connector._after_fork() # pylint: disable=protected-access
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def _renew_adapters(session):
+    """
+    Mount new adapters with the settings of the current ones, leaving the
+    pooled connections of the old adapters unused
+    """
+    for prefix, adapter in list(session.adapters.items()):
+        if isinstance(adapter, HTTPAdapter):
+            # pylint: disable=protected-access
+            session.mount(prefix, HTTPAdapter(pool_connections=adapter._pool_connections,
+                                              pool_maxsize=adapter._pool_maxsize,
+                                              pool_block=adapter._pool_block,
+                                              max_retries=adapter.max_retries))
+
+
+def _open_connections(session, url, count):
+    """
+    Connect up to count pooled connections of session to the host of url,
+    returns the number of connections opened
+    """
+    adapter = session.get_adapter(url)
+    request = requests.Request("GET", url).prepare()
+    # The pool of a request depends on its TLS settings, IE: REQUESTS_CA_BUNDLE
+    settings = session.merge_environment_settings(url, {}, None, None, None)
+    if hasattr(adapter, "get_connection_with_tls_context"):
+        pool = adapter.get_connection_with_tls_context(request, settings["verify"],
+                                                       settings["proxies"], settings["cert"])
+    else: # pragma: no cover
+        pool = adapter.get_connection(url)
+
+    # pylint: disable=protected-access
+    connections = []
+    opened = 0
+    try:
+        for _ in range(min(count, adapter._pool_maxsize)):
+            connection = pool._get_conn()
+            connections.append(connection)
+            if connection.sock is None:
+                connection.connect()
+                opened += 1
+    finally:
+        for connection in connections:
+            pool._put_conn(connection)
+
+    return opened
+
+
+def _session_stats(session):
+    """
+    Return the connection reuse counters summed over the pools of session
+    """
+    stats = dict.fromkeys(CONNECTION_STATS, 0)
+    adapters = {id(adapter): adapter for adapter in session.adapters.values()}
+    for adapter in adapters.values():
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            stats["pools"] += 1
+            stats["requests"] += pool.num_requests
+            stats["connections_opened"] += pool.num_connections
+            stats["idle_connections"] += pool.pool.qsize() if pool.pool else 0
+
+    stats["connections_reused"] = max(stats["requests"] - stats["connections_opened"], 0)
+    return stats
+
+
+class NewStoreConnector(NewStoreConnectorBase, APIConnector):
     """
     Primary class for interacting with the NewStore API
+
+    A connector can be shared by many threads. The session, token manager,
+    rate limiter and API classes are safe to use concurrently, and the API
+    classes are created once even if first used from several threads at the
+    same time. Changing attributes of the connector or its API classes while
+    requests are running is not thread safe.
+
+    A forked child process gets its own connections, and a pickled connector
+    carries its settings and current token to another process.
     """
     def __init__(self, **kwargs):
         """
@@ -17,92 +127,282 @@ class NewStoreConnector(APIConnector):
         """
         # Populate parameters and establish the connection
         self._validate_init_params(**kwargs)
+        self.auth_mode = kwargs.get("auth_mode", AUTH_EAGER)
+        if self.auth_mode not in (AUTH_EAGER, AUTH_LAZY, AUTH_BACKGROUND):
+            raise ValueError({"auth_mode": f"Must be one of {AUTH_EAGER}, {AUTH_LAZY} "
+                                           f"or {AUTH_BACKGROUND}"})
+        self._config = dict(kwargs)
 
-        # Check if retry settings have been passed, if not, set defaults
+        # Check if retry settings have been passed, if not, set defaults.
+        # With a rate limiter, 429 is retried by the limiter so it can adapt
+        self.rate_limiter = kwargs.get("rate_limiter")
+        if self.rate_limiter is not None:
+            kwargs.setdefault("status_forcelist",
+                              [status for status in STATUS_FORCELIST if status != 429])
         kwargs.setdefault("status_forcelist", STATUS_FORCELIST)
         kwargs.setdefault("backoff_factor", BACKOFF_FACTOR)
 
         # Initialize the APIConnector Class features
         super().__init__(**kwargs)
 
+        # Statuses in status_forcelist are retried by the API classes, so
+        # retries can be bounded by a deadline
+        self.max_retries = kwargs.get("max_retries", 0)
+        self.backoff_factor = kwargs.get("backoff_factor")
+        self.status_forcelist = kwargs.get("status_forcelist")
+        self.allowed_methods = kwargs.get("allowed_methods")
+
+        # Size the connection pools for the threads sharing the connector
+        self._mount_adapters(**kwargs)
+
         # Set the tenant information for the NewStore API
-        self.tenant = kwargs.get("tenant")
-        self.env = kwargs.get("env", "p")
-        self._base_url = f"https://{self.tenant}.{self.env}.newstore.net/"
-        self.client_id = kwargs.get("client_id")
-        self.client_secret = kwargs.get("client_secret")
-        self.role = kwargs.get("role", "iam:providers:read")
+        self._configure(**kwargs)
+        self._api_class_lock = threading.Lock()
+
+        # RequestHooks shared by every API class, IE: a MetricsCollector
+        self.hooks = kwargs.get("hooks") or []
+
+        # Request body encoding shared by every API class
+        self.json_dumps = kwargs.get("json_dumps")
+        self.compress_threshold = kwargs.get("compress_threshold")
+
+        # OrderJournal recording injected orders, see journal.py
+        self.journal = kwargs.get("journal")
+
+        # NotesCache of get_order_notes responses, see order_notes/notes_cache.py
+        self.notes_cache = kwargs.get("notes_cache")
+
+        # CircuitBreaker failing fast on failing endpoints, see circuit_breaker.py
+        self.circuit_breaker = kwargs.get("circuit_breaker")
+
+        # Hedger for idempotent reads, see hedging.py
+        self.hedger = kwargs.get("hedger")
+
+        # Seconds every API call and token fetch may take, see deadline.py
+        self.deadline = kwargs.get("deadline")
+
+        # Transport sending every request, see transports.py. Default: the session
+        self.transport = kwargs.get("transport") or self.session
+
+        # Session for token requests, IE: one shared by the connectors of a
+        # NewStoreConnectorRegistry. Default: the connector transport
+        self.auth_session = kwargs.get("auth_session") or self.transport
+
+        # Tokens fetched by the connector are refreshed ahead of expiry
+        self.token_manager = TokenManager(
+            self._fetch_token,
+            refresh_margin=kwargs.get("token_refresh_margin", TOKEN_REFRESH_MARGIN),
+            cache=kwargs.get("token_cache"),
+            cache_key=FileTokenCache.build_key(self.tenant, self.role, self.client_id)
+        )
 
         # This needs to be done after super().__init__ because it uses the
-        # session created in the parent class
-        self.token_ttl = None # Used if This class fetches a Token
-        self.roles = [] # Caching valid roles for client for potential future use
-        self.token = kwargs.get("token") or self._get_auth_token()
-
-        # Initialize empty instance variables for the API Classes
-        self._order_injection = None
-        self._order_notes = None
-
-    def _validate_init_params(self, **kwargs):
-        """
-        Validate the required parameters are present and raise an exception
-        If they are not
-        """
-        error_dict = {}
-        # If tenant is not provided
-        if not kwargs.get("tenant"):
-            error_dict["tenant"] = "Missing required parameter"
-        # If client_id is provided but client_secret and token are not
-        if kwargs.get('client_id') and\
-              not kwargs.get('client_secret') and\
-                  not kwargs.get('token'):
-            error_dict["client_secret"] = "client_secret required for client_id authentication"
-        # If client_secret is provided but client_id and token are not
-        if kwargs.get('client_secret') and\
-              not kwargs.get('client_id') and\
-                  not kwargs.get('token'):
-            error_dict["client_id"] = "client_id required for client_id authentication"
-        # If token, client_id, and client_secret are not provided
-        if not kwargs.get('token') and\
-              not kwargs.get('client_id') and\
-                  not kwargs.get('client_secret'):
-            error_dict["Auth"] = "client_id/client_secret or Token required for authentication"
-        # If there are errors, raise ValueError
-        if error_dict:
-            raise ValueError(error_dict)
-
-    def _get_auth_token(self):
-        """
-        Get the authentication token for the NewStore API
-        """
-        url = f"https://id.p.newstore.net/auth/realms/{self.tenant}/protocol/openid-connect/token"
-
-        headers = {
-            'Content-Type': 'application/x-www-form-urlencoded',
-            'Authorization': f'Basic {m.base64_encode(f"{self.client_id}:{self.client_secret}")}'
-        }
+        # session created in the parent class. Lazy connectors fetch the
+        # token on the first request, the API classes ask the token manager
+        self.auth_thread = None
+        if kwargs.get("token"):
+            self.token = kwargs.get("token")
+        elif self.auth_mode == AUTH_BACKGROUND:
+            self.auth_thread = threading.Thread(target=self._authenticate_quietly,
+                                                daemon=True)
+            self.auth_thread.start()
+        elif self.auth_mode == AUTH_EAGER:
+            self.token_manager.get_token(as_deadline(self.deadline))
 
-        payload = f'grant_type=client_credentials&scope={m.url_encode(self.role)}'
-        response = self.session.post(url, headers=headers, data=payload)
-        response.raise_for_status()
-        self.token_ttl = response.json().get("expires_in")
-        self.roles = response.json().get("scope").split(" ")
-        return response.json().get("access_token")
+        _CONNECTORS.add(self)
 
-    def _get_headers(self):
+    def __getstate__(self):
         """
-        Return the basic header for making NewStore API Requests
+        Pickle the settings and current token. Settings bound to this process,
+        see PROCESS_LOCAL, are left out.
         """
         return {
-            'Authorization': f'Bearer {self.token}'
+            "config": {key: value for key, value in self._config.items()
+                       if key not in PROCESS_LOCAL},
+            "token": self.token_manager.token,
+            "expires_at": self.token_manager.expires_at
         }
 
+    def __setstate__(self, state):
+        """
+        Create the connector again from pickled settings. A token that is
+        still valid is used without authenticating.
+        """
+        config = dict(state["config"])
+        token, expires_at = state["token"], state["expires_at"]
+        valid = token is not None and (expires_at is None or time.time() < expires_at)
+        if valid:
+            config["token"] = token
+
+        self.__init__(**config) # pylint: disable=unnecessary-dunder-call
+        if valid and expires_at is not None:
+            # Refreshed with the client credentials like the original token
+            self.token_manager.set_token(token, expires_at - time.time())
+
+    def _authenticate_quietly(self):
+        """
+        Fetch the token of a background auth_mode connector. A failure is
+        left to the first request, which fetches the token again and raises
+        """
+        try:
+            self.token_manager.get_token(as_deadline(self.deadline))
+        except Exception: # pylint: disable=broad-exception-caught
+            pass
+
+    def _after_fork(self):
+        """
+        Give a forked child process its own connections and locks, including
+        those of the rate limiter, circuit breaker, hooks, notes cache and
+        journal. The pooled connections of the parent are left to it, API
+        classes already created keep using the same session.
+        """
+        self._api_class_lock = threading.Lock()
+        self.token_manager.after_fork()
+        sessions = {id(session): session for session in (self.session, self.auth_session)
+                    if isinstance(session, requests.Session)}
+        for session in sessions.values():
+            _renew_adapters(session)
+        for shared in (self.transport, self.hedger, self.rate_limiter, self.circuit_breaker,
+                       self.notes_cache, self.journal, *self.hooks):
+            after_fork = getattr(shared, "after_fork", None)
+            if after_fork is not None:
+                after_fork()
+
+    def warm_up(self, connections=1, background=False):
+        """
+        Fetch the token if it is due for a refresh and open connections of
+        the transport to the NewStore API ahead of the first requests, IE: in
+        a worker after fork. Returns the number of connections opened, never
+        more than pool_maxsize. With background, warming runs in a daemon thread
+        which is returned.
+        """
+        if background:
+            thread = threading.Thread(target=self.warm_up, args=(connections,), daemon=True)
+            thread.start()
+            return thread
+
+        self.token_manager.get_token(as_deadline(self.deadline))
+        if isinstance(self.transport, requests.Session):
+            return _open_connections(self.transport, self.base_url, connections)
+
+        warm_up = getattr(self.transport, "warm_up", None)
+        return warm_up(self.base_url, connections) if warm_up is not None else 0
+
     @property
-    def base_url(self):
+    def token(self):
+        """
+        Return a valid token for the NewStore API, refreshing it if needed
+        """
+        return self.token_manager.get_token(as_deadline(self.deadline))
+
+    @token.setter
+    def token(self, value):
+        """
+        Set a token from an external authentication manager. It is not refreshed
+        """
+        self.token_manager.set_token(value)
+
+    def _fetch_token(self, deadline=None):
+        """
+        Fetch a new token, returns (token, expires_in) for the TokenManager
+        """
+        token = self._get_auth_token(deadline)
+        return token, self.token_ttl
+
+    def _mount_adapters(self, **kwargs):
+        """
+        Replace the adapters mounted by APIConnector with adapters sized by
+        pool_connections, pool_maxsize and pool_block. They don't retry
+        statuses, connection or read errors: the API classes retry them
+        within the deadline of the call.
+        """
+        for prefix, adapter in list(self.session.adapters.items()):
+            self.session.mount(prefix, HTTPAdapter(
+                pool_connections=kwargs.get("pool_connections", POOL_CONNECTIONS),
+                pool_maxsize=kwargs.get("pool_maxsize", POOL_MAXSIZE),
+                pool_block=kwargs.get("pool_block", False),
+                max_retries=adapter.max_retries.new(connect=0, read=0, status_forcelist=None,
+                                                    respect_retry_after_header=False)
+            ))
+
+    def connection_stats(self):
+        """
+        Return the connection reuse counters of the transport, summed over the
+        pools of the session for the default transport. Pools evicted by
+        pool_connections are no longer counted.
+        """
+        if isinstance(self.transport, requests.Session):
+            return _session_stats(self.transport)
+
+        stats = getattr(self.transport, "stats", None)
+        return stats() if stats is not None else dict.fromkeys(CONNECTION_STATS, 0)
+
+    def _get_auth_token(self, deadline=None):
+        """
+        Get the authentication token for the NewStore API, within deadline if set.
+        Connection errors and statuses in status_forcelist are retried up to
+        max_retries times, like the requests of the API classes.
+        """
+        url, headers, payload = self._auth_request()
+        retry = 0
+        while True:
+            response = None
+            try:
+                response = self._send_auth_request(url, headers, payload, deadline)
+            except Exception as error:
+                if transport_error(error) is None or retry >= self.max_retries:
+                    raise
+            else:
+                if response.status_code not in self.status_forcelist or \
+                        retry >= self.max_retries:
+                    break
+
+            retry += 1
+            delay = retry_delay(self.backoff_factor, retry, response)
+            if deadline is not None and delay >= deadline.remaining():
+                raise DeadlineExceeded(deadline, TOKEN)
+            time.sleep(delay)
+
+        response.raise_for_status()
+        return self._parse_auth_response(response.json())
+
+    def _send_auth_request(self, url, headers, payload, deadline=None):
+        """
+        Send the token request once, with its timeout capped by deadline
+        """
+        if deadline is None:
+            return self.auth_session.request("POST", url, headers=headers, data=payload)
+
+        try:
+            return self.auth_session.request("POST", url, headers=headers, data=payload,
+                                             timeout=deadline.timeout(TOKEN))
+        except Exception as error:
+            if deadline.expired():
+                raise DeadlineExceeded(deadline, TOKEN) from error
+            raise
+
+    def _setup_api_class(self, api_class):
         """
-        Return the base URL for the NewStore API
+        Return an instance of api_class sharing the connector session and settings.
+        It is fully configured before it is published to other threads.
         """
-        return self._base_url
+        return api_class(base_url=self.base_url,
+                         session=self.session,
+                         transport=self.transport,
+                         token_provider=self.token_manager.get_token,
+                         rate_limiter=self.rate_limiter,
+                         hooks=self.hooks,
+                         json_dumps=self.json_dumps,
+                         compress_threshold=self.compress_threshold,
+                         journal=self.journal,
+                         notes_cache=self.notes_cache,
+                         circuit_breaker=self.circuit_breaker,
+                         hedger=self.hedger,
+                         deadline=self.deadline,
+                         max_retries=self.max_retries,
+                         backoff_factor=self.backoff_factor,
+                         status_forcelist=self.status_forcelist,
+                         allowed_methods=self.allowed_methods)
 
     # Define the API Classes as Properties Here
     # This allows us to only initialize the API Classes when they are needed
@@ -113,7 +413,9 @@ class NewStoreConnector(APIConnector):
         Return the appropriate OrderInjection Class for the NewStore API
         """
         if not self._order_injection:
-            self.order_injection = "0.1"
+            with self._api_class_lock:
+                if not self._order_injection:
+                    self.order_injection = "0.1"
 
         return self._order_injection
 
@@ -125,10 +427,7 @@ class NewStoreConnector(APIConnector):
         if value == "0.1":
             from .order_injection import OrderInjectionV01
 
-            self._order_injection = OrderInjectionV01()
-            self._order_injection.headers = self._get_headers()
-            self._order_injection.session = self.session
-            self._order_injection.base_url = self.base_url
+            self._order_injection = self._setup_api_class(OrderInjectionV01)
         else:
             raise ValueError(f"Invalid OrderInjection Version: {value}")
 
@@ -138,7 +437,9 @@ class NewStoreConnector(APIConnector):
         Return the appropriate OrderNotes Class for the NewStore API
         """
         if not self._order_notes:
-            self.order_notes = "0.1.0"
+            with self._api_class_lock:
+                if not self._order_notes:
+                    self.order_notes = "0.1.0"
 
         return self._order_notes
 
@@ -150,9 +451,6 @@ class NewStoreConnector(APIConnector):
         if value == "0.1.0":
             from .order_notes import OrderNotesV010
 
-            self._order_notes = OrderNotesV010()
-            self._order_notes.headers = self._get_headers()
-            self._order_notes.session = self.session
-            self._order_notes.base_url = self.base_url
+            self._order_notes = self._setup_api_class(OrderNotesV010)
         else:
             raise ValueError(f"Invalid OrderNotes Version: {value}")
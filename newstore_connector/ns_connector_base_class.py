@@ -0,0 +1,97 @@
+"""
+Parent class for the NewStore Connector Classes
+"""
+
+from api_toolkit import modifiers as m
+
+AUTH_URL = "https://id.p.newstore.net/auth/realms/{tenant}/protocol/openid-connect/token"
+
+
+class NewStoreConnectorBase:
+    """
+    Configuration and authentication logic shared by the sync and async
+    NewStore connectors. Does not make any requests itself.
+    """
+
+    def _configure(self, **kwargs):
+        """
+        Set the tenant and credential information for the NewStore API
+        """
+        self.tenant = kwargs.get("tenant")
+        self.env = kwargs.get("env", "p")
+        self._base_url = f"https://{self.tenant}.{self.env}.newstore.net/"
+        self.client_id = kwargs.get("client_id")
+        self.client_secret = kwargs.get("client_secret")
+        self.role = kwargs.get("role", "iam:providers:read")
+
+        self.token_ttl = None # Used if This class fetches a Token
+        self.roles = [] # Caching valid roles for client for potential future use
+
+        # Initialize empty instance variables for the API Classes
+        self._order_injection = None
+        self._order_notes = None
+
+    def _validate_init_params(self, **kwargs):
+        """
+        Validate the required parameters are present and raise an exception
+        If they are not
+        """
+        error_dict = {}
+        # If tenant is not provided
+        if not kwargs.get("tenant"):
+            error_dict["tenant"] = "Missing required parameter"
+        # If client_id is provided but client_secret and token are not
+        if kwargs.get('client_id') and\
+              not kwargs.get('client_secret') and\
+                  not kwargs.get('token'):
+            error_dict["client_secret"] = "client_secret required for client_id authentication"
+        # If client_secret is provided but client_id and token are not
+        if kwargs.get('client_secret') and\
+              not kwargs.get('client_id') and\
+                  not kwargs.get('token'):
+            error_dict["client_id"] = "client_id required for client_id authentication"
+        # If token, client_id, and client_secret are not provided
+        if not kwargs.get('token') and\
+              not kwargs.get('client_id') and\
+                  not kwargs.get('client_secret'):
+            error_dict["Auth"] = "client_id/client_secret or Token required for authentication"
+        # If there are errors, raise ValueError
+        if error_dict:
+            raise ValueError(error_dict)
+
+    def _auth_request(self):
+        """
+        Return the url, headers and form payload for an authentication token request
+        """
+        url = AUTH_URL.format(tenant=self.tenant)
+
+        headers = {
+            'Content-Type': 'application/x-www-form-urlencoded',
+            'Authorization': f'Basic {m.base64_encode(f"{self.client_id}:{self.client_secret}")}'
+        }
+
+        payload = f'grant_type=client_credentials&scope={m.url_encode(self.role)}'
+        return url, headers, payload
+
+    def _parse_auth_response(self, response_json):
+        """
+        Store the token details from an authentication response and return the token
+        """
+        self.token_ttl = response_json.get("expires_in")
+        self.roles = response_json.get("scope").split(" ")
+        return response_json.get("access_token")
+
+    def _get_headers(self):
+        """
+        Return the basic header for making NewStore API Requests
+        """
+        return {
+            'Authorization': f'Bearer {self.token}'
+        }
+
+    @property
+    def base_url(self):
+        """
+        Return the base URL for the NewStore API
+        """
+        return self._base_url
@@ -4,3 +4,15 @@ Order Management API Collection
 https://docs.newstore.net/api/integration/order-management/order_injection_api
 """
 from .order_injection_0_1 import OrderInjectionV01
+
+__all__ = ["OrderInjectionV01", "AsyncOrderInjectionV01"]
+
+
+def __getattr__(name):
+    # The async class loads httpx, so it is imported on first use
+    if name != "AsyncOrderInjectionV01":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    from .async_order_injection_0_1 import AsyncOrderInjectionV01 # pylint: disable=import-outside-toplevel
+    globals()[name] = AsyncOrderInjectionV01
+    return AsyncOrderInjectionV01
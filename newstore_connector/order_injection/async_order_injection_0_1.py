@@ -0,0 +1,87 @@
+"""
+Module for connecting to NewStore Order Injection API v0.1 with asyncio
+https://docs.newstore.net/api/integration/order-management/order_injection_api
+"""
+
+try:
+    import httpx
+except ImportError: # pragma: no cover
+    httpx = None
+
+from ..bulk import AsyncBulkResults, async_bounded_map, order_result
+from ..decorators import async_json_or_full
+from ..ns_api_base_class import AsyncNewStoreAPIBase
+from .order_injection_0_1 import OrderInjectionV01
+
+
+class AsyncOrderInjectionV01(AsyncNewStoreAPIBase, OrderInjectionV01):
+    """
+    Async class for handling Order Injection API requests. Validation is
+    shared with OrderInjectionV01.
+    """
+    api_version = "0.1"
+
+    # pylint: disable=invalid-overridden-method
+    @async_json_or_full
+    async def create_order(self, **kwargs):
+        """
+        Create Order API
+        https://docs.newstore.net/api/integration/order-management/order_injection_api/#operation/CreateOrder
+        """
+        key = body = None
+        if self.journal is not None:
+            key, body, entry = self._begin_journaled_order(kwargs.get('payload'))
+            if entry is not None:
+                return self._journaled_response(entry)
+
+        try:
+            url, payload = self._prepare_create_order(**kwargs)
+            # With a journal the body was already serialized to hash it
+            data, headers = self._json_body(payload if body is None else body,
+                                            self.headers or kwargs.get('headers'))
+
+            response = await self._request("POST", url, "create_order",
+                                           self._start_deadline(kwargs.get('deadline')),
+                                           headers=headers, content=data)
+            response.raise_for_status()
+        except BaseException as error:
+            # Cancelled orders are left in flight like any other interrupted order
+            if self.journal is not None:
+                self._end_journaled_order(key, error=error)
+            raise
+
+        if self.journal is not None:
+            self._end_journaled_order(key, response=response)
+
+        return response
+
+    @staticmethod
+    def _journaled_response(entry):
+        """
+        Rebuild the response of an order that was already injected
+        """
+        return httpx.Response(entry.status_code, content=entry.response,
+                              headers={'Content-Type': 'application/json'})
+
+    def create_orders(self, orders, max_in_flight=8, **kwargs):
+        """
+        Validate and inject many orders concurrently on the event loop.
+        Takes the same arguments as OrderInjectionV01.create_orders and returns
+        an AsyncBulkResults to be consumed with `async for`.
+        """
+        skip_validation = kwargs.get('skip_validation')
+        fail_fast = kwargs.get('fail_fast')
+        deadline = kwargs.get('deadline')
+
+        async def inject(payload):
+            return await self.create_order(payload=payload,
+                                           skip_validation=skip_validation,
+                                           fail_fast=fail_fast,
+                                           deadline=deadline,
+                                           return_json=True)
+
+        async def results():
+            async for payload, task in async_bounded_map(inject, orders, max_in_flight):
+                yield order_result(payload, task)
+
+        return AsyncBulkResults(results())
@@ -0,0 +1,440 @@
+"""
+Typed models of a create_order payload.
+
+Every model is validated when it is constructed, by the create_order rules of
+OrderInjectionV01, and raises ValueError with the errors of the RuleSet.
+Models are immutable, so an Order that was built without errors stays valid
+and create_order sends it without validating it again.
+"""
+import copy
+import functools
+import types
+
+from ..request_lists import CURRENCY_LIST
+from ..serialization import dumps
+
+CHANNEL_TYPES = ('web', 'mobile', 'store')
+PRICE_METHODS = ('tax_included', 'tax_excluded')
+CURRENCIES = tuple(CURRENCY_LIST)
+
+
+class Field:
+    """
+    How a model field is stored. The value of a field is checked by the
+    validation rules of the model, Field only builds it once it is valid.
+    Lists are stored as tuples and dicts as read-only mappings.
+    Args:
+        model(Model): The value is a model, built from a dict
+        items(Model): The value is a list of models, built from dicts
+    """
+    __slots__ = ('model', 'items')
+
+    def __init__(self, model=None, items=None):
+        self.model = model
+        self.items = items
+
+    def build(self, value):
+        """
+        Return the value to store for a valid value
+        """
+        if value is None:
+            return None
+        if self.model is not None and isinstance(value, dict):
+            return self.model.from_valid_dict(value)
+        if self.items is not None:
+            return tuple(self.items.from_valid_dict(item) if isinstance(item, dict) else item
+                         for item in value)
+
+        return _freeze(value)
+
+    def is_built(self, value):
+        """
+        True if value is a model of the field, or a list of them, which are
+        valid already
+        """
+        if self.model is not None:
+            return isinstance(value, self.model)
+        if self.items is not None and isinstance(value, (list, tuple)) and value:
+            return all(isinstance(item, self.items) for item in value)
+
+        return False
+
+
+def _freeze(value):
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return types.MappingProxyType({key: _freeze(item) for key, item in value.items()})
+
+    return value
+
+
+def _to_json_value(value):
+    if isinstance(value, Model):
+        return value.to_dict()
+    if isinstance(value, (list, tuple)):
+        return [_to_json_value(item) for item in value]
+    if isinstance(value, (dict, types.MappingProxyType)):
+        return {key: _to_json_value(item) for key, item in value.items()}
+
+    return value
+
+
+def _dump(value, json_dumps):
+    body = json_dumps(value)
+    return body.encode('utf-8') if isinstance(body, str) else body
+
+
+def _json_chunks(value, json_dumps):
+    """
+    Yield value serialized to JSON bytes in chunks, nested models are written
+    field by field without building their payload dict
+    """
+    if isinstance(value, Model):
+        yield from value._json_chunks(json_dumps) # pylint: disable=protected-access
+    elif isinstance(value, tuple) and value and isinstance(value[0], Model):
+        separator = b"["
+        for item in value:
+            yield separator
+            yield from item._json_chunks(json_dumps) # pylint: disable=protected-access
+            separator = b","
+        yield b"]"
+    else:
+        yield _dump(_to_json_value(value), json_dumps)
+
+
+@functools.lru_cache(maxsize=None)
+def _validation_api():
+    """
+    Return the OrderInjectionV01 whose rulesets validate the models
+    """
+    from .order_injection_0_1 import OrderInjectionV01 # pylint: disable=import-outside-toplevel
+    return OrderInjectionV01()
+
+
+class Model:
+    """
+    Base class of the create_order models. Fields are declared in `_fields`
+    and stored in slots, and `_rules` names the OrderInjectionV01 method
+    building the RuleSet of the model. Keys that are not fields of the model
+    are kept in `extra`, None if there are none, and sent as they are.
+    Models can't be changed once built, use replace() for a changed copy.
+    """
+    __slots__ = ('extra',)
+    _fields = {}
+    _rules = None
+
+    def __init__(self, **kwargs):
+        # Child models are valid already: single models are not checked
+        # again, and lists of models only with the rules of the list itself
+        own_only = []
+        skipped = []
+        data = {}
+        for name, value in kwargs.items():
+            field = self._fields.get(name)
+            if field is None or not field.is_built(value):
+                data[name] = _to_json_value(value)
+            elif field.model is not None:
+                skipped.append(name)
+                data[name] = value
+            else:
+                own_only.append(name)
+                data[name] = list(value)
+
+        errors = self._errors(data, frozenset(own_only), frozenset(skipped))
+        if errors:
+            raise ValueError(errors)
+
+        self._set(data)
+
+    @classmethod
+    def validate(cls, data):
+        """
+        Return the errors of a payload dict for this model, as the create_order
+        RuleSet reports them, or an empty dict if it is valid
+        """
+        return cls._errors(data)
+
+    @classmethod
+    def _errors(cls, data, own_only=frozenset(), skipped=frozenset()):
+        # pylint: disable=protected-access
+        rule_set = _validation_api()._model_ruleset(cls._rules, own_only, skipped)
+        rule_set.test_dict = data
+
+        return copy.deepcopy(rule_set.errors)
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Build the model from a payload dict
+        """
+        return cls(**data)
+
+    @classmethod
+    def from_valid_dict(cls, data):
+        """
+        Build the model from a payload dict that was already validated
+        """
+        model = cls.__new__(cls)
+        model._set(dict(data)) # pylint: disable=protected-access
+
+        return model
+
+    def _set(self, data):
+        for name, field in self._fields.items():
+            object.__setattr__(self, name, field.build(data.pop(name, None)))
+        object.__setattr__(self, 'extra', _freeze(data) if data else None)
+
+    def replace(self, **changes):
+        """
+        Return a copy of the model with the fields in changes set, validated
+        like a new model. Set a field to None to remove it.
+        """
+        data = dict(self.extra or {})
+        data.update((name, getattr(self, name)) for name in self._fields
+                    if getattr(self, name) is not None)
+        data.update(changes)
+
+        return type(self)(**data)
+
+    def to_dict(self):
+        """
+        Return the model as a payload dict. Fields that are not set are left out.
+        """
+        data = {}
+        for name in self._fields:
+            value = getattr(self, name)
+            if value is not None:
+                data[name] = _to_json_value(value)
+        if self.extra:
+            data.update(_to_json_value(self.extra))
+
+        return data
+
+    def to_json(self, json_dumps=None):
+        """
+        Return the model serialized to JSON bytes. Fields are written one by
+        one, without building the payload dict first.
+        """
+        return b"".join(self._json_chunks(json_dumps or dumps))
+
+    def _json_chunks(self, json_dumps):
+        separator = b"{"
+        for name in self._fields:
+            value = getattr(self, name)
+            if value is not None:
+                yield separator + _dump(name, json_dumps) + b":"
+                yield from _json_chunks(value, json_dumps)
+                separator = b","
+        for name, value in (self.extra or {}).items():
+            yield separator + _dump(name, json_dumps) + b":"
+            yield from _json_chunks(value, json_dumps)
+            separator = b","
+        yield b"}" if separator == b"," else b"{}"
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} can't be changed, use replace()")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} can't be changed, use replace()")
+
+    def __reduce__(self):
+        return (type(self).from_valid_dict, (self.to_dict(),))
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self._fields
+                           if getattr(self, name) is not None)
+        return f"{type(self).__name__}({fields})"
+
+
+class ExtendedAttribute(Model):
+    """
+    Extended attribute of an order or item
+    """
+    _rules = '_build_extended_attributes_validation_ruleset'
+    _fields = {
+        'name': Field(),
+        'value': Field()
+    }
+    __slots__ = tuple(_fields)
+
+
+class Address(Model):
+    """
+    Shipping or billing address
+    """
+    _rules = '_build_address_validation_ruleset'
+    _fields = {
+        'title': Field(),
+        'suffix': Field(),
+        'salutation': Field(),
+        'first_name': Field(),
+        'last_name': Field(),
+        'country': Field(),
+        'zip_code': Field(),
+        'city': Field(),
+        'state': Field(),
+        'address_line_1': Field(),
+        'address_line_2': Field(),
+        'phone': Field()
+    }
+    __slots__ = tuple(_fields)
+
+
+class Discount(Model):
+    """
+    Order discount applied to an item or a shipping option
+    """
+    _rules = '_build_order_discount_validation_ruleset'
+    _fields = {
+        'discount_ref': Field(),
+        'coupon_code': Field(),
+        'description': Field(),
+        'type': Field(),
+        'original_value': Field(),
+        'price_adjustment': Field()
+    }
+    __slots__ = tuple(_fields)
+
+
+class TaxLine(Model):
+    """
+    Tax line of an item price
+    """
+    _rules = '_build_item_tax_lines_validation_ruleset'
+    _fields = {
+        'amount': Field(),
+        'rate': Field(),
+        'name': Field(),
+        'country_code': Field()
+    }
+    __slots__ = tuple(_fields)
+
+
+class Price(Model):
+    """
+    Price of an item
+    """
+    _rules = '_build_price_validation_ruleset'
+    _fields = {
+        'item_price': Field(),
+        'item_list_price': Field(),
+        'item_tax_lines': Field(items=TaxLine),
+        'item_order_discount_info': Field(items=Discount),
+        'pricebook': Field(),
+        'group_ref': Field()
+    }
+    __slots__ = tuple(_fields)
+
+
+class Item(Model):
+    """
+    Item of a shipment
+    """
+    _rules = '_build_item_validation_ruleset'
+    _fields = {
+        'external_item_id': Field(),
+        'product_id': Field(),
+        'price': Field(model=Price),
+        'gift_wrapping': Field(),
+        'extended_attributes': Field(items=ExtendedAttribute)
+    }
+    __slots__ = tuple(_fields)
+
+
+class RoutingStrategy(Model):
+    """
+    Routing strategy of a shipping option
+    """
+    _rules = '_build_routing_strategy_validation_ruleset'
+    _fields = {
+        'strategy': Field()
+    }
+    __slots__ = tuple(_fields)
+
+
+class ShippingOption(Model):
+    """
+    Shipping option of a shipment
+    """
+    _rules = '_build_shipping_option_validation_ruleset'
+    _fields = {
+        'service_level_identifier': Field(),
+        'price': Field(),
+        'tax': Field(),
+        'discount_info': Field(items=Discount),
+        'routing_strategy': Field(model=RoutingStrategy)
+    }
+    __slots__ = tuple(_fields)
+
+
+class Shipment(Model):
+    """
+    Shipment of an order
+    """
+    _rules = '_build_shipment_validation_ruleset'
+    _fields = {
+        'items': Field(items=Item),
+        'shipping_option': Field(model=ShippingOption)
+    }
+    __slots__ = tuple(_fields)
+
+
+class Payment(Model):
+    """
+    Payment of an order
+    """
+    _rules = '_build_payment_validation_dict'
+    _fields = {
+        'type': Field(),
+        'amount': Field(),
+        'method': Field(),
+        'wallet': Field(),
+        'processed_at': Field(),
+        'metadata': Field(),
+        'processor': Field(),
+        'correlation_ref': Field()
+    }
+    __slots__ = tuple(_fields)
+
+
+class Order(Model):
+    """
+    Order payload of the create_order API. Pass it to create_order as the
+    payload, it is sent without being validated again.
+    """
+    _rules = '_create_order_validation_ruleset'
+    _fields = {
+        'external_id': Field(),
+        'shop': Field(),
+        'channel_type': Field(),
+        'channel_name': Field(),
+        'store_id': Field(),
+        'associate_id': Field(),
+        'customer_name': Field(),
+        'customer_email': Field(),
+        'shop_locale': Field(),
+        'customer_language': Field(),
+        'external_customer_id': Field(),
+        'placed_at': Field(),
+        'ip_address': Field(),
+        'shipping_address': Field(model=Address),
+        'shipments': Field(items=Shipment),
+        'extended_attributes': Field(items=ExtendedAttribute),
+        'billing_address': Field(model=Address),
+        'payments': Field(items=Payment),
+        'price_method': Field(),
+        'is_preconfirmed': Field(),
+        'is_fulfilled': Field(),
+        'is_offline': Field(),
+        'is_historical': Field(),
+        'notification_blacklist': Field(),
+        'currency': Field()
+    }
+    __slots__ = tuple(_fields)
@@ -2,13 +2,186 @@
 Module for connecting to NewStore Order Injection API v0.1
 https://docs.newstore.net/api/integration/order-management/order_injection_api
 """
+import copy
+import functools
+import os
+import threading
 
 from api_toolkit.validate import RuleSet
 from api_toolkit.validate import Rules as r
-from api_toolkit.connector.decorators import json_or_full
 
-from ..request_lists import CURRENCY_LIST
+from ..bulk import BulkResults, bounded_map, order_result, process_map
+from ..circuit_breaker import CircuitOpenError
+from ..deadline import DeadlineExceeded, RATE_LIMIT, TOKEN
+from ..decorators import json_or_full
+from ..journal import payload_hash
 from ..ns_api_base_class import NewStoreAPIBase
+from ..rate_limiter import RATE_LIMITED_STATUS
+from ..serialization import loads, serialize
+from ..validation_cache import MemoizedRuleSet
+from .models import CHANNEL_TYPES, CURRENCIES, PRICE_METHODS, Order
+
+# Statuses below 500 answered to orders NewStore may still have created: the
+# request timed out or was throttled while it was processed
+IN_DOUBT_STATUSES = (408, RATE_LIMITED_STATUS)
+
+# Per-thread storage for built validation rulesets. RuleSets hold the dict
+# being tested while they run, so a built tree is only reused by the thread
+# that built it.
+_RULESET_CACHE = threading.local()
+
+
+def _cached_ruleset(builder):
+    """
+    Decorator for ruleset builders. The ruleset is built on the first call and
+    the same instance is returned on every following call from the same thread
+    for the same API class.
+    """
+    @functools.wraps(builder)
+    def wrapper(self):
+        cache = _RULESET_CACHE.__dict__
+        key = (type(self), builder.__name__)
+        if key not in cache:
+            cache[key] = builder(self)
+
+        return cache[key]
+
+    return wrapper
+
+
+def _rule_set(validation_dict, name=None):
+    """
+    Return a RuleSet of validation_dict, memoized under name if one is given.
+    The rules are kept in its validation_dict attribute for the models.
+    """
+    rule_set = RuleSet(validation_dict) if name is None else \
+        MemoizedRuleSet(validation_dict, name)
+    rule_set.validation_dict = validation_dict
+    return rule_set
+
+
+def _own_rules(rules):
+    """
+    Return the rules of a field without the rules of nested documents
+    """
+    return [rule for rule in rules if not isinstance(rule, (RuleSet, list))]
+
+
+def _document_plan(validation_dict):
+    """
+    Split the rules of a document for fail-fast validation. Returns a RuleSet
+    with the rules of its own fields, and (name, nested) for every field with
+    nested documents, nested being the _nested_plan of each nested rule.
+    """
+    own_rule_set = RuleSet({name: _own_rules(rules) for name, rules in validation_dict.items()})
+    nested = [(name, [_nested_plan(rule) for rule in rules if isinstance(rule, (RuleSet, list))])
+              for name, rules in validation_dict.items()]
+
+    return own_rule_set, [(name, rules) for name, rules in nested if rules]
+
+
+def _nested_plan(rule):
+    """
+    Return (list, own_rule_set, nested) for a list of item rules, own_rule_set
+    checking each item without its nested documents, or (dict, document_plan)
+    for a nested RuleSet
+    """
+    if isinstance(rule, RuleSet):
+        return dict, _document_plan(rule.validation_dict)
+
+    return (list, RuleSet({'item': _own_rules(rule)}),
+            [_nested_plan(item_rule) for item_rule in rule
+             if isinstance(item_rule, (RuleSet, list))])
+
+
+def _valid_document(plan, document):
+    """
+    True if document passes the rules of a _document_plan, stopping at the
+    first document failing them
+    """
+    own_rule_set, nested = plan
+    own_rule_set.test_dict = document
+    if not own_rule_set:
+        return False
+
+    return all(_valid_nested(rules, document[name])
+               for name, rules in nested if document.get(name) is not None)
+
+
+def _valid_nested(rules, value):
+    """
+    True if value passes its nested rules. Values of an unexpected type are
+    reported invalid, and checked again by full validation of their field.
+    """
+    for rule in rules:
+        if rule[0] is dict:
+            if not isinstance(value, dict) or not _valid_document(rule[1], value):
+                return False
+            continue
+
+        _, own_rule_set, item_rules = rule
+        if not isinstance(value, list):
+            return False
+        for item in value:
+            own_rule_set.test_dict = {'item': item}
+            if not own_rule_set or (item is not None and not _valid_nested(item_rules, item)):
+                return False
+
+    return True
+
+
+def _validate_chunk(api_class, payloads, fail_fast=False):
+    """
+    Validate a chunk of payloads in a worker process. Returns the errors of
+    each payload, an empty dict for valid payloads.
+    """
+    api = api_class()
+    return [api.validate_create_order_payload(_decode_payload(payload), fail_fast).errors
+            for payload in payloads]
+
+
+def _decode_payload(payload):
+    """
+    Decode payloads passed as JSON text or an Order model
+    """
+    if isinstance(payload, (str, bytes, bytearray)):
+        return loads(payload)
+    if isinstance(payload, Order):
+        return payload.to_dict()
+
+    return payload
+
+
+def clear_validation_cache():
+    """
+    Drop all rulesets cached by the current thread. Rulesets are rebuilt on the
+    next validation.
+    """
+    _RULESET_CACHE.__dict__.clear()
+
+
+def _never_sent(error):
+    """
+    True if error was raised before the order was sent to NewStore
+    """
+    if isinstance(error, CircuitOpenError):
+        return True
+    return isinstance(error, DeadlineExceeded) and error.phase in (TOKEN, RATE_LIMIT)
+
+
+class FailFastResult:
+    """
+    Result of a fail-fast validation. Like a RuleSet it is True if the payload
+    is valid, and errors holds the first error found, empty if there is none.
+    """
+    __slots__ = ('errors',)
+
+    def __init__(self, error=None):
+        self.errors = error or {}
+
+    def __bool__(self):
+        return not self.errors
+
 
 class OrderInjectionV01(NewStoreAPIBase):
     """
@@ -21,45 +194,291 @@ class OrderInjectionV01(NewStoreAPIBase):
         """
         Create Order API
         https://docs.newstore.net/api/integration/order-management/order_injection_api/#operation/CreateOrder
+        The payload can be a dict, an Order model, or the order already serialized
+        to JSON bytes or str. Orders are valid once built, so they are not validated again.
+        With a journal set, orders it records as injected are not sent again and
+        the response NewStore gave them is returned.
+        A deadline in seconds bounds the token fetch, request and retries.
+        """
+        deadline = self._start_deadline(kwargs.get('deadline'))
+        key = body = None
+        if self.journal is not None:
+            key, body, entry = self._begin_journaled_order(kwargs.get('payload'))
+            if entry is not None:
+                return self._journaled_response(entry)
+
+        try:
+            url, payload = self._prepare_create_order(**kwargs)
+            # With a journal the body was already serialized to hash it
+            data, headers = self._json_body(payload if body is None else body,
+                                            self._request_headers(deadline) or
+                                            kwargs.get('headers'))
+
+            # The body is serialized once, retries send the same bytes
+            response = self._request("POST", url, "create_order", deadline,
+                                     headers=headers, data=data)
+            response.raise_for_status()
+        except Exception as error:
+            if self.journal is not None:
+                self._end_journaled_order(key, error=error)
+            raise
+
+        if self.journal is not None:
+            self._end_journaled_order(key, response=response)
+
+        return response
+
+    def create_orders(self, orders, max_in_flight=8, **kwargs):
+        """
+        Validate and inject many orders concurrently over the shared session.
+        Args:
+            orders(iterable): Order payloads, consumed lazily
+            max_in_flight(int): Maximum number of orders being sent at once
+            skip_validation(bool): Skip payload validation for every order
+            fail_fast(bool): Reject invalid orders with their first error only
+            deadline(float): Seconds each order may take
+        Returns a BulkResults iterable yielding a dict per order as it completes:
+            external_id(str): The external_id of the order
+            success(bool): True if the order was injected
+            response(dict): The response JSON when successful
+            error(dict): Structured error when unsuccessful
+        A failed order never stops the rest of the batch.
+        """
+        skip_validation = kwargs.get('skip_validation')
+        fail_fast = kwargs.get('fail_fast')
+        deadline = kwargs.get('deadline')
+
+        def inject(payload):
+            return self.create_order(payload=payload,
+                                     skip_validation=skip_validation,
+                                     fail_fast=fail_fast,
+                                     deadline=deadline,
+                                     return_json=True)
+
+        results = (order_result(payload, future)
+                   for payload, future in bounded_map(inject, orders, max_in_flight))
+
+        return BulkResults(results)
+
+    def validate_many(self, payloads, workers=None, chunksize=256, lazy=False,
+                      fail_fast=False):
+        """
+        Validate many payloads across worker processes.
+        Args:
+            payloads(iterable): Order payloads to validate, as dicts or JSON
+                text. JSON text is decoded in the workers, which is much
+                cheaper to send to them than a dict.
+            workers(int): Number of worker processes, defaults to the CPU count.
+                With 1 worker payloads are validated in this process.
+            chunksize(int): Number of payloads sent to a worker at a time
+            lazy(bool): Return a generator instead of a list
+            fail_fast(bool): Only return the first error of each payload
+        Returns the errors of each payload in input order, an empty dict for
+        valid payloads.
+        """
+        workers = workers or os.cpu_count() or 1
+        if workers == 1:
+            results = (self.validate_create_order_payload(_decode_payload(payload),
+                                                          fail_fast).errors
+                       for payload in payloads)
+        else:
+            results = process_map(functools.partial(_validate_chunk, type(self),
+                                                    fail_fast=fail_fast),
+                                  payloads, workers, chunksize)
+
+        return results if lazy else list(results)
+
+    def _prepare_create_order(self, **kwargs):
+        """
+        Build the url and validate the payload for the create_order API.
+        Raises ValueError with the validation errors if the payload is invalid.
         """
         # Define paramters for the create_order API
         endpoint = '/v0/d/fulfill_order'
         url = f"{self.base_url or kwargs.get('base_url')}{endpoint}"
         payload = kwargs.get("payload")
 
+        # Order models were validated when they were built, and are serialized
+        # straight from their fields
+        if isinstance(payload, Order):
+            return url, payload.to_json(self.json_dumps)
+
         # Validate the payload if not skipped
         if kwargs.get('skip_validation') is not True:
-            rule_set = self.validate_create_order_payload(payload)
+            rule_set = self.validate_create_order_payload(_decode_payload(payload),
+                                                          fail_fast=kwargs.get('fail_fast'))
 
-            if not rule_set:
+            if not self._check_rule_set("create_order", rule_set):
                 raise ValueError(rule_set.errors)
 
-        response = self.session.post(url,
-                                     headers=self.headers or kwargs.get('headers'),
-                                     json=payload)
-        response.raise_for_status()
+        return url, payload
+
+    def _begin_journaled_order(self, payload):
+        """
+        Serialize the payload and record it in the journal before it is
+        validated, so injected orders are not validated again.
+        Returns (key, body, entry): the journal key of the order, the serialized
+        body and its JournalEntry if it was already injected. Raises ValueError
+        for payloads that are not an object with an external_id.
+        """
+        if isinstance(payload, Order):
+            body = payload.to_json(self.json_dumps)
+            external_id = payload.external_id
+        else:
+            decoded = _decode_payload(payload)
+            if not isinstance(decoded, dict) or decoded.get('external_id') is None:
+                raise ValueError({"external_id": "Required to journal the order"})
+            body = serialize(payload, self.json_dumps)
+            external_id = decoded['external_id']
+        key = (external_id, payload_hash(body))
+
+        return key, body, self.journal.begin(*key)
+
+    def _end_journaled_order(self, key, response=None, error=None):
+        """
+        Record the outcome of a journaled order. Orders that were rejected by
+        validation, never sent, or answered with a 4xx are failed. A 5xx, 408,
+        429 left after the retries, timeout or connection error leaves the
+        order in flight since NewStore may have created it.
+        """
+        if response is not None:
+            self.journal.succeed(*key, response.status_code, response.content)
+            return
+
+        error_response = getattr(error, 'response', None)
+        status_code = getattr(error_response, 'status_code', None)
+        if status_code is not None:
+            if status_code < 500 and status_code not in IN_DOUBT_STATUSES:
+                self.journal.fail(*key, status_code, error_response.text)
+            else:
+                self.journal.abandon(*key, status_code, error_response.text)
+        elif isinstance(error, ValueError) or _never_sent(error):
+            self.journal.fail(*key, error=str(error))
+        else:
+            self.journal.abandon(*key, error=str(error))
 
+    def _should_retry(self, method, response, retry):
+        """
+        With a journal, only 429s are sent again. NewStore may have created
+        the order before answering with any other retried status.
+        """
+        if self.journal is not None and response.status_code != RATE_LIMITED_STATUS:
+            return False
+
+        return super()._should_retry(method, response, retry)
+
+    @staticmethod
+    def _journaled_response(entry):
+        """
+        Rebuild the response of an order that was already injected
+        """
+        import requests # pylint: disable=import-outside-toplevel
+
+        response = requests.Response()
+        response.status_code = entry.status_code
+        response._content = entry.response # pylint: disable=protected-access
+        response.headers['Content-Type'] = 'application/json'
         return response
 
-    def validate_create_order_payload(self, payload):
+    def validate_create_order_payload(self, payload, fail_fast=False):
         """
         Method to validate the payload, allows for validation to be done by end user 
         at another time then when trying to send if desired.
+        With fail_fast, validation stops at the first field failing its rules
+        and a FailFastResult holding only its errors is returned instead of a RuleSet.
         """
+        if fail_fast:
+            return FailFastResult(self._first_error(payload))
+
         rule_set = self._create_order_validation_ruleset()
         rule_set.test_dict = payload
 
         return rule_set
 
+    def _first_error(self, payload):
+        """
+        Return the create_order errors of the first invalid field of payload,
+        None if it is valid. The payload is walked once, every document is
+        checked with the rules of its own fields before its nested documents,
+        and the walk stops at the first document failing them. Only the field
+        found invalid is validated again to report its errors.
+        """
+        if not isinstance(payload, dict):
+            rule_set = self.validate_create_order_payload(payload)
+            return None if rule_set else copy.deepcopy(rule_set.errors)
+
+        own_rule_set, nested = self._fail_fast_plan()
+        own_rule_set.test_dict = payload
+        if not own_rule_set:
+            invalid = [name for name in self._create_order_validation_dict()
+                       if name in own_rule_set.errors]
+        else:
+            invalid = (name for name, rules in nested
+                       if name in payload and not _valid_nested(rules, payload[name]))
+
+        for name in invalid:
+            rule_set = self._field_ruleset(name)
+            rule_set.test_dict = {name: payload[name]} if name in payload else {}
+            if not rule_set:
+                return copy.deepcopy(rule_set.errors)
+
+        return None
+
+    @_cached_ruleset
+    def _fail_fast_plan(self):
+        """
+        Return the fail-fast plan of the create_order rules, see _document_plan
+        """
+        return _document_plan(self._create_order_validation_dict())
+
+    def _field_ruleset(self, name):
+        """
+        Return a RuleSet with every create_order rule of field name. Built once per thread.
+        """
+        cache = _RULESET_CACHE.__dict__
+        key = (type(self), '_field_ruleset', name)
+        if key not in cache:
+            cache[key] = RuleSet({name: self._create_order_validation_dict()[name]})
+
+        return cache[key]
+
     def _create_order_validation_ruleset(self):
+        """
+        Return a new RuleSet for the create_order API. The rules it tests with
+        are built once per thread and shared between RuleSets.
+        """
+        return _rule_set(self._create_order_validation_dict())
+
+    def _model_ruleset(self, builder, own_only=frozenset(), skipped=frozenset()):
+        """
+        Return the RuleSet of the ruleset builder named builder, for a model
+        with children that are valid models already. Fields in own_only are
+        checked without the rules of their nested documents, fields in skipped
+        are not checked. Built once per thread.
+        """
+        cache = _RULESET_CACHE.__dict__
+        key = (type(self), builder, own_only, skipped)
+        if key not in cache:
+            rule_set = getattr(self, builder)()
+            if own_only or skipped:
+                rule_set = RuleSet({name: _own_rules(rules) if name in own_only else rules
+                                    for name, rules in rule_set.validation_dict.items()
+                                    if name not in skipped})
+            cache[key] = rule_set
+
+        return cache[key]
+
+    @_cached_ruleset
+    def _create_order_validation_dict(self):
         """
         Build and return the validation dictionary for the create_order API
         """
-        # Define Parent Validation Ruleset
+        # Define Parent Validation Ruleset. The builders are cached, so
+        # sub-rulesets used in more than one place are only built once
         validation_dict = {
             'external_id': [r.required(), r.is_type(str), r.length(min=1, max=64)],
             'shop': [r.required(), r.is_type(str), r.length(min=1, max=128)],
-            'channel_type': [r.required(), r.is_type(str), r.is_in('web', 'mobile', 'store')],
+            'channel_type': [r.required(), r.is_type(str), r.is_in(*CHANNEL_TYPES)],
             'channel_name': [r.required(), r.is_type(str), r.length(min=1, max=64)],
             'store_id': [r.is_type(str), r.length(max=256)],
             'associate_id': [r.is_type(str), r.length(max=256)],
@@ -80,17 +499,17 @@ class OrderInjectionV01(NewStoreAPIBase):
                                     [self._build_extended_attributes_validation_ruleset()]],
             'billing_address': [r.is_type(dict), self._build_address_validation_ruleset()],
             'payments': [r.is_type(list), [self._build_payment_validation_dict()]],
-            'price_method': [r.is_type(str), r.is_in('tax_included', 'tax_excluded')],
+            'price_method': [r.is_type(str), r.is_in(*PRICE_METHODS)],
             'is_preconfirmed': [r.is_type(bool)],
             'is_fulfilled': [r.is_type(bool)],
             'is_offline': [r.is_type(bool)],
             'is_historical': [r.is_type(bool)],
             'notification_blacklist': [r.is_type(list), [r.is_type(str)]],
-            'currency': [r.required(), r.is_type(str), r.is_in(*CURRENCY_LIST)]
+            'currency': [r.required(), r.is_type(str), r.is_in(*CURRENCIES)]
         }
-        order_validation_ruleset = RuleSet(validation_dict)
-        return order_validation_ruleset
+        return validation_dict
 
+    @_cached_ruleset
     def _build_address_validation_ruleset(self):
         """
         Build the validation ruleset for address validation
@@ -112,10 +531,11 @@ class OrderInjectionV01(NewStoreAPIBase):
             'address_line_2': [r.is_type(str), r.length(max=256)],
             'phone': [r.is_type(str), r.length(max=128)]
         }
-        address_rule_set = RuleSet(address_validation_dict)
+        address_rule_set = _rule_set(address_validation_dict, "address")
 
         return address_rule_set
 
+    @_cached_ruleset
     def _build_shipment_validation_ruleset(self):
         """
         Build the shipment validation ruleset for create_order API
@@ -129,9 +549,10 @@ class OrderInjectionV01(NewStoreAPIBase):
                     ],
             'shipping_option': [r.required(), self._build_shipping_option_validation_ruleset()],
         }
-        shipment_ruleset = RuleSet(shipment_validation)
+        shipment_ruleset = _rule_set(shipment_validation)
         return shipment_ruleset
 
+    @_cached_ruleset
     def _build_item_validation_ruleset(self):
         """
         Build the item validation ruleset for create_order API
@@ -147,9 +568,10 @@ class OrderInjectionV01(NewStoreAPIBase):
                                    ]
         }
 
-        item_validation_ruleset = RuleSet(item_validation_dict)
+        item_validation_ruleset = _rule_set(item_validation_dict)
         return item_validation_ruleset
 
+    @_cached_ruleset
     def _build_price_validation_ruleset(self):
         """
         Build the price validation ruleset used in the item validation ruleset
@@ -168,9 +590,10 @@ class OrderInjectionV01(NewStoreAPIBase):
             'group_ref': [r.is_type(str), r.length(max=64)]
         }
 
-        price_validation_ruleset = RuleSet(price_validation_dict)
+        price_validation_ruleset = _rule_set(price_validation_dict)
         return price_validation_ruleset
 
+    @_cached_ruleset
     def _build_order_discount_validation_ruleset(self):
         """
         Build the order discount validation ruleset used in the price validation ruleset
@@ -184,9 +607,11 @@ class OrderInjectionV01(NewStoreAPIBase):
             'original_value': [r.required(), r.is_type(int, float), r.Min(0)],
             'price_adjustment': [r.required(), r.is_type(int, float), r.Min(0)]
         }
-        order_discount_validation_ruleset = RuleSet(order_discount_validation_dict)
+        order_discount_validation_ruleset = _rule_set(order_discount_validation_dict,
+                                                      "order_discount")
         return order_discount_validation_ruleset
 
+    @_cached_ruleset
     def _build_item_tax_lines_validation_ruleset(self):
         """
         Build the tax lines validation ruleset used in the price validation ruleset
@@ -198,9 +623,11 @@ class OrderInjectionV01(NewStoreAPIBase):
             'name': [r.required(), r.is_type(str)],
             'country_code': [r.is_type(str), r.length(max=2)]
         }
-        item_tax_lines_validation_ruleset = RuleSet(item_tax_lines_validation_dict)
+        item_tax_lines_validation_ruleset = _rule_set(item_tax_lines_validation_dict,
+                                                      "item_tax_lines")
         return item_tax_lines_validation_ruleset
 
+    @_cached_ruleset
     def _build_extended_attributes_validation_ruleset(self):
         """
         Build the validation ruleset for extended attributes
@@ -210,9 +637,11 @@ class OrderInjectionV01(NewStoreAPIBase):
             'name': [r.required(), r.is_type(str), r.length(min=1, max=100)],
             'value': [r.required(), r.is_type(str), r.length(max=8192)]
         }
-        extended_attributes_validation_ruleset = RuleSet(extended_attributes_validation_dict)
+        extended_attributes_validation_ruleset = _rule_set(
+            extended_attributes_validation_dict, "extended_attributes")
         return extended_attributes_validation_ruleset
 
+    @_cached_ruleset
     def _build_shipping_option_validation_ruleset(self):
         """
         Build the validation ruleset for shippiing option validation
@@ -225,9 +654,11 @@ class OrderInjectionV01(NewStoreAPIBase):
             'discount_info': [r.is_type(list), self._build_order_discount_validation_ruleset()],
             'routing_strategy': [r.is_type(dict), self._build_routing_strategy_validation_ruleset()]
         }
-        shipping_options_validation_ruleset = RuleSet(shipping_options_validation_dict)
+        shipping_options_validation_ruleset = _rule_set(shipping_options_validation_dict,
+                                                        "shipping_option")
         return shipping_options_validation_ruleset
 
+    @_cached_ruleset
     def _build_routing_strategy_validation_ruleset(self):
         """
         Build the validation ruleset for routing strategy validation
@@ -236,9 +667,10 @@ class OrderInjectionV01(NewStoreAPIBase):
         routing_strategy_validation_dict = {
             'strategy': [r.required(), r.is_type(str)]
         }
-        routing_strategy_validation_ruleset = RuleSet(routing_strategy_validation_dict)
+        routing_strategy_validation_ruleset = _rule_set(routing_strategy_validation_dict)
         return routing_strategy_validation_ruleset
 
+    @_cached_ruleset
     def _build_payment_validation_dict(self):
         """
         Build the payment validation ruleset for order validation
@@ -254,5 +686,5 @@ class OrderInjectionV01(NewStoreAPIBase):
             'processor': [r.required(), r.is_type(str), r.length(min=1, max=32)],
             'correlation_ref': [r.required(), r.is_type(str), r.length(min=1, max=128)]
         }
-        payment_validation_ruleset = RuleSet(payment_validation_dict)
+        payment_validation_ruleset = _rule_set(payment_validation_dict)
         return payment_validation_ruleset
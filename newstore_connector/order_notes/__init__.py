@@ -4,3 +4,17 @@ Order Notes API Collection
 https://docs.newstore.net/api/integration/order-management/order_notes_api
 """
 from .order_notes_0_1_0 import OrderNotesV010
+from .notes_writer import NotesWriter, NoteOperation
+from .notes_cache import NotesCache
+
+__all__ = ["OrderNotesV010", "AsyncOrderNotesV010", "NotesWriter", "NoteOperation", "NotesCache"]
+
+
+def __getattr__(name):
+    # The async class loads httpx, so it is imported on first use
+    if name != "AsyncOrderNotesV010":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    from . import async_order_notes_0_1_0 # pylint: disable=import-outside-toplevel
+    globals()[name] = async_order_notes_0_1_0.AsyncOrderNotesV010
+    return globals()[name]
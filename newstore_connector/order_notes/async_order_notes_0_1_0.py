@@ -0,0 +1,158 @@
+"""
+Module for connecting to the NewStore Order Notes API with asyncio
+https://docs.newstore.net/api/integration/order-management/order_notes_api
+"""
+
+try:
+    import httpx
+except ImportError: # pragma: no cover
+    httpx = None
+
+from ..bulk import async_bounded_map
+from ..decorators import async_json_or_full
+from ..ns_api_base_class import AsyncNewStoreAPIBase
+from .notes_cache import NOT_MODIFIED
+from .order_notes_0_1_0 import OrderNotesV010
+
+
+class AsyncOrderNotesV010(AsyncNewStoreAPIBase, OrderNotesV010):
+    """
+    Async class for interacting with the NewStore Order Notes API. Takes the
+    same arguments as OrderNotesV010.
+    """
+    api_version = "0.1.0"
+
+    # pylint: disable=invalid-overridden-method
+    @async_json_or_full
+    async def get_order_notes(self, order_uuid, deadline=None):
+        """
+        Get the notes for a specific order
+        https://docs.newstore.net/api/integration/order-management/order_notes_api#operation/showOrderNote
+        """
+        deadline = self._start_deadline(deadline)
+        url = self.base_url + self._order_notes_endpoint(order_uuid)
+        if self.notes_cache is None:
+            response = await self._hedged_request("GET", url, "get_order_notes", deadline,
+                                                   headers=self.headers, timeout=30)
+            response.raise_for_status()
+
+            return response
+
+        entry, token = self.notes_cache.lookup(order_uuid)
+        if token is None:
+            return self._cached_response(entry)
+
+        try:
+            headers = self._conditional_headers(entry, deadline)
+            response = await self._hedged_request("GET", url, "get_order_notes", deadline,
+                                                  headers=headers, timeout=30)
+            if entry is not None and response.status_code == NOT_MODIFIED:
+                self.notes_cache.revalidate(order_uuid, token, entry)
+                return self._cached_response(entry)
+            response.raise_for_status()
+            self.notes_cache.store(order_uuid, token, response.status_code,
+                                   response.content, response.headers)
+        finally:
+            self.notes_cache.release(order_uuid, token)
+
+        return response
+
+    async def get_notes_for_orders(self, order_uuids, max_in_flight=8, deadline=None):
+        """
+        Get the notes of many orders concurrently on the event loop. Takes the
+        same arguments as OrderNotesV010.get_notes_for_orders, and is consumed
+        with `async for`.
+        """
+        async def fetch(order_uuid):
+            return await self.get_order_notes(order_uuid, deadline=deadline, return_json=True)
+
+        async for order_uuid, task in async_bounded_map(fetch, order_uuids, max_in_flight):
+            error = task.exception()
+            yield order_uuid, task.result() if error is None else error
+
+    @async_json_or_full
+    async def create_order_note(self, order_uuid, deadline=None, **kwargs):
+        """
+        Create an order note
+        https://docs.newstore.net/api/integration/order-management/order_notes_api#operation/createOrderLevelNote
+        """
+        deadline = self._start_deadline(deadline)
+        url = self.base_url + self._order_notes_endpoint(order_uuid)
+        payload = self._build_note_payload(**kwargs)
+
+        try:
+            response = await self._request("POST", url, "create_order_note", deadline,
+                                           headers=self.headers, json=payload, timeout=30)
+        finally:
+            self._invalidate_notes(order_uuid)
+        response.raise_for_status()
+
+        return response
+
+    @async_json_or_full
+    async def create_item_note(self, order_uuid, item_uuid, deadline=None, **kwargs):
+        """
+        Create a note for an item
+        https://docs.newstore.net/api/integration/order-management/order_notes_api#operation/createItemLevelNote
+        """
+        deadline = self._start_deadline(deadline)
+        url = self.base_url + self._item_notes_endpoint(order_uuid, item_uuid)
+        payload = self._build_note_payload(**kwargs)
+
+        try:
+            response = await self._request("POST", url, "create_item_note", deadline,
+                                           headers=self.headers, json=payload, timeout=30)
+        finally:
+            self._invalidate_notes(order_uuid)
+        response.raise_for_status()
+
+        return response
+
+    @async_json_or_full
+    async def update_note(self, order_uuid, note_uuid, deadline=None, **kwargs):
+        """
+        Runs PATCH update for notes API
+        https://docs.newstore.net/api/integration/order-management/order_notes_api#operation/updateNote
+        """
+        deadline = self._start_deadline(deadline)
+        url = self.base_url + self._note_endpoint(order_uuid, note_uuid)
+        payload = self._build_note_payload(**kwargs)
+
+        try:
+            response = await self._request("PATCH", url, "update_note", deadline,
+                                           headers=self.headers, json=payload, timeout=30)
+        finally:
+            self._invalidate_notes(order_uuid)
+        response.raise_for_status()
+
+        return response
+
+    @async_json_or_full
+    async def delete_note(self, order_uuid, note_uuid, deadline=None):
+        """
+        Delete a note
+        https://docs.newstore.net/api/integration/order-management/order_notes_api#operation/destroyNote
+        """
+        deadline = self._start_deadline(deadline)
+        url = self.base_url + self._note_endpoint(order_uuid, note_uuid)
+
+        try:
+            response = await self._request("DELETE", url, "delete_note", deadline,
+                                           headers=self.headers, timeout=30)
+        finally:
+            self._invalidate_notes(order_uuid)
+        response.raise_for_status()
+
+        return response
+
+    @staticmethod
+    def _cached_response(entry):
+        """
+        Rebuild the response of cached notes
+        """
+        headers = {}
+        if entry.content_type:
+            headers['Content-Type'] = entry.content_type
+        if entry.etag:
+            headers['ETag'] = entry.etag
+        return httpx.Response(entry.status_code, content=entry.content, headers=headers)
@@ -0,0 +1,154 @@
+"""
+Module for caching the notes of orders read with get_order_notes
+"""
+import collections
+import threading
+import time
+
+NOT_MODIFIED = 304
+NOTES_CACHE_SIZE = 1024
+NOTES_CACHE_TTL = 30
+
+
+class CachedNotes:
+    """
+    The response of get_order_notes for an order
+    """
+    __slots__ = ('status_code', 'content', 'content_type', 'etag', 'expires')
+
+    def __init__(self, status_code, content, content_type, etag, expires):
+        self.status_code = status_code
+        self.content = content
+        self.content_type = content_type
+        self.etag = etag
+        self.expires = expires
+
+
+class NotesCache:
+    """
+    Bounded LRU cache of get_order_notes responses, keyed by order_uuid and
+    shared by every thread. Writing a note of an order invalidates its entry.
+    Args:
+        maxsize(int): (optional) Orders kept. Default: 1024
+        ttl(float): (optional) Seconds a response is returned without a
+            request. Default: 30
+    Expired responses with an ETag are kept, and requested again with
+    If-None-Match. A 304 response renews them without downloading the notes.
+    """
+
+    def __init__(self, maxsize=NOTES_CACHE_SIZE, ttl=NOTES_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = collections.OrderedDict()
+        # Token of the latest request of an order, dropped when it is invalidated
+        self._fetching = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def after_fork(self):
+        """
+        Replace the lock, which a thread of the parent process may have held.
+        Requests of the parent never finish in the child.
+        """
+        self._lock = threading.Lock()
+        self._fetching = {}
+
+    def lookup(self, order_uuid):
+        """
+        Return (entry, token) for order_uuid. A None token means entry is
+        fresh and is returned as it is. Otherwise the notes are requested,
+        with If-None-Match if entry is an expired response with an ETag, and
+        the result is passed to store or revalidate with the token.
+        """
+        with self._lock:
+            entry = self._entries.get(order_uuid)
+            if entry is not None:
+                if time.monotonic() < entry.expires:
+                    self._entries.move_to_end(order_uuid)
+                    self.hits += 1
+                    return entry, None
+                if entry.etag is None:
+                    del self._entries[order_uuid]
+                    entry = None
+
+            self.misses += 1
+            token = self._fetching[order_uuid] = object()
+            return entry, token
+
+    def store(self, order_uuid, token, status_code, content, headers):
+        """
+        Cache a response, unless a note of the order was written since the
+        lookup that returned token
+        """
+        with self._lock:
+            if self._fetching.get(order_uuid) is not token:
+                return
+            self._entries[order_uuid] = CachedNotes(
+                status_code, content, headers.get('Content-Type'), headers.get('ETag'),
+                time.monotonic() + self.ttl)
+            self._entries.move_to_end(order_uuid)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def revalidate(self, order_uuid, token, entry):
+        """
+        Renew the expiry of entry after a 304 response
+        """
+        with self._lock:
+            self.revalidations += 1
+            if self._fetching.get(order_uuid) is not token:
+                return
+            entry.expires = time.monotonic() + self.ttl
+            self._entries[order_uuid] = entry
+            self._entries.move_to_end(order_uuid)
+
+    def release(self, order_uuid, token):
+        """
+        End the request of order_uuid started by lookup
+        """
+        with self._lock:
+            if self._fetching.get(order_uuid) is token:
+                del self._fetching[order_uuid]
+
+    def invalidate(self, order_uuid):
+        """
+        Drop the cached notes of an order, and the result of any request for
+        them that is still running
+        """
+        with self._lock:
+            self._fetching.pop(order_uuid, None)
+            if self._entries.pop(order_uuid, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        """
+        Drop every cached response and reset the counters
+        """
+        with self._lock:
+            self._entries.clear()
+            self._fetching.clear()
+            self.hits = self.misses = self.revalidations = 0
+            self.invalidations = self.evictions = 0
+
+    def stats(self):
+        """
+        Return the size, counters and hit rate of the cache. Revalidations are
+        the misses answered with a 304.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidations": self.revalidations,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
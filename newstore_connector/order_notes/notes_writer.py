@@ -0,0 +1,230 @@
+"""
+Module for writing order notes in the background
+"""
+import collections
+import logging
+import queue
+import threading
+
+FAILURE_HISTORY = 100
+
+logger = logging.getLogger(__name__)
+
+
+class NoteOperation:
+    """
+    A queued call of an OrderNotes method
+    Args:
+        method(str): Name of the OrderNotes method, IE: "update_note"
+        order_uuid(str): The UUID of the order
+        args(tuple): The other positional arguments, IE: (note_uuid,)
+        kwargs(dict): The note fields
+    """
+    __slots__ = ('method', 'order_uuid', 'args', 'kwargs')
+
+    def __init__(self, method, order_uuid, args, kwargs):
+        self.method = method
+        self.order_uuid = order_uuid
+        self.args = args
+        self.kwargs = kwargs
+
+    def __repr__(self):
+        return f"NoteOperation({self.method}, {self.order_uuid}, {self.args}, {self.kwargs})"
+
+
+class NotesWriter:
+    """
+    Write-behind queue for OrderNotes writes. Calls return immediately and the
+    notes are sent by background threads.
+    Args:
+        order_notes(OrderNotesV010): API class used to send the notes
+        max_in_flight(int): (optional) Orders whose notes are sent at once. Default: 8
+        on_success(callable): (optional) Called with (operation, response)
+        on_error(callable): (optional) Called with (operation, error). Without
+            it, the last failures are kept in `failures`
+    Exceptions raised by the callbacks are logged and don't stop the writer.
+    The notes of one order are sent one at a time, in the order they were
+    queued. An update_note call for a note whose previous update is the last
+    queued operation of the order replaces it, so only the last write is sent.
+    """
+
+    def __init__(self, order_notes, max_in_flight=8, **kwargs):
+        if max_in_flight < 1:
+            raise ValueError({"max_in_flight": "Must be greater than or equal to 1"})
+
+        self.order_notes = order_notes
+        self.max_in_flight = max_in_flight
+        self.on_success = kwargs.get('on_success')
+        self.on_error = kwargs.get('on_error')
+        self.failures = collections.deque(maxlen=FAILURE_HISTORY)
+
+        self._condition = threading.Condition()
+        # Queued operations per order, and the orders ready to be sent
+        self._orders = {}
+        self._ready = queue.Queue()
+        # Queued update_note operations by (order_uuid, note_uuid)
+        self._updates = {}
+        self._pending = 0
+        self._closed = False
+        self._threads = []
+
+        self.queued = 0
+        self.coalesced = 0
+        self.sent = 0
+        self.failed = 0
+
+    def create_order_note(self, order_uuid, **kwargs):
+        """
+        Queue OrderNotesV010.create_order_note
+        """
+        self._submit(NoteOperation("create_order_note", order_uuid, (), kwargs))
+
+    def create_item_note(self, order_uuid, item_uuid, **kwargs):
+        """
+        Queue OrderNotesV010.create_item_note
+        """
+        self._submit(NoteOperation("create_item_note", order_uuid, (item_uuid,), kwargs))
+
+    def update_note(self, order_uuid, note_uuid, **kwargs):
+        """
+        Queue OrderNotesV010.update_note, replacing a queued update of the same note
+        """
+        self._submit(NoteOperation("update_note", order_uuid, (note_uuid,), kwargs))
+
+    def delete_note(self, order_uuid, note_uuid):
+        """
+        Queue OrderNotesV010.delete_note
+        """
+        self._submit(NoteOperation("delete_note", order_uuid, (note_uuid,), {}))
+
+    def _submit(self, operation):
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("NotesWriter is closed")
+
+            self.queued += 1
+            operations = self._orders.get(operation.order_uuid)
+            if operation.method == "update_note":
+                key = (operation.order_uuid, operation.args[0])
+                queued = self._updates.get(key)
+                if queued is not None and operations and operations[-1] is queued:
+                    # The update is a full PATCH of the note, the last one wins.
+                    # Operations queued after it, IE: a delete, must run before
+                    # the later update, so it is only merged while it is last
+                    queued.kwargs = operation.kwargs
+                    self.coalesced += 1
+                    return
+                self._updates[key] = operation
+            elif operation.method == "delete_note":
+                self._updates.pop((operation.order_uuid, operation.args[0]), None)
+
+            if operations is None:
+                # The order is not queued or being sent, it is ready
+                operations = self._orders[operation.order_uuid] = collections.deque()
+                self._ready.put(operation.order_uuid)
+            operations.append(operation)
+            self._pending += 1
+
+            if not self._threads:
+                self._start()
+
+    def _start(self):
+        for _ in range(self.max_in_flight):
+            thread = threading.Thread(target=self._run, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _run(self):
+        while True:
+            order_uuid = self._ready.get()
+            if order_uuid is None:
+                return
+
+            with self._condition:
+                operations = self._orders[order_uuid]
+                operation = operations.popleft()
+                if operation.method == "update_note":
+                    # Later updates of the note are queued behind this one
+                    key = (order_uuid, operation.args[0])
+                    if self._updates.get(key) is operation:
+                        del self._updates[key]
+
+            try:
+                self._send(operation)
+            finally:
+                with self._condition:
+                    self._pending -= 1
+                    if operations:
+                        self._ready.put(order_uuid)
+                    else:
+                        del self._orders[order_uuid]
+                    self._condition.notify_all()
+
+    def _send(self, operation):
+        method = getattr(self.order_notes, operation.method)
+        try:
+            response = method(operation.order_uuid, *operation.args, **operation.kwargs)
+        except Exception as error: # pylint: disable=broad-exception-caught
+            with self._condition:
+                self.failed += 1
+            if self.on_error is not None:
+                self._callback(self.on_error, operation, error)
+            else:
+                self.failures.append((operation, error))
+            return
+
+        with self._condition:
+            self.sent += 1
+        if self.on_success is not None:
+            self._callback(self.on_success, operation, response)
+
+    @staticmethod
+    def _callback(callback, operation, result):
+        try:
+            callback(operation, result)
+        except Exception: # pylint: disable=broad-exception-caught
+            logger.exception("NotesWriter callback failed for %r", operation)
+
+    def flush(self, timeout=None):
+        """
+        Wait until every queued note has been sent. Returns False if the
+        timeout expired first.
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: self._pending == 0, timeout)
+
+    def close(self, timeout=None):
+        """
+        Send the queued notes and stop the background threads. Returns False
+        if the timeout expired before every note was sent.
+        """
+        with self._condition:
+            self._closed = True
+        flushed = self.flush(timeout)
+
+        for _ in self._threads:
+            self._ready.put(None)
+        if flushed:
+            for thread in self._threads:
+                thread.join()
+
+        return flushed
+
+    def stats(self):
+        """
+        Return the counts of queued, coalesced, sent, failed and pending operations
+        """
+        with self._condition:
+            return {
+                "queued": self.queued,
+                "coalesced": self.coalesced,
+                "sent": self.sent,
+                "failed": self.failed,
+                "pending": self._pending
+            }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
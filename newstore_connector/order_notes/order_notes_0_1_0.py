@@ -3,32 +3,83 @@ Module for connecting to the NewStore Order Notes API
 https://docs.newstore.net/api/integration/order-management/order_notes_api
 """
 
-from api_toolkit.connector.decorators import json_or_full
+import requests
 
+from ..bulk import bounded_map
+from ..decorators import json_or_full
 from ..ns_api_base_class import NewStoreAPIBase
+from .notes_cache import NOT_MODIFIED
+from .notes_writer import NotesWriter
 
 
 class OrderNotesV010(NewStoreAPIBase):
     """
     Class for interacting with the NewStore Order Notres API
+    Args:
+        notes_cache(NotesCache): (optional) Cache of get_order_notes responses
     """
     api_version = "0.1.0"
 
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.notes_cache = kwargs.get('notes_cache')
+
     @json_or_full
-    def get_order_notes(self, order_uuid):
+    def get_order_notes(self, order_uuid, deadline=None):
         """
         Get the notes for a specific order
         https://docs.newstore.net/api/integration/order-management/order_notes_api#operation/showOrderNote
+        With a notes_cache, cached notes are returned without a request.
+        A deadline in seconds bounds the token fetch, request and retries.
         """
-        endpoint = f"/v0/d/orders/{order_uuid}/notes"
-        url = self.base_url + endpoint
-        response = self.session.get(url, headers=self.headers, timeout=30)
-        response.raise_for_status()
+        deadline = self._start_deadline(deadline)
+        url = self.base_url + self._order_notes_endpoint(order_uuid)
+        if self.notes_cache is None:
+            response = self._hedged_request("GET", url, "get_order_notes", deadline,
+                                             headers=self._request_headers(deadline), timeout=30)
+            response.raise_for_status()
+
+            return response
+
+        entry, token = self.notes_cache.lookup(order_uuid)
+        if token is None:
+            return self._cached_response(entry)
+
+        try:
+            response = self._hedged_request("GET", url, "get_order_notes", deadline,
+                                            headers=self._conditional_headers(entry, deadline),
+                                            timeout=30)
+            if entry is not None and response.status_code == NOT_MODIFIED:
+                self.notes_cache.revalidate(order_uuid, token, entry)
+                return self._cached_response(entry)
+            response.raise_for_status()
+            self.notes_cache.store(order_uuid, token, response.status_code,
+                                   response.content, response.headers)
+        finally:
+            self.notes_cache.release(order_uuid, token)
 
         return response
 
+    def get_notes_for_orders(self, order_uuids, max_in_flight=8, deadline=None):
+        """
+        Get the notes of many orders concurrently over the shared session
+        Args:
+            order_uuids(iterable): The UUIDs of the orders, consumed lazily
+            max_in_flight(int): (optional) Maximum number of requests at once. Default: 8
+            deadline(float): (optional) Seconds the call for each order may take
+        Yields (order_uuid, notes) as each request completes, notes being the
+        JSON of get_order_notes, or the exception raised for that order.
+        Requests are retried and rate limited like get_order_notes.
+        """
+        def fetch(order_uuid):
+            return self.get_order_notes(order_uuid, deadline=deadline, return_json=True)
+
+        for order_uuid, future in bounded_map(fetch, order_uuids, max_in_flight):
+            error = future.exception()
+            yield order_uuid, future.result() if error is None else error
+
     @json_or_full
-    def create_order_note(self, order_uuid, **kwargs):
+    def create_order_note(self, order_uuid, deadline=None, **kwargs):
         """
         Create an order note
         Args:
@@ -37,26 +88,27 @@ class OrderNotesV010(NewStoreAPIBase):
             source(str): The user_id of the user creating the note
             source_type(str): The type of the source defaults to "integration"
             tags(list): A list of tags to apply to the note
+            deadline(float): (optional) Seconds the call may take, including retries
         For More Information:
         https://docs.newstore.net/api/integration/order-management/order_notes_api#operation/createOrderLevelNote
         """
-        endpoint = f"/v0/d/orders/{order_uuid}/notes"
-        url = self.base_url + endpoint
+        deadline = self._start_deadline(deadline)
+        url = self.base_url + self._order_notes_endpoint(order_uuid)
 
-        payload = {
-            "text": kwargs.get("text"),
-            "source": kwargs.get("source"),
-            "source_type": kwargs.get("source_type", "integration"),
-            "tags": kwargs.get("tags")
-        }
+        payload = self._build_note_payload(**kwargs)
 
-        response = self.session.post(url, headers=self.headers, json=payload, timeout=30)
+        try:
+            response = self._request("POST", url, "create_order_note", deadline,
+                                     headers=self._request_headers(deadline),
+                                     json=payload, timeout=30)
+        finally:
+            self._invalidate_notes(order_uuid)
         response.raise_for_status()
 
         return response
 
     @json_or_full
-    def create_item_note(self, order_uuid, item_uuid, **kwargs):
+    def create_item_note(self, order_uuid, item_uuid, deadline=None, **kwargs):
         """
         Create a note for an item
         Args:
@@ -66,26 +118,27 @@ class OrderNotesV010(NewStoreAPIBase):
             source(str): The user_id of the user creating the note
             source_type(str): The type of the source defaults to "integration"
             tags(list): A list of tags to apply to the note
+            deadline(float): (optional) Seconds the call may take, including retries
         For More Information:
         https://docs.newstore.net/api/integration/order-management/order_notes_api#operation/createItemLevelNote
         """
-        endpoint = f"/v0/d/orders/{order_uuid}/items/{item_uuid}/notes"
-        url = self.base_url + endpoint
+        deadline = self._start_deadline(deadline)
+        url = self.base_url + self._item_notes_endpoint(order_uuid, item_uuid)
 
-        payload = {
-            "test": kwargs.get("text"),
-            "source": kwargs.get("source"),
-            "source_type": kwargs.get("source_type", "integration"),
-            "tags": kwargs.get("tags")
-        }
+        payload = self._build_note_payload(**kwargs)
 
-        response = self.session.post(url, headers=self.headers, json=payload, timeout=30)
+        try:
+            response = self._request("POST", url, "create_item_note", deadline,
+                                     headers=self._request_headers(deadline),
+                                     json=payload, timeout=30)
+        finally:
+            self._invalidate_notes(order_uuid)
         response.raise_for_status()
 
         return response
 
     @json_or_full
-    def update_note(self, order_uuid, note_uuid, **kwargs):
+    def update_note(self, order_uuid, note_uuid, deadline=None, **kwargs):
         """
         Runs PATCH update for notes API
         Args:
@@ -95,38 +148,119 @@ class OrderNotesV010(NewStoreAPIBase):
             source(str): The user_id of the user creating the note
             source_type(str): The type of the source defaults to "integration"
             tags(list): A list of tags to apply to the note
+            deadline(float): (optional) Seconds the call may take, including retries
         For More Information:
         https://docs.newstore.net/api/integration/order-management/order_notes_api#operation/updateNote
         """
-        endpoint = f"/v0/d/orders/{order_uuid}/notes/{note_uuid}"
-        url = self.base_url + endpoint
+        deadline = self._start_deadline(deadline)
+        url = self.base_url + self._note_endpoint(order_uuid, note_uuid)
 
-        payload = {
-            "text": kwargs.get("text"),
-            "source": kwargs.get("source"),
-            "source_type": kwargs.get("source_type", "integration"),
-            "tags": kwargs.get("tags")
-        }
+        payload = self._build_note_payload(**kwargs)
 
-        response = self.session.patch(url, headers=self.headers, json=payload, timeout=30)
+        try:
+            response = self._request("PATCH", url, "update_note", deadline,
+                                     headers=self._request_headers(deadline),
+                                     json=payload, timeout=30)
+        finally:
+            self._invalidate_notes(order_uuid)
         response.raise_for_status()
 
         return response
 
     @json_or_full
-    def delete_note(self, order_uuid, note_uuid):
+    def delete_note(self, order_uuid, note_uuid, deadline=None):
         """
         Delete a note
         Args:
             order_uuid(str): The UUID of the order
             note_uuid(str): The UUID of the note
+            deadline(float): (optional) Seconds the call may take, including retries
         For More Information:
         https://docs.newstore.net/api/integration/order-management/order_notes_api#operation/destroyNote
         """
-        endpoint = f"/v0/d/orders/{order_uuid}/notes/{note_uuid}"
-        url = self.base_url + endpoint
+        deadline = self._start_deadline(deadline)
+        url = self.base_url + self._note_endpoint(order_uuid, note_uuid)
 
-        response = self.session.delete(url, headers=self.headers, timeout=30)
+        try:
+            response = self._request("DELETE", url, "delete_note", deadline,
+                                     headers=self._request_headers(deadline), timeout=30)
+        finally:
+            self._invalidate_notes(order_uuid)
         response.raise_for_status()
 
         return response
+
+    def writer(self, max_in_flight=8, **kwargs):
+        """
+        Return a NotesWriter sending the note writes of this class in the background
+        Args:
+            max_in_flight(int): (optional) Orders whose notes are sent at once. Default: 8
+            on_success(callable): (optional) Called with (operation, response)
+            on_error(callable): (optional) Called with (operation, error)
+        """
+        return NotesWriter(self, max_in_flight=max_in_flight, **kwargs)
+
+    def _invalidate_notes(self, order_uuid):
+        """
+        Drop the cached notes of an order after writing one of its notes
+        """
+        if self.notes_cache is not None:
+            self.notes_cache.invalidate(order_uuid)
+
+    def _conditional_headers(self, entry, deadline=None):
+        """
+        Return the request headers, with If-None-Match to revalidate entry
+        """
+        if entry is None:
+            return self._request_headers(deadline)
+
+        headers = dict(self._request_headers(deadline) or {})
+        headers['If-None-Match'] = entry.etag
+        return headers
+
+    @staticmethod
+    def _cached_response(entry):
+        """
+        Rebuild the response of cached notes
+        """
+        response = requests.Response()
+        response.status_code = entry.status_code
+        response._content = entry.content # pylint: disable=protected-access
+        if entry.content_type:
+            response.headers['Content-Type'] = entry.content_type
+        if entry.etag:
+            response.headers['ETag'] = entry.etag
+        return response
+
+    @staticmethod
+    def _order_notes_endpoint(order_uuid):
+        """
+        Endpoint for the notes of an order
+        """
+        return f"/v0/d/orders/{order_uuid}/notes"
+
+    @staticmethod
+    def _item_notes_endpoint(order_uuid, item_uuid):
+        """
+        Endpoint for the notes of an item on an order
+        """
+        return f"/v0/d/orders/{order_uuid}/items/{item_uuid}/notes"
+
+    @staticmethod
+    def _note_endpoint(order_uuid, note_uuid):
+        """
+        Endpoint for a single note
+        """
+        return f"/v0/d/orders/{order_uuid}/notes/{note_uuid}"
+
+    @staticmethod
+    def _build_note_payload(**kwargs):
+        """
+        Build the payload for creating or updating a note
+        """
+        return {
+            "text": kwargs.get("text"),
+            "source": kwargs.get("source"),
+            "source_type": kwargs.get("source_type", "integration"),
+            "tags": kwargs.get("tags")
+        }
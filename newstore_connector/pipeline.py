@@ -0,0 +1,210 @@
+"""
+Module for streaming large order files into NewStore.
+
+Orders are read one at a time from NDJSON or a JSON array, injected with
+bounded concurrency and the results are written out as they complete, so
+memory use does not depend on the size of the input.
+"""
+import itertools
+import json
+import sys
+import time
+
+from .bulk import BulkResults
+
+READ_SIZE = 64 * 1024
+_WHITESPACE = ' \t\n\r'
+
+
+def stream_orders(file, on_error=None):
+    """
+    Yield orders from a text file containing either NDJSON (one order per line)
+    or a single JSON array of orders, without reading the whole file.
+    Args:
+        file: Text file object to read from
+        on_error(callable): (optional) Called with (line_number, message) for
+            NDJSON lines that are not valid JSON. Raises ValueError if not set.
+    """
+    first_char = file.read(1)
+    while first_char and first_char in _WHITESPACE:
+        first_char = file.read(1)
+
+    if first_char == '[':
+        yield from _stream_json_array(file)
+    elif first_char:
+        yield from _stream_ndjson(file, first_char, on_error)
+
+
+def _stream_ndjson(file, first_char, on_error):
+    for line_number, line in enumerate(_prepend(first_char, file), start=1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as error:
+            if on_error is None:
+                raise ValueError({"line": line_number, "message": str(error)}) from error
+            on_error(line_number, str(error))
+
+
+def _prepend(first_char, file):
+    """
+    Yield the lines of file with first_char, which was already read, restored
+    """
+    first_line = first_char + file.readline()
+    yield first_line
+    yield from file
+
+
+def _stream_json_array(file):
+    """
+    Yield the elements of a JSON array. The opening bracket has been read.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    read_size = READ_SIZE
+    eof = False
+
+    while True:
+        # Skip whitespace and element separators
+        while position < len(buffer) and buffer[position] in _WHITESPACE + ',':
+            position += 1
+
+        if position < len(buffer) and buffer[position] == ']':
+            return
+
+        try:
+            if position >= len(buffer):
+                raise json.JSONDecodeError("Need more data", buffer, position)
+            element, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as error:
+            if eof:
+                raise ValueError({"position": error.pos,
+                                  "message": "Invalid or truncated JSON array"}) from error
+
+            # Drop what has been consumed and read more of the element.
+            # The read size grows so very large elements are not re-parsed
+            # for every small chunk.
+            buffer = buffer[position:]
+            position = 0
+            chunk = file.read(read_size)
+            if not chunk:
+                eof = True
+            buffer += chunk
+            read_size = min(read_size * 2, 64 * READ_SIZE)
+            continue
+
+        position = end
+        read_size = READ_SIZE
+        yield element
+
+
+def write_ndjson(file, record):
+    """
+    Write a record to an NDJSON file
+    """
+    file.write(json.dumps(record, separators=(',', ':')))
+    file.write('\n')
+
+
+def inject_orders(order_injection, orders, results_file, rejections_file, **kwargs):
+    """
+    Inject orders and stream the outcome of each one to NDJSON files.
+    Args:
+        order_injection: OrderInjection API class to inject with
+        orders(iterable): Order payloads, consumed lazily
+        results_file: Text file for injected orders
+        rejections_file: Text file for orders that failed validation or injection
+        max_in_flight(int): (optional) Maximum number of orders being sent at once
+        skip_validation(bool): (optional) Skip payload validation
+        validation_workers(int): (optional) Validate in this many processes
+            before injecting. Default: 1, orders are validated by the workers
+            sending them
+        dry_run(bool): (optional) Only validate, nothing is sent to NewStore
+        progress(callable): (optional) Called with the BulkStats every
+            progress_interval seconds and once at the end
+        progress_interval(float): (optional) Seconds between progress calls
+    Returns the BulkStats of the run.
+    """
+    progress = kwargs.get('progress')
+    progress_interval = kwargs.get('progress_interval', 5)
+    validation_workers = kwargs.get('validation_workers', 1)
+    skip_validation = kwargs.get('skip_validation')
+
+    def reject(result):
+        # Orders rejected by the validation processes never reach create_orders.
+        # They are written as they are found, so a long run of invalid orders
+        # is not held in memory until the next injected order completes.
+        write_ndjson(rejections_file, result)
+        results.stats.failed += 1
+
+    if kwargs.get('dry_run'):
+        results = BulkResults(validation_results(order_injection, orders, validation_workers))
+    else:
+        if validation_workers > 1 and not skip_validation:
+            orders = _valid_orders(order_injection, orders, reject, validation_workers)
+            skip_validation = True
+        results = order_injection.create_orders(orders,
+                                                max_in_flight=kwargs.get('max_in_flight', 8),
+                                                skip_validation=skip_validation)
+
+    next_report = time.monotonic() + progress_interval
+    for result in results:
+        if result["success"]:
+            write_ndjson(results_file, result)
+        else:
+            write_ndjson(rejections_file, result)
+
+        if progress is not None and time.monotonic() >= next_report:
+            progress(results.stats)
+            next_report = time.monotonic() + progress_interval
+
+    if progress is not None:
+        progress(results.stats)
+
+    return results.stats
+
+
+def validation_results(order_injection, orders, workers=1):
+    """
+    Yield a result dict for every order, in the format of create_orders,
+    from validation only
+    """
+    orders, to_validate = itertools.tee(orders)
+    all_errors = order_injection.validate_many(to_validate, workers=workers, lazy=True)
+    for payload, errors in zip(orders, all_errors):
+        yield _validation_result(payload, errors)
+
+
+def _valid_orders(order_injection, orders, reject, workers):
+    """
+    Validate orders across processes, yielding valid orders and calling
+    reject with the result of every invalid one
+    """
+    orders, to_validate = itertools.tee(orders)
+    all_errors = order_injection.validate_many(to_validate, workers=workers, lazy=True)
+    for payload, errors in zip(orders, all_errors):
+        if errors:
+            reject(_validation_result(payload, errors))
+        else:
+            yield payload
+
+
+def _validation_result(payload, errors):
+    external_id = payload.get("external_id") if isinstance(payload, dict) else None
+    if not errors:
+        return {"external_id": external_id, "success": True}
+
+    return {"external_id": external_id,
+            "success": False,
+            "error": {"type": "validation", "errors": errors}}
+
+
+def print_progress(stats, file=None):
+    """
+    Print a one line progress report for a BulkStats
+    """
+    print(f"{stats.completed} orders ({stats.succeeded} ok, {stats.failed} failed) "
+          f"in {stats.elapsed:.1f}s, {stats.per_second:.1f} orders/s",
+          file=file or sys.stderr)
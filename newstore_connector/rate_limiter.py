@@ -0,0 +1,232 @@
+"""
+Module for client side rate limiting of NewStore API requests
+"""
+import contextlib
+import threading
+import time
+
+from .deadline import DeadlineExceeded, phase, RATE_LIMIT
+
+RATE_LIMITED_STATUS = 429
+
+
+class RateLimit:
+    """
+    Rate limit settings for an endpoint, or the default for all endpoints.
+    Args:
+        rate(float): Starting requests per second
+        burst(int): Requests that can be sent at once after being idle
+        min_rate(float): The rate is never decreased below this
+        max_rate(float): The rate is never increased above this
+        increase(float): Requests per second added to the rate for every
+            second of requests without a 429
+        decrease_factor(float): The rate is multiplied by this on a 429
+    """
+
+    def __init__(self, rate=10, **kwargs):
+        self.rate = rate
+        self.burst = kwargs.get('burst', 1)
+        self.min_rate = kwargs.get('min_rate', 1)
+        self.max_rate = kwargs.get('max_rate', rate * 10)
+        self.increase = kwargs.get('increase', 1)
+        self.decrease_factor = kwargs.get('decrease_factor', 0.5)
+
+
+class _Bucket:
+    """
+    Token bucket for one endpoint. Requests reserve the next free slot, so
+    waiting happens outside the lock and works for both threads and asyncio.
+    The rate is adapted with AIMD: it grows slowly while requests succeed and
+    is cut when NewStore answers 429.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.rate = config.rate
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+        self._paused_until = 0.0
+        self.waiting = 0
+        self.in_flight = 0
+        self.sent = 0
+        self.throttled = 0
+
+    def after_fork(self):
+        """
+        Replace the lock, which a thread of the parent process may have held.
+        Requests of the parent are not waiting or in flight in the child.
+        """
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.in_flight = 0
+
+    def reserve(self):
+        """
+        Reserve a slot to send a request, returns the seconds to wait for it
+        """
+        with self._lock:
+            now = time.monotonic()
+            interval = 1 / self.rate
+            start_after = max(now, self._paused_until)
+            next_slot = max(self._next_slot, start_after)
+            start = max(start_after, next_slot - (self.config.burst - 1) * interval)
+            self._next_slot = next_slot + interval
+            return start - now
+
+    def record(self, status_code, retry_after=None):
+        """
+        Adapt the rate to the status of a response
+        """
+        with self._lock:
+            self.sent += 1
+            if status_code == RATE_LIMITED_STATUS:
+                self.throttled += 1
+                self.rate = max(self.config.min_rate, self.rate * self.config.decrease_factor)
+                pause = _parse_retry_after(retry_after)
+                if pause is None:
+                    pause = 1 / self.rate
+                self._paused_until = max(self._paused_until, time.monotonic() + pause)
+                # Slots reserved at the old rate start over after the pause
+                self._next_slot = self._paused_until
+            else:
+                self.rate = min(self.config.max_rate,
+                                self.rate + self.config.increase / self.rate)
+
+    def count(self, counter, delta):
+        """
+        Add delta to the waiting or in_flight counter
+        """
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + delta)
+
+    def stats(self):
+        """
+        Return the current state of the bucket
+        """
+        return {
+            "rate": self.rate,
+            "queue_depth": self.waiting,
+            "in_flight": self.in_flight,
+            "sent": self.sent,
+            "throttled": self.throttled
+        }
+
+
+def _check_wait(deadline, delay):
+    """
+    Raise DeadlineExceeded if a wait of delay seconds would outlast deadline.
+    The slot reserved for the request is not given back.
+    """
+    if deadline is not None and delay >= deadline.remaining():
+        raise DeadlineExceeded(deadline, RATE_LIMIT)
+
+
+def _parse_retry_after(retry_after):
+    """
+    Return the seconds of a Retry-After header in seconds format, or None
+    """
+    try:
+        return max(float(retry_after), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveRateLimiter:
+    """
+    Rate limiter shared by all API classes of a connector.
+    Args:
+        default(RateLimit): (optional) Limit shared by every endpoint that is not
+            configured in endpoints
+        endpoints(dict): (optional) RateLimit per endpoint. Endpoints are named
+            after the API method, IE: "create_order", "get_order_notes"
+        max_retries(int): (optional) Times a request answered with 429 is sent
+            again after waiting. Default: 3
+    """
+
+    def __init__(self, default=None, endpoints=None, max_retries=3):
+        self.default = default or RateLimit()
+        self.max_retries = max_retries
+        self._default_bucket = _Bucket(self.default)
+        self._buckets = {endpoint: _Bucket(config)
+                         for endpoint, config in (endpoints or {}).items()}
+
+    def after_fork(self):
+        """
+        Give the buckets new locks in a forked child process
+        """
+        for bucket in (self._default_bucket, *self._buckets.values()):
+            bucket.after_fork()
+
+    def _bucket(self, endpoint):
+        return self._buckets.get(endpoint, self._default_bucket)
+
+    @contextlib.contextmanager
+    def acquire(self, endpoint, deadline=None):
+        """
+        Wait for a slot to send a request to endpoint. The response status
+        must be passed to record() of the yielded bucket.
+        With a Deadline, DeadlineExceeded is raised instead of waiting for a
+        slot later than the deadline.
+        """
+        bucket = self._bucket(endpoint)
+        delay = bucket.reserve()
+        if delay > 0:
+            _check_wait(deadline, delay)
+            bucket.count("waiting", 1)
+            try:
+                with phase(deadline, RATE_LIMIT):
+                    time.sleep(delay)
+            finally:
+                bucket.count("waiting", -1)
+
+        bucket.count("in_flight", 1)
+        try:
+            yield bucket
+        finally:
+            bucket.count("in_flight", -1)
+
+    @contextlib.asynccontextmanager
+    async def async_acquire(self, endpoint, deadline=None):
+        """
+        Asyncio counterpart of acquire
+        """
+        import asyncio # pylint: disable=import-outside-toplevel
+
+        bucket = self._bucket(endpoint)
+        delay = bucket.reserve()
+        if delay > 0:
+            _check_wait(deadline, delay)
+            bucket.count("waiting", 1)
+            try:
+                with phase(deadline, RATE_LIMIT):
+                    await asyncio.sleep(delay)
+            finally:
+                bucket.count("waiting", -1)
+
+        bucket.count("in_flight", 1)
+        try:
+            yield bucket
+        finally:
+            bucket.count("in_flight", -1)
+
+    def rate(self, endpoint=None):
+        """
+        Current requests per second allowed for endpoint
+        """
+        return self._bucket(endpoint).rate
+
+    def queue_depth(self, endpoint=None):
+        """
+        Number of requests waiting for a slot on endpoint
+        """
+        return self._bucket(endpoint).waiting
+
+    def stats(self):
+        """
+        Return the state of every bucket, the shared bucket is under "default"
+        """
+        stats = {"default": self._default_bucket.stats()}
+        for endpoint, bucket in self._buckets.items():
+            stats[endpoint] = bucket.stats()
+
+        return stats
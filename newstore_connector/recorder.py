@@ -0,0 +1,149 @@
+"""
+Module for recording the traffic of a connector, to be replayed by
+benchmarks.replay.
+
+The recorder is a RequestHooks added to the `hooks` of a connector. Every API
+call is written as one JSON line with its endpoint, path, the time it started
+relative to the start of the recording, how long it took and its status code.
+Request bodies are kept, redacted or dropped. Files ending in .gz are gzipped.
+"""
+import gzip
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+from .instrumentation import RequestHooks
+
+KEEP = "keep"
+REDACT = "redact"
+DROP = "drop"
+
+
+def redact(value):
+    """
+    Return value with every string replaced by as many "x", keeping the keys,
+    types and sizes of the document but none of its text
+    """
+    if isinstance(value, str):
+        return "x" * len(value)
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [redact(item) for item in value]
+
+    return value
+
+
+def _request_body(response):
+    """
+    Return the body sent for a requests or httpx response as bytes
+    """
+    request = getattr(response, 'request', None)
+    body = getattr(request, 'body', None)
+    if body is None:
+        body = getattr(request, 'content', None)
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    if not body:
+        return b''
+
+    headers = getattr(request, 'headers', None) or {}
+    if headers.get('Content-Encoding') == 'gzip':
+        body = gzip.decompress(body)
+    return body
+
+
+class TrafficRecorder(RequestHooks):
+    """
+    Request hooks writing every API call of a connector to an NDJSON file.
+    Args:
+        path(str): File to write, gzipped if it ends in .gz
+        payloads(str): (optional) "keep" the request bodies, "redact" their
+            text with redact() or "drop" them. Default: "redact"
+    Headers are never recorded, so tokens don't end up in the file.
+    """
+
+    def __init__(self, path, payloads=REDACT):
+        if payloads not in (KEEP, REDACT, DROP):
+            raise ValueError({"payloads": f"Must be one of {KEEP}, {REDACT} or {DROP}"})
+
+        self.path = path
+        self.payloads = payloads
+        self.recorded = 0
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        if path.endswith('.gz'):
+            self._file = gzip.open(path, "wt", encoding='utf-8')
+        else:
+            self._file = open(path, "w", encoding='utf-8') # pylint: disable=consider-using-with
+
+    def after_request(self, endpoint, response, elapsed):
+        request = getattr(response, 'request', None)
+        record = self._record(endpoint, getattr(request, 'method', None),
+                              str(getattr(request, 'url', '')), elapsed)
+        record["status"] = response.status_code
+
+        body = _request_body(response)
+        record["size"] = len(body)
+        if body and self.payloads != DROP:
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                payload = None
+            if self.payloads == REDACT:
+                payload = redact(payload)
+                record["redacted"] = True
+            record["body"] = payload
+        self._write(record)
+
+    def on_error(self, endpoint, error, elapsed):
+        request = getattr(getattr(error, 'response', None), 'request', None) or \
+            getattr(error, 'request', None)
+        record = self._record(endpoint, getattr(request, 'method', None),
+                              str(getattr(request, 'url', '')), elapsed)
+        record["status"] = None
+        record["error"] = type(error).__name__
+        self._write(record)
+
+    def _record(self, endpoint, method, url, elapsed):
+        return {
+            "start": round(time.monotonic() - elapsed - self._started, 6),
+            "endpoint": endpoint,
+            "method": method,
+            "path": urlsplit(url).path,
+            "elapsed": round(elapsed, 6)
+        }
+
+    def _write(self, record):
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(line)
+            self.recorded += 1
+
+    def close(self):
+        """
+        Flush and close the file. Calls recorded after this are dropped
+        """
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def load_traffic(path):
+    """
+    Return the records of a recording ordered by their start time
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, "rt", encoding='utf-8') as file:
+        records = [json.loads(line) for line in file if line.strip()]
+
+    records.sort(key=lambda record: record["start"])
+    return records
@@ -0,0 +1,213 @@
+"""
+Module for sharing NewStoreConnectors between the tenants served by one process
+"""
+import collections
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .ns_connector import NewStoreConnector, POOL_MAXSIZE
+
+MAX_CONNECTORS = 32
+IDLE_TTL = 600
+
+
+class _RegistryEntry:
+    """
+    A connector held by the registry and when it was last handed out
+    """
+    __slots__ = ('connector', 'last_used')
+
+    def __init__(self, connector):
+        self.connector = connector
+        self.last_used = time.monotonic()
+
+
+class NewStoreConnectorRegistry:
+    """
+    Lazily created NewStoreConnectors, one per tenant, env and role.
+    Args:
+        credentials(dict or callable): Authentication kwargs of a connector,
+            IE: client_id and client_secret, or token. Either a dict keyed by
+            tenant, or a callable taking (tenant, env, role)
+        max_connectors(int): (optional) Connectors kept open, the least
+            recently used is closed beyond this. Default: 32
+        idle_ttl(float): (optional) Seconds a connector is kept without being
+            used. None to keep idle connectors. Default: 600
+        hot_tenants(list): (optional) Tenants, or (tenant, env, role) tuples,
+            created and authenticated by warm() and never evicted
+        connector_class(type): (optional) Default: NewStoreConnector
+    Any other kwargs are passed to every connector, IE: max_retries, hooks or
+    token_cache. All connectors send their token requests through one pooled
+    session, since every tenant authenticates against the same identity host.
+    """
+
+    def __init__(self, credentials, **kwargs):
+        self.credentials = credentials
+        self.max_connectors = kwargs.pop('max_connectors', MAX_CONNECTORS)
+        self.idle_ttl = kwargs.pop('idle_ttl', IDLE_TTL)
+        self.hot_tenants = [self._key(tenant) for tenant in kwargs.pop('hot_tenants', ())]
+        self.connector_class = kwargs.pop('connector_class', NewStoreConnector)
+        self.connector_kwargs = kwargs
+
+        self.auth_session = requests.Session()
+        self.auth_session.mount("https://", HTTPAdapter(pool_maxsize=POOL_MAXSIZE))
+
+        self._lock = threading.Lock()
+        self._connectors = collections.OrderedDict()
+        self._creating = {}
+        self.hits = 0
+        self.created = 0
+        self.evicted = 0
+
+    @staticmethod
+    def _key(tenant, env="p", role=None):
+        if isinstance(tenant, tuple):
+            return NewStoreConnectorRegistry._key(*tenant)
+
+        return (tenant, env, role)
+
+    def get(self, tenant, env="p", role=None):
+        """
+        Return the connector for a tenant, env and role, creating and
+        authenticating it on first use. A connector is created once even if
+        several threads ask for it at the same time.
+        """
+        key = self._key(tenant, env, role)
+        with self._lock:
+            connector = self._use(key)
+            if connector is not None:
+                self.hits += 1
+                return connector
+            key_lock = self._creating.setdefault(key, threading.Lock())
+
+        # Only callers of the same key wait for the token request
+        with key_lock:
+            with self._lock:
+                connector = self._use(key)
+            if connector is not None:
+                return connector
+
+            try:
+                connector = self._create(key)
+                with self._lock:
+                    self._connectors[key] = _RegistryEntry(connector)
+                    self.created += 1
+                    evicted = self._evict()
+            finally:
+                # Dropped even if creating the connector failed, IE: bad credentials
+                with self._lock:
+                    self._creating.pop(key, None)
+
+        _close_all(evicted)
+        return connector
+
+    def _use(self, key):
+        """
+        Return the connector of key marked as just used, or None
+        """
+        entry = self._connectors.get(key)
+        if entry is None:
+            return None
+
+        entry.last_used = time.monotonic()
+        self._connectors.move_to_end(key)
+        return entry.connector
+
+    def _create(self, key):
+        tenant, env, role = key
+        if callable(self.credentials):
+            credentials = self.credentials(tenant, env, role)
+        else:
+            credentials = self.credentials[tenant]
+
+        kwargs = dict(self.connector_kwargs, **credentials)
+        kwargs.update(tenant=tenant, env=env, auth_session=self.auth_session)
+        if role is not None:
+            kwargs['role'] = role
+
+        return self.connector_class(**kwargs)
+
+    def _evict(self):
+        """
+        Remove idle connectors and the least recently used ones beyond
+        max_connectors. Returns the removed connectors to be closed.
+        """
+        evicted = []
+        now = time.monotonic()
+        for key, entry in list(self._connectors.items()):
+            if key in self.hot_tenants:
+                continue
+            expired = self.idle_ttl is not None and now - entry.last_used >= self.idle_ttl
+            if expired or len(self._connectors) > self.max_connectors:
+                evicted.append(self._connectors.pop(key).connector)
+
+        self.evicted += len(evicted)
+        return evicted
+
+    def evict_idle(self):
+        """
+        Close connectors that were not used for idle_ttl seconds. Idle
+        connectors are also evicted whenever a new connector is created.
+        """
+        with self._lock:
+            evicted = self._evict()
+
+        _close_all(evicted)
+        return len(evicted)
+
+    def warm(self, background=False):
+        """
+        Create the connectors of the hot tenants and fetch their tokens, so
+        their first requests don't wait for authentication.
+        With background, warming runs in a daemon thread which is returned.
+        """
+        if background:
+            thread = threading.Thread(target=self.warm, daemon=True)
+            thread.start()
+            return thread
+
+        for key in self.hot_tenants:
+            self.get(*key).token_manager.get_token()
+
+        return None
+
+    def stats(self):
+        """
+        Return the number of open connectors and the registry counters
+        """
+        with self._lock:
+            return {
+                "connectors": len(self._connectors),
+                "hits": self.hits,
+                "created": self.created,
+                "evicted": self.evicted
+            }
+
+    def close(self):
+        """
+        Close every connector and the shared token session
+        """
+        with self._lock:
+            connectors = [entry.connector for entry in self._connectors.values()]
+            self._connectors.clear()
+
+        _close_all(connectors)
+        self.auth_session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _close_all(connectors):
+    """
+    Close the pooled connections of evicted connectors. Requests still running
+    on them finish, their connections are closed instead of being pooled.
+    """
+    for connector in connectors:
+        connector.session.close()
@@ -0,0 +1,69 @@
+"""
+Module for encoding request bodies sent to the NewStore API.
+
+orjson is used when it is installed, it encodes large orders several times
+faster than the standard library json module.
+"""
+import gzip
+import json
+
+try:
+    import orjson
+except ImportError: # pragma: no cover
+    orjson = None
+
+GZIP_LEVEL = 1
+
+
+def dumps(payload):
+    """
+    Serialize payload to compact UTF-8 JSON bytes
+    """
+    if orjson is not None:
+        return orjson.dumps(payload)
+
+    return json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def loads(data):
+    """
+    Deserialize JSON from bytes or str
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+
+    return json.loads(data)
+
+
+def serialize(payload, json_dumps=None):
+    """
+    Return payload as JSON bytes. Payloads already serialized to bytes or str
+    are returned as bytes without being serialized again.
+    """
+    if isinstance(payload, (bytes, bytearray)):
+        return bytes(payload)
+    if isinstance(payload, str):
+        return payload.encode('utf-8')
+
+    body = (json_dumps or dumps)(payload)
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+
+    return body
+
+
+def encode_body(payload, json_dumps=None, compress_threshold=None):
+    """
+    Encode payload as a request body.
+    Args:
+        payload: dict to serialize, or JSON already serialized to bytes or str
+        json_dumps(callable): (optional) Serializer returning bytes or str. Default: dumps
+        compress_threshold(int): (optional) Gzip bodies of at least this many bytes.
+            Default: None, bodies are never compressed
+    Returns (body, content_encoding), content_encoding is None for uncompressed bodies.
+    """
+    body = serialize(payload, json_dumps)
+    if compress_threshold is not None and len(body) >= compress_threshold:
+        return gzip.compress(body, compresslevel=GZIP_LEVEL), 'gzip'
+
+    return body, None
@@ -0,0 +1,343 @@
+"""
+Module for keeping NewStore authentication tokens valid
+"""
+import contextlib
+import getpass
+import hashlib
+import json
+import logging
+import os
+import stat
+import tempfile
+import threading
+import time
+
+from .deadline import DeadlineExceeded, TOKEN
+
+try:
+    import fcntl
+except ImportError: # pragma: no cover
+    fcntl = None
+
+TOKEN_REFRESH_MARGIN = 60
+# Seconds between attempts to take the lock of a FileTokenCache within a deadline
+LOCK_POLL_INTERVAL = 0.01
+
+logger = logging.getLogger(__name__)
+
+
+class TokenManager:
+    """
+    Holds the current token and refreshes it ahead of expiry.
+    Args:
+        fetch_token(callable): Returns (token, expires_in) for a new token
+        refresh_margin(int): Seconds before expiry to start refreshing the token
+        cache(FileTokenCache): (optional) Cache shared with other processes
+        cache_key(str): Key of the token in the cache
+    Only one refresh runs at a time. While the current token is still valid,
+    callers keep using it during a refresh instead of waiting on it.
+    """
+
+    def __init__(self, fetch_token, **kwargs):
+        self._fetch_token = fetch_token
+        self.refresh_margin = kwargs.get('refresh_margin', TOKEN_REFRESH_MARGIN)
+        self.cache = kwargs.get('cache')
+        self.cache_key = kwargs.get('cache_key')
+        self._lock = threading.Lock()
+
+        self.token = None
+        self.expires_at = None
+        self.refresh_at = None
+        self.refresh_count = 0
+
+    def after_fork(self):
+        """
+        Replace the lock, which a thread of the parent process may have held
+        """
+        self._lock = threading.Lock()
+
+    def set_token(self, token, expires_in=None):
+        """
+        Set the current token. Tokens without expires_in are never refreshed.
+        """
+        self._set_token(token, time.time() + expires_in if expires_in else None)
+
+    def _set_token(self, token, expires_at):
+        self.token = token
+        self.expires_at = expires_at
+        self.refresh_at = self._refresh_time(expires_at)
+
+    def _refresh_time(self, expires_at):
+        """
+        Return when a token expiring at expires_at should be refreshed
+        """
+        if expires_at is None:
+            return None
+
+        # Short lived tokens are refreshed half way through their lifetime
+        margin = min(self.refresh_margin, (expires_at - time.time()) / 2)
+        return expires_at - margin
+
+    def is_expired(self):
+        """
+        True if there is no token or the token has expired
+        """
+        return self.token is None or \
+            (self.expires_at is not None and time.time() >= self.expires_at)
+
+    def needs_refresh(self):
+        """
+        True if the token is missing, expired or inside the refresh margin
+        """
+        return self.token is None or \
+            (self.refresh_at is not None and time.time() >= self.refresh_at)
+
+    def invalidate(self):
+        """
+        Drop the current token so the next get_token() fetches a new one
+        """
+        self.token = None
+        self.expires_at = None
+        self.refresh_at = None
+
+    def get_token(self, deadline=None):
+        """
+        Return a valid token, refreshing it first if needed. With a Deadline,
+        waiting for another thread's refresh and the fetch are bounded by it.
+        """
+        if not self.needs_refresh():
+            return self.token
+
+        if not self.is_expired():
+            # Still valid, refresh only if no other thread is already doing it
+            if self._lock.acquire(blocking=False): # pylint: disable=consider-using-with
+                try:
+                    if self.needs_refresh():
+                        self._refresh(deadline)
+                except Exception: # pylint: disable=broad-exception-caught
+                    # The current token still works, the next call retries
+                    logger.warning("Token refresh failed, using the current token",
+                                   exc_info=True)
+                finally:
+                    self._lock.release()
+            return self.token
+
+        timeout = -1 if deadline is None else deadline.timeout(TOKEN)
+        if not self._lock.acquire(timeout=timeout): # pylint: disable=consider-using-with
+            raise DeadlineExceeded(deadline, TOKEN)
+        try:
+            # Another thread may have refreshed while this one waited
+            if self.is_expired():
+                self._refresh(deadline)
+        finally:
+            self._lock.release()
+
+        return self.token
+
+    def _refresh(self, deadline=None):
+        """
+        Refresh the token, using the cross-process cache if one is set
+        """
+        if self.cache is None:
+            self._fetch(deadline)
+            return
+
+        with self.cache.lock(self.cache_key, deadline):
+            if self._load_from_cache():
+                return
+            self._fetch(deadline)
+            self.cache.set(self.cache_key, self.token, self.expires_at)
+
+    def _load_from_cache(self):
+        """
+        Use the cached token if it is not due for a refresh. Returns True if it was used
+        """
+        cached = self.cache.get(self.cache_key)
+        if not cached:
+            return False
+
+        token, expires_at = cached
+        refresh_at = self._refresh_time(expires_at)
+        if not token or (refresh_at is not None and time.time() >= refresh_at):
+            return False
+
+        self._set_token(token, expires_at)
+        return True
+
+    def _fetch(self, deadline=None):
+        if deadline is None:
+            token, expires_in = self._fetch_token()
+        else:
+            token, expires_in = self._fetch_token(deadline=deadline)
+        self.set_token(token, expires_in)
+        self.refresh_count += 1
+
+
+class AsyncTokenManager(TokenManager):
+    """
+    TokenManager for the asyncio connector. fetch_token is a coroutine function
+    returning (token, expires_in), and get_token() must be awaited.
+    """
+
+    def __init__(self, fetch_token, **kwargs):
+        super().__init__(fetch_token, **kwargs)
+        self._async_lock = None
+
+    async def get_token(self): # pylint: disable=invalid-overridden-method
+        """
+        Return a valid token, refreshing it first if needed
+        """
+        if not self.needs_refresh():
+            return self.token
+
+        # Created lazily so the lock belongs to the running event loop
+        if self._async_lock is None:
+            import asyncio # pylint: disable=import-outside-toplevel
+
+            self._async_lock = asyncio.Lock()
+
+        if not self.is_expired() and self._async_lock.locked():
+            return self.token
+
+        async with self._async_lock:
+            if self.needs_refresh():
+                try:
+                    await self._refresh()
+                except Exception: # pylint: disable=broad-exception-caught
+                    if self.is_expired():
+                        raise
+                    logger.warning("Token refresh failed, using the current token",
+                                   exc_info=True)
+
+        return self.token
+
+    async def _refresh(self): # pylint: disable=invalid-overridden-method
+        """
+        Refresh the token, sharing it through the cache if one is set. The
+        cross-process lock is not taken so the event loop is never blocked.
+        """
+        if self.cache is not None and self._load_from_cache():
+            return
+
+        token, expires_in = await self._fetch_token()
+        self.set_token(token, expires_in)
+        self.refresh_count += 1
+
+        if self.cache is not None:
+            self.cache.set(self.cache_key, self.token, self.expires_at)
+
+
+class FileTokenCache:
+    """
+    Token cache shared between processes on the same host. Each key is stored
+    in its own file, readable only by the current user, and refreshes are
+    serialized with a file lock so only one process fetches a new token.
+    Args:
+        directory(str): (optional) Directory to store tokens in. Default: a
+            directory of the current user in the temp directory, which must be
+            owned by the user, only accessible by them and not a symlink
+    """
+
+    def __init__(self, directory=None):
+        if directory is None:
+            directory = os.path.join(tempfile.gettempdir(),
+                                     f"newstore_connector_tokens_{_user_id()}")
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            _check_private(directory)
+        else:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+
+        self.directory = directory
+
+    @staticmethod
+    def build_key(tenant, role, client_id=None):
+        """
+        Build the cache key for a tenant, role and client
+        """
+        return f"{tenant}:{role}:{client_id or ''}"
+
+    def _path(self, key, extension):
+        name = hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+        return os.path.join(self.directory, f"{name}.{extension}")
+
+    def get(self, key):
+        """
+        Return (token, expires_at) for the key, or None if nothing is cached
+        """
+        try:
+            with open(self._path(key, "json"), "r", encoding='utf-8') as file:
+                cached = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        return cached.get("token"), cached.get("expires_at")
+
+    def set(self, key, token, expires_at):
+        """
+        Store the token for the key
+        """
+        path = self._path(key, "json")
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, "w", encoding='utf-8') as file:
+            json.dump({"token": token, "expires_at": expires_at}, file)
+        os.replace(tmp_path, path)
+
+    @contextlib.contextmanager
+    def lock(self, key, deadline=None):
+        """
+        Hold an exclusive lock on the key across processes. With a Deadline,
+        waiting for the lock raises DeadlineExceeded once the token phase has
+        no time left. On platforms without fcntl no lock is taken, so several
+        processes may fetch a token at the same time.
+        """
+        if fcntl is None: # pragma: no cover
+            yield
+            return
+
+        with open(self._path(key, "lock"), "a", encoding='utf-8') as lock_file:
+            if deadline is None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            else:
+                _flock_within(lock_file, deadline)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _user_id():
+    """
+    Return the id of the current user, or its name where there are no uids
+    """
+    if hasattr(os, "getuid"):
+        return os.getuid()
+
+    return getpass.getuser() # pragma: no cover
+
+
+def _check_private(directory):
+    """
+    Raise ValueError unless directory is a real directory owned by the current
+    user and only accessible by them, so other users can't read or plant tokens
+    """
+    if not hasattr(os, "getuid"): # pragma: no cover
+        return
+
+    status = os.lstat(directory)
+    if (not stat.S_ISDIR(status.st_mode) or status.st_uid != os.getuid()
+            or stat.S_IMODE(status.st_mode) != 0o700):
+        raise ValueError({"directory": f"{directory} must be a directory owned by the "
+                                       "current user with mode 0o700, not a symlink"})
+
+
+def _flock_within(lock_file, deadline):
+    """
+    Take an exclusive flock on lock_file, trying again until the token phase
+    of deadline has no time left
+    """
+    while True:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return
+        except BlockingIOError:
+            time.sleep(min(LOCK_POLL_INTERVAL, deadline.timeout(TOKEN)))
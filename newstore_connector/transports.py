@@ -0,0 +1,220 @@
+"""
+Module for the transports sending the requests of the NewStore API classes.
+
+A transport is any object with `request(method, url, **kwargs)` taking the
+arguments of requests.Session.request and returning a response with
+`status_code`, `headers`, `content`, `json()` and `raise_for_status()`, and
+`close()`. The requests session of the connector is the default transport.
+Transports may also implement `warm_up(url, connections)` and `stats()`,
+used by NewStoreConnector.warm_up and connection_stats.
+"""
+import http
+import json
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+try:
+    import httpx
+except ImportError: # pragma: no cover
+    httpx = None
+
+HTTP2_MAX_CONNECTIONS = 10
+HTTP2_TIMEOUT = 30
+
+# Counters returned by Transport.stats and NewStoreConnector.connection_stats
+CONNECTION_STATS = ("pools", "requests", "connections_opened", "connections_reused",
+                    "idle_connections")
+
+
+class Transport:
+    """
+    Base class for transports. Subclasses implement request.
+    """
+
+    def request(self, method, url, **kwargs):
+        """
+        Send a request and return its response
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Close the connections of the transport
+        """
+
+    def after_fork(self):
+        """
+        Called in a forked child process, to stop using the parent's connections
+        """
+
+    def warm_up(self, url, connections=1): # pylint: disable=unused-argument
+        """
+        Open up to connections connections to the host of url ahead of the
+        first requests, returns the number of connections opened
+        """
+        return 0
+
+    def stats(self):
+        """
+        Return the connection reuse counters of CONNECTION_STATS
+        """
+        return dict.fromkeys(CONNECTION_STATS, 0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class HTTP2Transport(Transport):
+    """
+    Transport multiplexing concurrent requests over a few HTTP/2 connections
+    with an httpx.Client. Requires httpx with HTTP/2 support: pip install httpx[http2]
+    Args:
+        max_connections(int): (optional) Connections kept open over every host. Default: 10
+        timeout(float): (optional) Default timeout of a request. Default: 30
+    Any other kwargs are passed to httpx.Client. Responses are httpx.Response,
+    so raise_for_status raises httpx.HTTPStatusError. Statuses are retried by
+    the API classes with the retry settings of the connector.
+    HTTP/2 multiplexes the requests to a host over one connection, so warm_up
+    opens at most one connection per host.
+    """
+
+    def __init__(self, **kwargs):
+        if httpx is None:
+            raise ImportError("HTTP2Transport requires httpx: pip install httpx[http2]")
+
+        self._client_kwargs = kwargs
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._connections_opened = 0
+        self.client = self._build_client()
+
+    def _build_client(self):
+        kwargs = dict(self._client_kwargs)
+        max_connections = kwargs.pop('max_connections', HTTP2_MAX_CONNECTIONS)
+        kwargs.setdefault('timeout', HTTP2_TIMEOUT)
+
+        return httpx.Client(
+            http2=True,
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections),
+            **kwargs
+        )
+
+    def request(self, method, url, **kwargs):
+        """
+        Send a request with the httpx client
+        """
+        # requests sends pre-encoded bodies as data, httpx as content
+        if kwargs.get('data') is not None:
+            kwargs['content'] = kwargs.pop('data')
+        kwargs['extensions'] = dict(kwargs.get('extensions') or {}, trace=self._trace)
+
+        with self._lock:
+            self._requests += 1
+
+        return self.client.request(method, url, **kwargs)
+
+    def _trace(self, event, info): # pylint: disable=unused-argument
+        # httpcore reports each new connection, IE: connection.connect_tcp.complete
+        if event.startswith("connection.connect_") and event.endswith(".complete"):
+            with self._lock:
+                self._connections_opened += 1
+
+    def warm_up(self, url, connections=1): # pylint: disable=unused-argument
+        """
+        Open the HTTP/2 connection to the host of url with a HEAD request,
+        returns 1 if a connection was opened
+        """
+        opened = self._connections_opened
+        self.request("HEAD", url)
+
+        return min(self._connections_opened - opened, 1)
+
+    def stats(self):
+        """
+        Return the connection reuse counters of the client. The client has a
+        single pool for every host.
+        """
+        # pylint: disable=protected-access
+        pool = getattr(getattr(self.client, '_transport', None), '_pool', None)
+        pooled = list(getattr(pool, 'connections', ()))
+        with self._lock:
+            requests_sent, opened = self._requests, self._connections_opened
+
+        return {
+            "pools": 1,
+            "requests": requests_sent,
+            "connections_opened": opened,
+            "connections_reused": max(requests_sent - opened, 0),
+            "idle_connections": sum(1 for connection in pooled if connection.is_idle())
+        }
+
+    def close(self):
+        self.client.close()
+
+    def after_fork(self):
+        # Closing the parent's client would end its HTTP/2 connections
+        self._lock = threading.Lock()
+        self._requests = self._connections_opened = 0
+        self.client = self._build_client()
+
+
+class InMemoryTransport(Transport):
+    """
+    Transport answering requests in this process without opening connections,
+    for tests and benchmarks. Responses are produced by
+    `handler(method, path, body)` which returns (status_code, json_body) or
+    (status_code, json_body, headers), like tests.stub_server.
+    Every request is recorded in `requests` as (method, path, body).
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.requests = []
+
+    def request(self, method, url, **kwargs):
+        """
+        Return the response of the handler as a requests.Response
+        """
+        parts = urlsplit(url)
+        path = parts.path + (f"?{parts.query}" if parts.query else "")
+
+        body = kwargs.get('data')
+        if body is None and kwargs.get('json') is not None:
+            body = json.dumps(kwargs['json'])
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        body = body or b''
+        self.requests.append((method, path, body))
+
+        status_code, response_body, *headers = self.handler(method, path, body)
+
+        request = requests.PreparedRequest()
+        request.method = method
+        request.url = url
+        request.headers = CaseInsensitiveDict(kwargs.get('headers') or {})
+        request.body = body
+
+        response = requests.Response()
+        response.status_code = status_code
+        response.reason = _reason(status_code)
+        response.url = url
+        response.request = request
+        response._content = json.dumps(response_body).encode('utf-8') # pylint: disable=protected-access
+        response.headers['Content-Type'] = 'application/json'
+        response.headers.update(headers[0] if headers else {})
+        return response
+
+
+def _reason(status_code):
+    try:
+        return http.HTTPStatus(status_code).phrase
+    except ValueError:
+        # Statuses such as 521 are not in the standard library
+        return ""
@@ -0,0 +1,159 @@
+"""
+Module for memoizing the validation of sub-documents that repeat across orders.
+
+Addresses, shipping options, tax lines and extended attributes are often the
+same in thousands of orders. With the cache enabled, each distinct sub-document
+is validated once per process and its result is reused for every later order.
+"""
+import collections
+import copy
+import threading
+
+from api_toolkit.validate import RuleSet
+
+SUBDOCUMENT_CACHE_SIZE = 4096
+
+# The cache used by every MemoizedRuleSet, None while memoization is disabled
+_SUBDOCUMENT_CACHE = None
+
+
+def structural_key(value):
+    """
+    Return a hashable key that is equal for two values only if they are equal
+    and have the same types all the way down, so 1, 1.0 and True which
+    validate differently never share a key. Raises TypeError for values that
+    are not JSON types.
+    """
+    value_type = type(value)
+    if value_type is dict:
+        return (dict, tuple(sorted((key, structural_key(item)) for key, item in value.items())))
+    if value_type is list:
+        return (list, tuple(structural_key(item) for item in value))
+    if value_type in (str, int, float, bool) or value is None:
+        return (value_type, value)
+
+    raise TypeError(f"Can't build a structural key for {value_type.__name__}")
+
+
+class SubDocumentCache:
+    """
+    Bounded LRU cache of validation results, keyed by the ruleset name and
+    the structural key of the sub-document. Shared by every thread.
+    Args:
+        maxsize(int): (optional) Number of results kept. Default: 4096
+    """
+
+    def __init__(self, maxsize=SUBDOCUMENT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._results = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        Return the cached (valid, errors) for key, or None
+        """
+        with self._lock:
+            result = self._results.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._results.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def set(self, key, valid, errors):
+        """
+        Store the result of validating the sub-document of key
+        """
+        with self._lock:
+            self._results[key] = (valid, copy.deepcopy(errors))
+            self._results.move_to_end(key)
+            while len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Drop every cached result and reset the counters
+        """
+        with self._lock:
+            self._results.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """
+        Return the size, hit and miss counts and hit rate of the cache
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._results),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+class MemoizedRuleSet(RuleSet):
+    """
+    RuleSet for a sub-document that reuses the result of validating an equal
+    sub-document while the cache is enabled. Errors are copied out of the
+    cache, so they are identical to the errors of an uncached validation.
+    Args:
+        validation_dict(dict): Rules of the RuleSet
+        name(str): Name of the ruleset, part of the cache key
+    """
+
+    def __init__(self, validation_dict, name):
+        super().__init__(validation_dict)
+        self.name = name
+
+    def __bool__(self):
+        cache = _SUBDOCUMENT_CACHE
+        if cache is None:
+            return super().__bool__()
+
+        try:
+            key = (self.name, structural_key(getattr(self, 'test_dict', None)))
+        except TypeError:
+            return super().__bool__()
+
+        cached = cache.get(key)
+        if cached is not None:
+            valid, errors = cached
+            self.errors = copy.deepcopy(errors)
+            return valid
+
+        valid = super().__bool__()
+        cache.set(key, valid, self.errors)
+        return valid
+
+
+def enable_subdocument_cache(maxsize=SUBDOCUMENT_CACHE_SIZE):
+    """
+    Enable memoized sub-document validation in this process and return the
+    SubDocumentCache. Worker processes started before this have no cache.
+    """
+    global _SUBDOCUMENT_CACHE # pylint: disable=global-statement
+    _SUBDOCUMENT_CACHE = SubDocumentCache(maxsize)
+    return _SUBDOCUMENT_CACHE
+
+
+def disable_subdocument_cache():
+    """
+    Disable memoized sub-document validation and drop the cached results
+    """
+    global _SUBDOCUMENT_CACHE # pylint: disable=global-statement
+    _SUBDOCUMENT_CACHE = None
+
+
+def subdocument_cache():
+    """
+    Return the SubDocumentCache in use, or None if memoization is disabled
+    """
+    return _SUBDOCUMENT_CACHE
@@ -13,6 +13,15 @@ setup(
         'api_toolkit',
         'requests'
     ],
+    extras_require={
+        'async': ['httpx'],
+        'fast': ['orjson']
+    },
+    entry_points={
+        'console_scripts': [
+            'newstore-inject=newstore_connector.cli:inject'
+        ]
+    },
     dependency_links=[
         'git+https://github.com/kyleranous/api_toolkit.git@main#egg=api_toolkit'
     ]
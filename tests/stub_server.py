@@ -0,0 +1,74 @@
+"""
+Local stand-in for the NewStore API used by tests that need real HTTP calls
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubNewStoreServer:
+    """
+    Threaded HTTP server on a free local port. Responses are produced by
+    `handler(method, path, body)` which returns (status_code, json_body) or
+    (status_code, json_body, headers). 304 responses are sent without a body.
+    Every request is recorded in `requests` as (method, path, body), and its
+    headers in `request_headers`.
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.requests = []
+        self.request_headers = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._build_request_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        """
+        Base URL of the running server
+        """
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _build_request_handler(self):
+        stub = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            """
+            Dispatch every request to the stub handler
+            """
+            protocol_version = "HTTP/1.1"
+
+            def _respond(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                with stub._lock:
+                    stub.requests.append((self.command, self.path, body))
+                    stub.request_headers.append(dict(self.headers))
+
+                status_code, response_body, *headers = stub.handler(self.command, self.path, body)
+                data = b'' if status_code == 304 else json.dumps(response_body).encode('utf-8')
+                self.send_response(status_code)
+                self.send_header('Content-Type', 'application/json')
+                for name, value in (headers[0] if headers else {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PATCH = do_DELETE = _respond
+
+            def log_message(self, *args): # pylint: disable=arguments-differ
+                pass
+
+        return RequestHandler
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
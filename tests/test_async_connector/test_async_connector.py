@@ -0,0 +1,260 @@
+"""
+Test AsyncNewStoreConnector and the async API classes
+"""
+import os
+import json
+import asyncio
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+# pylint: disable=wrong-import-position
+from newstore_connector import AsyncNewStoreConnector
+from newstore_connector.instrumentation import MetricsCollector
+
+
+def _load_valid_payload():
+    fixtures_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                 'test_order_injection', 'fixtures')
+    with open(os.path.join(fixtures_path, "valid_order_payload.json"),
+              "r", encoding='utf-8') as file:
+        return json.load(file)
+
+
+def _mock_session(handler):
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def test_authenticate_fetches_token():
+    """
+    Test that authenticate fetches a token when one is not passed
+    """
+    def handler(request):
+        assert request.url.host == "id.p.newstore.net"
+        return httpx.Response(200, json={"access_token": "abc",
+                                         "expires_in": 300,
+                                         "scope": "iam:providers:read"})
+
+    async def run():
+        async with AsyncNewStoreConnector(tenant="test", client_id="id",
+                                          client_secret="secret",
+                                          session=_mock_session(handler)) as ns_conn:
+            return ns_conn.token, ns_conn.token_ttl
+
+    assert asyncio.run(run()) == ("abc", 300)
+
+
+def test_token_fetched_on_first_request():
+    """
+    Test that API classes created before authenticate() fetch the token on
+    their first request
+    """
+    def handler(request):
+        if request.url.host == "id.p.newstore.net":
+            return httpx.Response(200, json={"access_token": "abc",
+                                             "expires_in": 300,
+                                             "scope": "iam:providers:read"})
+        assert request.headers["Authorization"] == "Bearer abc"
+        return httpx.Response(200, json={"notes": []})
+
+    async def run():
+        ns_conn = AsyncNewStoreConnector(tenant="test", client_id="id", client_secret="secret",
+                                         session=_mock_session(handler))
+        notes = await ns_conn.order_notes.get_order_notes("order-uuid", return_json=True)
+        await ns_conn.aclose()
+        return notes
+
+    assert asyncio.run(run()) == {"notes": []}
+
+
+def test_async_create_order():
+    """
+    Test that create_order validates and posts the payload
+    """
+    def handler(request):
+        assert request.url.path.endswith("/v0/d/fulfill_order")
+        assert request.headers["Authorization"] == "Bearer token"
+        return httpx.Response(200, json={"id": "order-uuid"})
+
+    async def run():
+        async with AsyncNewStoreConnector(tenant="test", token="token",
+                                          session=_mock_session(handler)) as ns_conn:
+            return await ns_conn.order_injection.create_order(payload=_load_valid_payload(),
+                                                              return_json=True)
+
+    assert asyncio.run(run()) == {"id": "order-uuid"}
+
+
+def test_async_create_order_invalid_payload():
+    """
+    Test that an invalid payload raises ValueError before anything is sent
+    """
+    payload = _load_valid_payload()
+    del payload['shipments']
+
+    async def run():
+        async with AsyncNewStoreConnector(tenant="test", token="token",
+                                          session=_mock_session(lambda request: None)) as ns_conn:
+            await ns_conn.order_injection.create_order(payload=payload)
+
+    with pytest.raises(ValueError):
+        asyncio.run(run())
+
+
+def test_async_create_orders():
+    """
+    Test that create_orders yields a result for every order
+    """
+    def handler(request):
+        external_id = json.loads(request.content)["external_id"]
+        if external_id == "order-1":
+            return httpx.Response(400, json={"message": "rejected"})
+        return httpx.Response(200, json={"id": external_id})
+
+    orders = []
+    for i in range(5):
+        order = _load_valid_payload()
+        order['external_id'] = f"order-{i}"
+        orders.append(order)
+
+    async def run():
+        async with AsyncNewStoreConnector(tenant="test", token="token",
+                                          session=_mock_session(handler)) as ns_conn:
+            results = ns_conn.order_injection.create_orders(orders, max_in_flight=2)
+            return [result async for result in results], results.stats
+
+    results, stats = asyncio.run(run())
+    by_external_id = {result['external_id']: result for result in results}
+
+    assert len(by_external_id) == 5
+    assert by_external_id['order-1']['error']['status_code'] == 400
+    assert stats.succeeded == 4
+    assert stats.failed == 1
+
+
+def test_async_order_notes_retry():
+    """
+    Test that statuses in status_forcelist are retried up to max_retries
+    """
+    attempts = []
+
+    def handler(request):
+        attempts.append(request)
+        if len(attempts) < 3:
+            return httpx.Response(503, json={})
+        return httpx.Response(200, json={"notes": []})
+
+    async def run():
+        async with AsyncNewStoreConnector(tenant="test", token="token", max_retries=3,
+                                          backoff_factor=0,
+                                          session=_mock_session(handler)) as ns_conn:
+            return await ns_conn.order_notes.get_order_notes("order-uuid", return_json=True)
+
+    assert asyncio.run(run()) == {"notes": []}
+    assert len(attempts) == 3
+
+
+def test_async_metrics_record_retries():
+    """
+    Test that the hooks of the connector record async requests and retries
+    """
+    attempts = []
+
+    def handler(request):
+        attempts.append(request)
+        if len(attempts) < 2:
+            return httpx.Response(503, json={})
+        return httpx.Response(200, json={"notes": []})
+
+    metrics = MetricsCollector()
+
+    async def run():
+        async with AsyncNewStoreConnector(tenant="test", token="token", max_retries=3,
+                                          backoff_factor=0, hooks=[metrics],
+                                          session=_mock_session(handler)) as ns_conn:
+            await ns_conn.order_notes.get_order_notes("order-uuid")
+
+    asyncio.run(run())
+    get_order_notes = metrics.as_dict()["get_order_notes"]
+    assert get_order_notes["retries"] == {503: 1}
+    assert get_order_notes["status_codes"] == {200: 1}
+    assert get_order_notes["duration"]["count"] == 1
+
+
+def test_async_item_note_payload():
+    """
+    Test that item notes send the note text
+    """
+    sent = []
+
+    def handler(request):
+        sent.append(json.loads(request.content))
+        return httpx.Response(201, json={})
+
+    async def run():
+        async with AsyncNewStoreConnector(tenant="test", token="token",
+                                          session=_mock_session(handler)) as ns_conn:
+            await ns_conn.order_notes.create_item_note("order-uuid", "item-uuid",
+                                                       text="Note", tags=["a"])
+
+    asyncio.run(run())
+    assert sent[0]["text"] == "Note"
+
+
+def test_async_get_notes_for_orders():
+    """
+    Test that notes of many orders are yielded with their errors as they complete
+    """
+    def handler(request):
+        order_uuid = request.url.path.split("/")[4]
+        if order_uuid == "order-1":
+            return httpx.Response(404, json={"message": "not found"})
+        return httpx.Response(200, json={"notes": [{"text": order_uuid}]})
+
+    async def run():
+        async with AsyncNewStoreConnector(tenant="test", token="token",
+                                          session=_mock_session(handler)) as ns_conn:
+            return {order_uuid: notes async for order_uuid, notes in
+                    ns_conn.order_notes.get_notes_for_orders(
+                        [f"order-{i}" for i in range(5)], max_in_flight=2)}
+
+    results = asyncio.run(run())
+    assert isinstance(results.pop("order-1"), httpx.HTTPStatusError)
+    assert results == {f"order-{i}": {"notes": [{"text": f"order-{i}"}]} for i in (0, 2, 3, 4)}
+
+
+def test_async_requests_go_through_the_transport():
+    """
+    Test that the token and module requests are sent with the transport, with
+    and without a deadline
+    """
+    def handler(request):
+        if request.url.host == "id.p.newstore.net":
+            return httpx.Response(200, json={"access_token": "abc",
+                                             "expires_in": 300,
+                                             "scope": "iam:providers:read"})
+        return httpx.Response(200, json={"notes": []})
+
+    client = _mock_session(handler)
+    sent = []
+
+    class RecordingTransport: # pylint: disable=too-few-public-methods
+        """
+        Async transport recording the requests it sends
+        """
+        async def request(self, method, url, **kwargs):
+            sent.append((method, httpx.URL(url).host))
+            return await client.request(method, url, **kwargs)
+
+    async def run():
+        async with AsyncNewStoreConnector(tenant="test", client_id="id", client_secret="secret",
+                                          session=_mock_session(handler),
+                                          transport=RecordingTransport()) as ns_conn:
+            await ns_conn.order_notes.get_order_notes("order-uuid")
+            await ns_conn.order_notes.get_order_notes("order-uuid", deadline=5)
+        await client.aclose()
+
+    asyncio.run(run())
+    assert sent == [("POST", "id.p.newstore.net"), ("GET", "test.p.newstore.net"),
+                    ("GET", "test.p.newstore.net")]
@@ -0,0 +1,46 @@
+"""
+Test the mock NewStore server and the regression check of the connector benchmark
+"""
+from benchmarks.bench_connector import compare, measure, build_operation
+from benchmarks.mock_server import MockNewStoreServer, MockServerConnector
+
+
+def test_mock_server_serves_connector_operations():
+    """
+    Test that the token, create_order and notes operations succeed against the mock server
+    """
+    with MockNewStoreServer() as server:
+        ns_conn = MockServerConnector(server)
+        for scenario in ('token', 'create_order', 'notes'):
+            result = measure(build_operation(scenario, ns_conn), 10, 2)
+            assert result["errors"] == 0, scenario
+
+    assert set(server.counts) == {200, 201}
+
+
+def test_mock_server_injects_errors_and_throttling():
+    """
+    Test that the configured share of requests is answered with 429 and 500
+    """
+    with MockNewStoreServer(error_rate=0.25, throttle_rate=0.25, retry_after=0,
+                            seed=1) as server:
+        ns_conn = MockServerConnector(server)
+        server.reset_counts()
+        result = measure(build_operation('notes', ns_conn), 200, 4)
+
+    assert 20 < server.counts[429] < 80
+    assert 20 < server.counts[500] < 80
+    assert result["errors"] == server.counts[429] + server.counts[500]
+
+
+def test_compare_reports_regressions_beyond_threshold():
+    """
+    Test that only results worse than the baselines by more than the threshold are reported
+    """
+    baselines = {"create_order@8": {"per_second": 100, "p99_ms": 10, "peak_memory_kb": 500}}
+    within = {"create_order@8": {"per_second": 85, "p99_ms": 11.5, "peak_memory_kb": 590}}
+    slower = {"create_order@8": {"per_second": 70, "p99_ms": 13, "peak_memory_kb": 500}}
+
+    assert not compare(within, baselines, threshold=0.2)
+    assert len(compare(slower, baselines, threshold=0.2)) == 2
+    assert not compare({"notes@8": slower["create_order@8"]}, baselines)
@@ -0,0 +1,43 @@
+"""
+Test the startup benchmark and its regression check
+"""
+from benchmarks.bench_startup import compare, measure_first_call, measure_import
+from benchmarks.mock_server import MockNewStoreServer
+
+
+def test_measure_first_call_sends_one_token_and_one_order_per_connector():
+    """
+    Test that every connector is timed from its own token request to its first call
+    """
+    with MockNewStoreServer() as server:
+        server.reset_counts()
+        measure_first_call(server, "lazy", 2)
+        lazy_counts = dict(server.counts)
+        result = measure_first_call(server, "eager", 1)
+
+    assert lazy_counts == {200: 4}
+    assert set(result) == {"construct_ms", "first_call_ms", "total_ms"}
+
+
+def test_measure_import_lists_heavy_modules():
+    """
+    Test that imports are timed in a fresh interpreter
+    """
+    result = measure_import("import json", 1)
+
+    assert result["median_ms"] >= 0
+    assert result["loaded"] == []
+
+
+def test_compare_reports_slower_startup_and_new_modules():
+    """
+    Test that times beyond the threshold and newly loaded modules are reported
+    """
+    baselines = {"startup:import:validation": {"median_ms": 40, "loaded": []},
+                 "startup:lazy": {"construct_ms": 1, "first_call_ms": 10, "total_ms": 11}}
+    within = {"startup:import:validation": {"median_ms": 45, "loaded": []},
+              "startup:lazy": {"construct_ms": 1.1, "first_call_ms": 11, "total_ms": 12}}
+    worse = {"startup:import:validation": {"median_ms": 60, "loaded": ["requests"]}}
+
+    assert not compare(within, baselines, threshold=0.2)
+    assert len(compare(worse, baselines, threshold=0.2)) == 2
@@ -0,0 +1,36 @@
+"""
+Test replaying recorded traffic against the mock server
+"""
+from benchmarks.mock_server import MockNewStoreServer, MockServerConnector
+from benchmarks.replay import replay
+from newstore_connector.recorder import TrafficRecorder, load_traffic
+
+
+def test_recorded_traffic_is_replayed(tmp_path):
+    """
+    Test that recorded notes calls are replayed with the same endpoints and
+    statuses, and reported per endpoint
+    """
+    path = str(tmp_path / "traffic.ndjson.gz")
+    with MockNewStoreServer() as server:
+        with TrafficRecorder(path) as recorder:
+            ns_conn = MockServerConnector(server, hooks=[recorder])
+            for i in range(5):
+                ns_conn.order_notes.get_order_notes(f"order-{i}")
+                ns_conn.order_notes.create_item_note(f"order-{i}", "item-1", text="Packed",
+                                                     source="warehouse", tags=["t"])
+            ns_conn.order_notes.delete_note("order-0", "note-1")
+
+        records = load_traffic(path)
+        ns_conn = MockServerConnector(server)
+        server.reset_counts()
+        report = replay(records + [{"start": 1, "endpoint": "unknown"}],
+                        ns_conn, speed=0, concurrency=4)
+
+    assert report["calls"] == 11
+    assert report["skipped"] == 1
+    assert report["statuses"] == {"200": 6, "201": 5}
+    assert server.counts == {200: 6, 201: 5}
+    assert set(report["endpoints"]) == {"get_order_notes", "create_item_note", "delete_note"}
+    assert report["endpoints"]["get_order_notes"]["calls"] == 5
+    assert report["p99_ms"] >= report["p50_ms"] > 0
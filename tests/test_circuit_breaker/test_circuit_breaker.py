@@ -0,0 +1,96 @@
+"""
+Test the CircuitBreaker
+"""
+import time
+
+import pytest
+import requests
+
+from newstore_connector.bulk import error_details
+from newstore_connector.circuit_breaker import CircuitBreaker, CircuitPolicy, CircuitOpenError
+from newstore_connector.order_notes import OrderNotesV010
+from tests.stub_server import StubNewStoreServer
+
+
+def _send(breaker, endpoint, status_code):
+    with breaker.guard(endpoint) as circuit:
+        circuit.record(status_code)
+
+
+def test_circuit_opens_at_failure_rate():
+    """
+    Test that the circuit opens once enough requests failed, and only for
+    the failing endpoint
+    """
+    breaker = CircuitBreaker(CircuitPolicy(failure_rate=0.5, min_requests=4))
+
+    for status_code in (200, 500, 200):
+        _send(breaker, "get_order_notes", status_code)
+    assert breaker.state("get_order_notes") == "closed"
+
+    _send(breaker, "get_order_notes", 503)
+    assert breaker.state("get_order_notes") == "open"
+    with pytest.raises(CircuitOpenError) as error:
+        _send(breaker, "get_order_notes", 200)
+
+    _send(breaker, "create_order", 200)
+    assert error.value.endpoint == "get_order_notes"
+    assert breaker.stats()["get_order_notes"]["rejected"] == 1
+    assert breaker.state("create_order") == "closed"
+
+
+def test_exceptions_count_as_failures():
+    """
+    Test that requests raising count as failed
+    """
+    breaker = CircuitBreaker(CircuitPolicy(failure_rate=1, min_requests=2))
+
+    for _ in range(2):
+        with pytest.raises(requests.ConnectionError):
+            with breaker.guard("create_order"):
+                raise requests.ConnectionError()
+
+    assert breaker.state("create_order") == "open"
+
+
+def test_half_open_probe_closes_or_reopens():
+    """
+    Test that after reset_timeout one probe is let through, and its outcome
+    closes or opens the circuit
+    """
+    breaker = CircuitBreaker(CircuitPolicy(failure_rate=1, min_requests=1, reset_timeout=0.1))
+    _send(breaker, "get_order_notes", 500)
+    time.sleep(0.15)
+    assert breaker.state("get_order_notes") == "half_open"
+
+    with breaker.guard("get_order_notes") as circuit:
+        # Only one probe at a time
+        with pytest.raises(CircuitOpenError):
+            _send(breaker, "get_order_notes", 200)
+        circuit.record(500)
+    assert breaker.state("get_order_notes") == "open"
+
+    time.sleep(0.15)
+    _send(breaker, "get_order_notes", 200)
+    assert breaker.state("get_order_notes") == "closed"
+    assert breaker.stats()["get_order_notes"]["probed"] == 2
+
+
+def test_open_circuit_stops_retries():
+    """
+    Test that API classes stop retrying once the circuit opens
+    """
+    def handler(method, path, body): # pylint: disable=unused-argument
+        return 503, {}
+
+    breaker = CircuitBreaker(CircuitPolicy(failure_rate=1, min_requests=3))
+    with StubNewStoreServer(handler) as server:
+        order_notes = OrderNotesV010(base_url=server.base_url, session=requests.Session(),
+                                     headers={}, circuit_breaker=breaker, max_retries=10,
+                                     status_forcelist=[503])
+        with pytest.raises(CircuitOpenError) as error:
+            order_notes.get_order_notes("order-uuid")
+
+        assert len(server.requests) == 3
+
+    assert error_details(error.value)["type"] == "circuit_open"
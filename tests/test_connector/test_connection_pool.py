@@ -0,0 +1,68 @@
+"""
+Test connection pool sizing and thread safety of NewStoreConnector
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from newstore_connector import NewStoreConnector
+from tests.stub_server import StubNewStoreServer
+
+
+def _ok_handler(method, path, body): # pylint: disable=unused-argument
+    return 200, {"ok": True}
+
+
+def test_pool_options_are_applied_and_retries_kept():
+    """
+    Test that the mounted adapters use the pool options and keep the retry
+    settings, leaving connection and read errors to the API classes
+    """
+    ns_conn = NewStoreConnector(tenant="test", token="token", max_retries=3,
+                                pool_connections=4, pool_maxsize=32, pool_block=True)
+
+    for prefix in ("http://", "https://"):
+        adapter = ns_conn.session.get_adapter(prefix)
+        assert adapter._pool_connections == 4 # pylint: disable=protected-access
+        assert adapter._pool_maxsize == 32 # pylint: disable=protected-access
+        assert adapter._pool_block is True # pylint: disable=protected-access
+        assert adapter.max_retries.total == 3
+        assert adapter.max_retries.connect == 0
+        assert adapter.max_retries.read == 0
+
+
+def test_connections_are_reused_across_threads():
+    """
+    Test that requests from many threads reuse pooled connections
+    """
+    ns_conn = NewStoreConnector(tenant="test", token="token", pool_maxsize=8)
+
+    with StubNewStoreServer(_ok_handler) as server:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            responses = list(executor.map(
+                lambda _: ns_conn.session.get(f"{server.base_url}/ping"), range(80)))
+
+    stats = ns_conn.connection_stats()
+    assert all(response.status_code == 200 for response in responses)
+    assert stats["pools"] == 1
+    assert stats["requests"] == 80
+    assert stats["connections_opened"] <= 8
+    assert stats["connections_reused"] == 80 - stats["connections_opened"]
+
+
+def test_api_classes_are_created_once_across_threads():
+    """
+    Test that concurrent first use of an API class property creates one instance
+    """
+    ns_conn = NewStoreConnector(tenant="test", token="token")
+    barrier = threading.Barrier(8)
+
+    def get_order_notes(_):
+        barrier.wait()
+        return ns_conn.order_notes
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        instances = list(executor.map(get_order_notes, range(8)))
+
+    assert len({id(instance) for instance in instances}) == 1
+    assert instances[0].session is ns_conn.session
+    assert instances[0].headers == {'Authorization': 'Bearer token'}
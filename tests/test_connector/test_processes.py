@@ -0,0 +1,181 @@
+"""
+Test using NewStoreConnector across processes: fork, pickle and warm up
+"""
+import json
+import os
+import pickle
+import select
+
+import pytest
+
+from newstore_connector import NewStoreConnector
+from newstore_connector.circuit_breaker import CircuitBreaker
+from newstore_connector.instrumentation import MetricsCollector
+from newstore_connector.journal import OrderJournal
+from newstore_connector.order_notes.notes_cache import NotesCache
+from newstore_connector.rate_limiter import AdaptiveRateLimiter, RateLimit
+from newstore_connector.transports import InMemoryTransport
+from tests.stub_server import StubNewStoreServer
+
+
+def _ok_handler(method, path, body): # pylint: disable=unused-argument
+    return 200, {"notes": []}
+
+
+def _auth_handler(method, path, body): # pylint: disable=unused-argument
+    return 200, {"access_token": "abc", "expires_in": 300, "scope": "iam:providers:read"}
+
+
+def _stub_connector(server, **kwargs):
+    ns_conn = NewStoreConnector(tenant="test", token="token", **kwargs)
+    ns_conn._base_url = f"{server.base_url}/" # pylint: disable=protected-access
+    return ns_conn
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="Requires os.fork")
+def test_forked_child_gets_its_own_connections():
+    """
+    Test that a child forked with open connections does not reuse them, and
+    that API classes created before the fork keep working
+    """
+    with StubNewStoreServer(_ok_handler) as server:
+        ns_conn = _stub_connector(server)
+        order_notes = ns_conn.order_notes
+        order_notes.get_order_notes("A")
+        parent_adapter = ns_conn.session.get_adapter(server.base_url)
+
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0: # pragma: no cover
+            try:
+                adapter = ns_conn.session.get_adapter(server.base_url)
+                result = {
+                    "new_adapter": adapter is not parent_adapter,
+                    "status": order_notes.get_order_notes("B").status_code,
+                    "stats": ns_conn.connection_stats()
+                }
+                os.write(write_fd, json.dumps(result).encode('utf-8'))
+            finally:
+                os._exit(0) # pylint: disable=protected-access
+
+        os.close(write_fd)
+        with os.fdopen(read_fd) as pipe:
+            result = json.loads(pipe.read())
+        os.waitpid(pid, 0)
+
+        assert order_notes.get_order_notes("C").status_code == 200
+
+    assert result["new_adapter"] is True
+    assert result["status"] == 200
+    assert result["stats"]["connections_opened"] == 1
+    assert ns_conn.connection_stats()["connections_opened"] == 1
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="Requires os.fork")
+def test_forked_child_gets_new_locks(tmp_path):
+    """
+    Test that a child forked while threads of the parent hold the locks of
+    the shared rate limiter, circuit breaker, metrics, notes cache and
+    journal can still use them
+    """
+    # pylint: disable=protected-access
+    metrics = MetricsCollector()
+    ns_conn = NewStoreConnector(tenant="test", token="token",
+                                transport=InMemoryTransport(_ok_handler),
+                                rate_limiter=AdaptiveRateLimiter(RateLimit(rate=1000)),
+                                circuit_breaker=CircuitBreaker(), hooks=[metrics],
+                                notes_cache=NotesCache(),
+                                journal=OrderJournal(str(tmp_path / "journal.db")))
+    ns_conn.order_notes.get_order_notes("A")
+    locks = [ns_conn.rate_limiter._default_bucket._lock, ns_conn.circuit_breaker._lock,
+             ns_conn.circuit_breaker._circuits["get_order_notes"]._lock, metrics._lock,
+             ns_conn.notes_cache._lock, ns_conn.journal._lock]
+
+    read_fd, write_fd = os.pipe()
+    for lock in locks:
+        lock.acquire()
+    try:
+        pid = os.fork()
+        if pid == 0: # pragma: no cover
+            try:
+                ns_conn.notes_cache.invalidate("A")
+                result = {
+                    "status": ns_conn.order_notes.get_order_notes("A").status_code,
+                    "requests": sum(metrics.statuses.values()),
+                    "journal": ns_conn.journal.counts()
+                }
+                ns_conn.circuit_breaker.reset()
+                os.write(write_fd, json.dumps(result).encode('utf-8'))
+            finally:
+                os._exit(0)
+    finally:
+        for lock in locks:
+            lock.release()
+
+    os.close(write_fd)
+    ready, _, _ = select.select([read_fd], [], [], 10)
+    if not ready: # pragma: no cover
+        os.kill(pid, 9)
+    with os.fdopen(read_fd) as pipe:
+        output = pipe.read()
+    os.waitpid(pid, 0)
+    ns_conn.journal.close()
+
+    assert ready, "The child process is deadlocked on a lock of its parent"
+    result = json.loads(output)
+    assert result["status"] == 200
+    assert result["requests"] == 2
+    assert result["journal"] == {"in_flight": 0, "succeeded": 0, "failed": 0}
+
+
+def test_pickled_connector_keeps_settings_and_token():
+    """
+    Test that an unpickled connector uses the still valid token without
+    authenticating, and keeps refreshing it
+    """
+    transport = InMemoryTransport(_auth_handler)
+    ns_conn = NewStoreConnector(tenant="test", client_id="id", client_secret="secret",
+                                transport=transport, max_retries=2, deadline=5,
+                                pool_maxsize=4)
+
+    copy = pickle.loads(pickle.dumps(ns_conn))
+
+    assert copy.token == "abc"
+    assert copy.token_manager.refresh_count == 0
+    assert abs(copy.token_manager.expires_at - ns_conn.token_manager.expires_at) < 1
+    assert copy.client_secret == "secret"
+    assert copy.max_retries == 2
+    assert copy.deadline == 5
+    assert copy.transport is copy.session
+    assert copy.order_notes.session is copy.session
+
+
+def test_pickled_external_token_is_kept():
+    """
+    Test that a token passed to the connector is carried by pickle
+    """
+    ns_conn = NewStoreConnector(tenant="test", token="token", hooks=[object()])
+    ns_conn.token = "rotated"
+
+    copy = pickle.loads(pickle.dumps(ns_conn))
+
+    assert copy.token == "rotated"
+    assert copy.hooks == []
+
+
+def test_warm_up_opens_pooled_connections():
+    """
+    Test that warm up opens connections that the first requests reuse
+    """
+    with StubNewStoreServer(_ok_handler) as server:
+        ns_conn = _stub_connector(server, pool_maxsize=3)
+
+        assert ns_conn.warm_up(connections=5) == 3
+        assert ns_conn.connection_stats()["idle_connections"] == 3
+        ns_conn.warm_up(connections=2, background=True).join()
+        for order_uuid in ("A", "B", "C"):
+            ns_conn.order_notes.get_order_notes(order_uuid)
+
+    stats = ns_conn.connection_stats()
+    assert stats["connections_opened"] == 3
+    assert stats["requests"] == 3
@@ -0,0 +1,127 @@
+"""
+Test the startup of NewStoreConnector: lazy authentication and deferred imports
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+import requests
+
+from newstore_connector import NewStoreConnector
+from newstore_connector.transports import InMemoryTransport
+
+
+def _handler(auth_status=200):
+    def handler(method, path, body): # pylint: disable=unused-argument
+        if path.endswith("/openid-connect/token"):
+            return auth_status, {"access_token": "abc", "expires_in": 300,
+                                 "scope": "iam:providers:read"}
+        return 200, {"notes": []}
+    return handler
+
+
+def _auth_requests(transport):
+    return [path for _, path, _ in transport.requests if path.endswith("/openid-connect/token")]
+
+
+def test_lazy_connector_authenticates_on_first_request():
+    """
+    Test that a lazy connector sends no token request until its first API call
+    """
+    transport = InMemoryTransport(_handler())
+    ns_conn = NewStoreConnector(tenant="test", client_id="id", client_secret="secret",
+                                transport=transport, auth_mode="lazy")
+
+    assert not transport.requests
+    ns_conn.order_notes.get_order_notes("A")
+    ns_conn.order_notes.get_order_notes("B")
+
+    assert len(_auth_requests(transport)) == 1
+    assert len(transport.requests) == 3
+    assert ns_conn.token_manager.token == "abc"
+
+
+def test_background_connector_authenticates_after_construction():
+    """
+    Test that a background connector fetches the token in its auth thread,
+    and that a failed fetch is left to the first request
+    """
+    transport = InMemoryTransport(_handler())
+    ns_conn = NewStoreConnector(tenant="test", client_id="id", client_secret="secret",
+                                transport=transport, auth_mode="background")
+    ns_conn.auth_thread.join()
+
+    assert ns_conn.token_manager.token == "abc"
+    ns_conn.order_notes.get_order_notes("A")
+    assert len(_auth_requests(transport)) == 1
+
+    failing = InMemoryTransport(_handler(auth_status=401))
+    ns_conn = NewStoreConnector(tenant="test", client_id="id", client_secret="secret",
+                                transport=failing, auth_mode="background")
+    ns_conn.auth_thread.join()
+
+    with pytest.raises(requests.HTTPError):
+        ns_conn.order_notes.get_order_notes("A")
+    assert len(_auth_requests(failing)) == 2
+
+
+@pytest.mark.parametrize("failure", ["connection", 503])
+def test_failed_token_request_is_retried(failure):
+    """
+    Test that a token request failing with a connection error or a status in
+    status_forcelist is sent again, up to max_retries times
+    """
+    attempts = []
+
+    def handler(method, path, body):
+        if path.endswith("/openid-connect/token"):
+            attempts.append(path)
+            if len(attempts) == 1:
+                if failure == "connection":
+                    raise requests.ConnectionError("connection dropped")
+                return failure, {"message": "unavailable"}
+        return _handler()(method, path, body)
+
+    transport = InMemoryTransport(handler)
+    ns_conn = NewStoreConnector(tenant="test", client_id="id", client_secret="secret",
+                                transport=transport, max_retries=2, backoff_factor=0)
+
+    assert ns_conn.token_manager.token == "abc"
+    assert len(attempts) == 2
+
+    attempts.clear()
+    with pytest.raises((requests.ConnectionError, requests.HTTPError)):
+        NewStoreConnector(tenant="test", client_id="id", client_secret="secret",
+                          transport=transport, backoff_factor=0)
+    assert len(attempts) == 1
+
+
+def test_invalid_auth_mode_is_rejected():
+    """
+    Test that an unknown auth_mode raises before anything is sent
+    """
+    with pytest.raises(ValueError) as error:
+        NewStoreConnector(tenant="test", token="token", auth_mode="later")
+
+    assert "auth_mode" in error.value.args[0]
+
+
+def test_validation_import_does_not_load_http_clients():
+    """
+    Test that the validation API class can be imported and used without
+    loading the HTTP clients
+    """
+    script = (
+        "import json, sys\n"
+        "from newstore_connector.order_injection import OrderInjectionV01\n"
+        "OrderInjectionV01().validate_create_order_payload({}, fail_fast=True)\n"
+        "print(json.dumps([name for name in ('requests', 'urllib3', 'httpx', "
+        "'api_toolkit.connector') if name in sys.modules]))\n"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    output = subprocess.run([sys.executable, "-c", script], cwd=root, check=True,
+                            capture_output=True, text=True).stdout
+
+    assert json.loads(output) == []
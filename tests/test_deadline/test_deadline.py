@@ -0,0 +1,176 @@
+"""
+Test the deadline budgets of API calls
+"""
+import threading
+import time
+
+import pytest
+import requests
+
+from newstore_connector.bulk import error_details
+from newstore_connector.deadline import Deadline, DeadlineExceeded
+from newstore_connector.order_notes import OrderNotesV010
+from newstore_connector.rate_limiter import AdaptiveRateLimiter, RateLimit
+from newstore_connector.token_manager import TokenManager
+from newstore_connector.transports import InMemoryTransport
+from tests.stub_server import StubNewStoreServer
+
+
+def _order_notes(server, **kwargs):
+    return OrderNotesV010(base_url=server.base_url, session=requests.Session(),
+                          headers={}, **kwargs)
+
+
+def test_retries_stop_when_backoff_exceeds_deadline():
+    """
+    Test that retries are not attempted once their backoff would not fit
+    """
+    def handler(method, path, body): # pylint: disable=unused-argument
+        return 503, {}
+
+    with StubNewStoreServer(handler) as server:
+        order_notes = _order_notes(server, max_retries=10, backoff_factor=0.2,
+                                   status_forcelist=[503])
+        start = time.monotonic()
+        with pytest.raises(DeadlineExceeded) as error:
+            order_notes.get_order_notes("order-uuid", deadline=1)
+
+        assert time.monotonic() - start < 1
+        assert 1 < len(server.requests) < 10
+
+    assert error.value.phase == "backoff"
+    assert error.value.budget == 1
+    assert set(error.value.phases) == {"request", "backoff"}
+
+
+def test_retries_use_the_default_deadline():
+    """
+    Test that the deadline of the API class bounds calls given none
+    """
+    def handler(method, path, body): # pylint: disable=unused-argument
+        return 503, {}
+
+    with StubNewStoreServer(handler) as server:
+        order_notes = _order_notes(server, max_retries=10, backoff_factor=0.2,
+                                   status_forcelist=[503], deadline=0.5)
+        with pytest.raises(DeadlineExceeded):
+            order_notes.get_order_notes("order-uuid")
+
+
+def test_connection_errors_are_retried_within_deadline():
+    """
+    Test that connection errors are retried by the API class, and stop once
+    the backoff would not fit in the deadline
+    """
+    def handler(method, path, body): # pylint: disable=unused-argument
+        raise requests.ConnectTimeout("connect timed out")
+
+    transport = InMemoryTransport(handler)
+    order_notes = OrderNotesV010(base_url="http://newstore.test", transport=transport,
+                                 headers={}, max_retries=10, backoff_factor=0.2)
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded) as error:
+        order_notes.create_order_note("order-uuid", text="note", deadline=1)
+
+    assert time.monotonic() - start < 1
+    assert 1 < len(transport.requests) < 10
+    assert error.value.phase == "backoff"
+
+
+def test_read_errors_are_only_retried_for_idempotent_methods():
+    """
+    Test that a read timeout is retried for GET, and not for POST which
+    NewStore may have processed
+    """
+    def handler(method, path, body): # pylint: disable=unused-argument
+        raise requests.ReadTimeout("read timed out")
+
+    transport = InMemoryTransport(handler)
+    order_notes = OrderNotesV010(base_url="http://newstore.test", transport=transport,
+                                 headers={}, max_retries=2)
+    with pytest.raises(requests.ReadTimeout):
+        order_notes.get_order_notes("order-uuid")
+    assert len(transport.requests) == 3
+
+    transport.requests.clear()
+    with pytest.raises(requests.ReadTimeout):
+        order_notes.create_order_note("order-uuid", text="note")
+    assert len(transport.requests) == 1
+
+
+def test_slow_response_exceeds_deadline():
+    """
+    Test that the request timeout is capped by the time left
+    """
+    def handler(method, path, body): # pylint: disable=unused-argument
+        time.sleep(1)
+        return 200, {"notes": []}
+
+    with StubNewStoreServer(handler) as server:
+        order_notes = _order_notes(server)
+        start = time.monotonic()
+        with pytest.raises(DeadlineExceeded) as error:
+            order_notes.get_order_notes("order-uuid", deadline=0.3)
+
+    assert time.monotonic() - start < 0.9
+    assert error.value.phase == "request"
+    assert error_details(error.value)["type"] == "deadline"
+    assert error_details(error.value)["phase"] == "request"
+
+
+def test_rate_limiter_wait_exceeds_deadline():
+    """
+    Test that a request is not sent when its rate limiter wait would not fit
+    """
+    def handler(method, path, body): # pylint: disable=unused-argument
+        return 200, {"notes": []}
+
+    limiter = AdaptiveRateLimiter(RateLimit(rate=1, burst=1, increase=0))
+    with StubNewStoreServer(handler) as server:
+        order_notes = _order_notes(server, rate_limiter=limiter)
+        order_notes.get_order_notes("order-uuid", deadline=0.5)
+        with pytest.raises(DeadlineExceeded) as error:
+            order_notes.get_order_notes("order-uuid", deadline=0.5)
+
+        assert len(server.requests) == 1
+
+    assert error.value.phase == "rate_limit"
+
+
+def test_waiting_for_token_refresh_exceeds_deadline():
+    """
+    Test that waiting for another thread's token fetch is bounded by the deadline
+    """
+    fetching = threading.Event()
+
+    def fetch_token(deadline=None): # pylint: disable=unused-argument
+        fetching.set()
+        time.sleep(0.5)
+        return "token", 300
+
+    token_manager = TokenManager(fetch_token)
+    thread = threading.Thread(target=token_manager.get_token)
+    thread.start()
+    fetching.wait()
+
+    with pytest.raises(DeadlineExceeded) as error:
+        token_manager.get_token(Deadline(0.1))
+    thread.join()
+
+    assert error.value.phase == "token"
+    assert token_manager.get_token(Deadline(0.1)) == "token"
+
+
+def test_deadline_records_phases():
+    """
+    Test that the time of each phase is reported in the error
+    """
+    deadline = Deadline(0.05)
+    with deadline.phase("request"):
+        time.sleep(0.06)
+
+    with pytest.raises(DeadlineExceeded) as error:
+        deadline.check("backoff")
+
+    assert error.value.phases["request"] >= 0.05
+    assert "request" in str(error.value)
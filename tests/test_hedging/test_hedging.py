@@ -0,0 +1,115 @@
+"""
+Test hedged requests
+"""
+import threading
+import time
+
+import requests
+
+from newstore_connector.hedging import Hedger
+from newstore_connector.order_notes import OrderNotesV010
+from tests.stub_server import StubNewStoreServer
+
+
+def test_delay_follows_percentile():
+    """
+    Test that the hedge delay is the percentile of recent latencies, within
+    min_delay and max_delay
+    """
+    hedger = Hedger(percentile=95, min_samples=10, min_delay=0.01, max_delay=1)
+    assert hedger.delay("get_order_notes") == 1
+
+    for latency in range(100):
+        hedger.record("get_order_notes", latency / 1000)
+
+    assert hedger.delay("get_order_notes") == 0.095
+    hedger.record("get_order_notes", 5)
+    assert hedger.delay("get_order_notes") <= 1
+
+
+def test_fast_requests_are_not_hedged():
+    """
+    Test that requests answering before the delay are sent once, from the
+    calling thread
+    """
+    calls = []
+    hedger = Hedger(max_delay=0.5, max_hedge_ratio=1)
+
+    def func():
+        calls.append(threading.get_ident())
+        return "ok"
+
+    assert hedger.run("get_order_notes", func) == "ok"
+    assert calls == [threading.get_ident()]
+    assert hedger.stats()["hedged"] == 0
+    assert hedger._executor is None # pylint: disable=protected-access
+    hedger.close()
+
+
+def test_slow_request_is_hedged():
+    """
+    Test that a second request is sent when the first is slow, and its
+    response is returned when the first runs out of the deadline
+    """
+    lock = threading.Lock()
+    calls = []
+
+    def handler(method, path, body): # pylint: disable=unused-argument
+        with lock:
+            calls.append(path)
+            first = len(calls) == 1
+        if first:
+            time.sleep(1)
+        return 200, {"notes": [{"text": "slow" if first else "fast"}]}
+
+    hedger = Hedger(max_delay=0.1, max_hedge_ratio=1)
+    with StubNewStoreServer(handler) as server:
+        order_notes = OrderNotesV010(base_url=server.base_url, session=requests.Session(),
+                                     headers={}, hedger=hedger)
+        start = time.monotonic()
+        notes = order_notes.get_order_notes("order-uuid", return_json=True, deadline=0.5)
+        elapsed = time.monotonic() - start
+
+    hedger.close()
+    assert notes == {"notes": [{"text": "fast"}]}
+    assert elapsed < 0.9
+    assert hedger.stats()["hedged"] == 1
+    assert hedger.stats()["hedge_wins"] == 1
+
+
+def test_hedge_response_is_used_when_it_arrived_first():
+    """
+    Test that the hedge is sent from a hedger thread, and its result is
+    returned if it was there when the first call returned
+    """
+    threads = []
+    lock = threading.Lock()
+
+    def func():
+        with lock:
+            threads.append(threading.get_ident())
+            first = len(threads) == 1
+        time.sleep(0.3 if first else 0.01)
+        return "first" if first else "hedge"
+
+    hedger = Hedger(max_delay=0.05, max_hedge_ratio=1)
+    assert hedger.run("get_order_notes", func) == "hedge"
+    hedger.close()
+
+    assert threads[0] == threading.get_ident()
+    assert threads[1] != threading.get_ident()
+    assert hedger.stats()["hedge_wins"] == 1
+
+
+def test_hedges_are_capped_by_ratio():
+    """
+    Test that no more than max_hedge_ratio of the requests are hedged
+    """
+    hedger = Hedger(max_delay=0.01, max_hedge_ratio=0.5)
+
+    for _ in range(4):
+        hedger.run("get_order_notes", lambda: time.sleep(0.03))
+
+    hedger.close()
+    assert hedger.stats()["requests"] == 4
+    assert hedger.stats()["hedged"] == 2
@@ -0,0 +1,187 @@
+"""
+Test the request hooks and the MetricsCollector
+"""
+import json
+import os
+
+import pytest
+import requests
+from requests.exceptions import ConnectTimeout
+
+from newstore_connector.instrumentation import Histogram, MetricsCollector, RequestHooks
+from newstore_connector.order_injection import OrderInjectionV01
+from newstore_connector.order_notes import OrderNotesV010
+from newstore_connector.rate_limiter import AdaptiveRateLimiter, RateLimit
+from newstore_connector.transports import InMemoryTransport
+from tests.stub_server import StubNewStoreServer
+
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             'test_order_injection', 'fixtures')
+
+
+def _load_fixture(name):
+    with open(os.path.join(FIXTURES_PATH, name), "r", encoding='utf-8') as file:
+        return json.load(file)
+
+
+class RecordingHooks(RequestHooks):
+    """
+    Hooks recording every event in order
+    """
+
+    def __init__(self):
+        self.events = []
+
+    def before_request(self, endpoint, method, url):
+        self.events.append(("before", endpoint, method))
+
+    def after_request(self, endpoint, response, elapsed):
+        self.events.append(("after", endpoint, response.status_code))
+
+    def on_retry(self, endpoint, attempt, reason):
+        self.events.append(("retry", endpoint, attempt, reason))
+
+    def on_error(self, endpoint, error, elapsed):
+        self.events.append(("error", endpoint, type(error).__name__))
+
+    def on_validation(self, endpoint, elapsed, valid):
+        self.events.append(("validation", endpoint, valid))
+
+
+def _notes_handler(method, path, body): # pylint: disable=unused-argument
+    return 200, {"notes": [{"id": "note-1", "text": "Test Note"}]}
+
+
+def test_histogram_buckets_are_cumulative():
+    """
+    Test that exported buckets count every value less than or equal to the bound
+    """
+    histogram = Histogram(buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 2):
+        histogram.observe(value)
+
+    assert histogram.cumulative() == [("0.1", 2), ("1", 3), ("+Inf", 4)]
+    assert histogram.count == 4
+    assert histogram.sum == pytest.approx(2.65)
+
+
+def test_hooks_called_around_requests():
+    """
+    Test that before_request and after_request are called for every request
+    """
+    hooks = RecordingHooks()
+    with StubNewStoreServer(_notes_handler) as server:
+        order_notes = OrderNotesV010(base_url=server.base_url, session=requests.Session(),
+                                     headers={}, hooks=[hooks])
+        order_notes.get_order_notes("order-uuid")
+
+    assert hooks.events == [("before", "get_order_notes", "GET"),
+                            ("after", "get_order_notes", 200)]
+
+
+def test_metrics_collector_records_create_order():
+    """
+    Test that validation time, latency, status codes and bytes are recorded
+    """
+    metrics = MetricsCollector()
+    payload = _load_fixture("valid_order_payload.json")
+
+    def handler(method, path, body): # pylint: disable=unused-argument
+        return 200, {"id": "order-uuid"}
+
+    with StubNewStoreServer(handler) as server:
+        order_injection = OrderInjectionV01(base_url=server.base_url,
+                                            session=requests.Session(),
+                                            headers={}, hooks=[metrics])
+        order_injection.create_order(payload=payload)
+        with pytest.raises(ValueError):
+            order_injection.create_order(payload=_load_fixture("invalid_order_payload.json"))
+
+    create_order = metrics.as_dict()["create_order"]
+    assert create_order["duration"]["count"] == 1
+    assert create_order["validation_duration"]["count"] == 2
+    assert create_order["validation_failures"] == 1
+    assert create_order["status_codes"] == {200: 1}
+    assert create_order["request_bytes"] > 100
+    assert create_order["response_bytes"] == len(b'{"id": "order-uuid"}')
+
+
+def test_rate_limited_retries_are_reported():
+    """
+    Test that 429 responses retried by the rate limiter call on_retry
+    """
+    hooks = RecordingHooks()
+    responses = iter([(429, {}), (200, {"notes": []})])
+
+    def handler(method, path, body): # pylint: disable=unused-argument
+        return next(responses)
+
+    rate_limiter = AdaptiveRateLimiter(default=RateLimit(rate=1000, burst=10))
+    with StubNewStoreServer(handler) as server:
+        order_notes = OrderNotesV010(base_url=server.base_url, session=requests.Session(),
+                                     headers={}, rate_limiter=rate_limiter, hooks=[hooks])
+        order_notes.get_order_notes("order-uuid")
+
+    assert ("retry", "get_order_notes", 1, 429) in hooks.events
+    assert hooks.events[-1] == ("after", "get_order_notes", 200)
+
+
+def test_errors_are_reported_and_raised():
+    """
+    Test that exceptions from the session call on_error and are re-raised
+    """
+    metrics = MetricsCollector()
+    order_notes = OrderNotesV010(base_url="http://127.0.0.1:9", session=requests.Session(),
+                                 headers={}, hooks=[metrics])
+
+    with pytest.raises(requests.ConnectionError):
+        order_notes.get_order_notes("order-uuid")
+
+    assert metrics.as_dict()["get_order_notes"]["errors"] == {"ConnectionError": 1}
+
+
+def test_prometheus_export():
+    """
+    Test the Prometheus text format of the collected metrics
+    """
+    metrics = MetricsCollector(buckets=(0.1, 1))
+    with StubNewStoreServer(_notes_handler) as server:
+        order_notes = OrderNotesV010(base_url=server.base_url, session=requests.Session(),
+                                     headers={}, hooks=[metrics])
+        order_notes.get_order_notes("order-uuid")
+
+    text = metrics.prometheus()
+    assert "# TYPE newstore_request_duration_seconds histogram" in text
+    assert 'newstore_request_duration_seconds_bucket{endpoint="get_order_notes",le="+Inf"} 1' \
+        in text
+    assert 'newstore_requests_total{endpoint="get_order_notes",status="200"} 1' in text
+    assert text.endswith("\n")
+
+
+def test_retries_are_reported_once():
+    """
+    Test that every retry of a status or a connection error made by the API
+    class calls on_retry once, with the retry count
+    """
+    hooks = RecordingHooks()
+    metrics = MetricsCollector()
+    responses = iter([ConnectTimeout("connect timed out"), (503, {}), (200, {"notes": []})])
+
+    def handler(method, path, body): # pylint: disable=unused-argument
+        response = next(responses)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    order_notes = OrderNotesV010(base_url="https://test.p.newstore.net",
+                                 transport=InMemoryTransport(handler), headers={},
+                                 hooks=[hooks, metrics], max_retries=2, backoff_factor=0,
+                                 status_forcelist=[503])
+    order_notes.get_order_notes("order-uuid")
+
+    assert [event for event in hooks.events if event[0] == "retry"] == [
+        ("retry", "get_order_notes", 1, "ConnectTimeout"),
+        ("retry", "get_order_notes", 2, 503)
+    ]
+    assert metrics.retries == {("get_order_notes", "ConnectTimeout"): 1,
+                               ("get_order_notes", 503): 1}
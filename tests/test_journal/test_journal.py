@@ -0,0 +1,190 @@
+"""
+Test the order journal and journaled create_order calls
+"""
+import os
+import json
+import copy
+
+import pytest
+import requests
+
+from newstore_connector.journal import OrderJournal, IN_FLIGHT, SUCCEEDED, FAILED
+from newstore_connector.order_injection import OrderInjectionV01
+from tests.stub_server import StubNewStoreServer
+
+
+def _load_valid_payload():
+    fixtures_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                 'test_order_injection', 'fixtures')
+    with open(os.path.join(fixtures_path, "valid_order_payload.json"),
+              "r", encoding='utf-8') as file:
+        return json.load(file)
+
+
+def _build_orders(count):
+    valid_payload = _load_valid_payload()
+    orders = []
+    for i in range(count):
+        order = copy.deepcopy(valid_payload)
+        order['external_id'] = f"order-{i}"
+        orders.append(order)
+
+    return orders
+
+
+def _fulfill_order_handler(method, path, body): # pylint: disable=unused-argument
+    payload = json.loads(body)
+    if payload['external_id'] == "reject-me":
+        return 400, {"message": "rejected"}
+    return 200, {"id": f"uuid-{payload['external_id']}"}
+
+
+def _order_injection(server, journal):
+    return OrderInjectionV01(base_url=server.base_url,
+                             session=requests.Session(),
+                             headers={},
+                             journal=journal)
+
+
+def test_journal_states(tmp_path):
+    """
+    Test that begin skips succeeded orders, sends failed ones again, and only
+    sends interrupted ones again with retry_in_flight
+    """
+    path = str(tmp_path / "orders.journal")
+    with OrderJournal(path) as journal:
+        assert journal.begin("1", "hash") is None
+        with pytest.raises(ValueError):
+            journal.begin("1", "hash")
+        journal.succeed("1", "hash", 200, b'{"id": "1"}')
+
+        assert journal.begin("2", "hash") is None
+        journal.fail("2", "hash", 400, "rejected")
+        assert journal.begin("3", "hash") is None
+
+    # The journal is reopened as if the process had restarted
+    with OrderJournal(path, retry_in_flight=True) as journal:
+        assert journal.counts() == {IN_FLIGHT: 1, SUCCEEDED: 1, FAILED: 1}
+        assert journal.begin("1", "hash").response == b'{"id": "1"}'
+        assert journal.begin("2", "hash") is None
+        assert journal.begin("3", "hash") is None
+        assert journal.get("2", "hash").attempts == 2
+        assert journal.skipped == 1
+
+    with OrderJournal(path) as journal:
+        with pytest.raises(ValueError):
+            journal.begin("3", "hash")
+
+
+def test_create_orders_resumes_from_journal(tmp_path):
+    """
+    Test that a re-run batch only sends orders that were not injected
+    """
+    path = str(tmp_path / "orders.journal")
+    orders = _build_orders(10)
+    orders[4]['external_id'] = "reject-me"
+
+    with StubNewStoreServer(_fulfill_order_handler) as server:
+        with OrderJournal(path) as journal:
+            results = list(_order_injection(server, journal).create_orders(orders[:6]))
+            assert len(server.requests) == 6
+            assert sum(result['success'] for result in results) == 5
+
+        with OrderJournal(path) as journal:
+            results = list(_order_injection(server, journal).create_orders(orders))
+            counts = journal.counts()
+
+        # The rejected order and the 4 new orders are sent
+        assert len(server.requests) == 11
+
+    by_external_id = {result['external_id']: result for result in results}
+    assert by_external_id['order-0']['response'] == {"id": "uuid-order-0"}
+    assert not by_external_id['reject-me']['success']
+    assert counts == {IN_FLIGHT: 0, SUCCEEDED: 9, FAILED: 1}
+
+
+def test_create_order_sends_changed_orders_again(tmp_path):
+    """
+    Test that an order whose body changed is sent again
+    """
+    order = _build_orders(1)[0]
+
+    with StubNewStoreServer(_fulfill_order_handler) as server:
+        with OrderJournal(str(tmp_path / "orders.journal")) as journal:
+            order_injection = _order_injection(server, journal)
+            order_injection.create_order(payload=order)
+            order_injection.create_order(payload=order)
+            order['customer_name'] = "Changed"
+            order_injection.create_order(payload=order)
+
+        assert len(server.requests) == 2
+
+
+def test_create_order_never_resends_after_server_error(tmp_path):
+    """
+    Test that an order answered with a 502 is neither retried nor sent again
+    when the batch is resumed, since NewStore may have created it
+    """
+    path = str(tmp_path / "orders.journal")
+    order = _build_orders(1)[0]
+
+    def handler(method, path, body): # pylint: disable=unused-argument
+        return 502, {"message": "Bad Gateway"}
+
+    with StubNewStoreServer(handler) as server:
+        with OrderJournal(path) as journal:
+            order_injection = OrderInjectionV01(base_url=server.base_url,
+                                                session=requests.Session(), headers={},
+                                                journal=journal, max_retries=3,
+                                                status_forcelist=[502])
+            with pytest.raises(requests.HTTPError):
+                order_injection.create_order(payload=order)
+            assert len(server.requests) == 1
+
+        with OrderJournal(path) as journal:
+            with pytest.raises(ValueError):
+                _order_injection(server, journal).create_order(payload=order)
+            entry = journal.entries(IN_FLIGHT)[0]
+
+        assert len(server.requests) == 1
+
+    assert entry.status_code == 502
+    assert entry.attempts == 1
+
+
+@pytest.mark.parametrize("status_code", [408, 429])
+def test_create_order_keeps_timed_out_orders_in_flight(tmp_path, status_code):
+    """
+    Test that an order answered with a 408, or a 429 after the retries, is
+    left in flight like a 5xx since NewStore may have created it
+    """
+    order = _build_orders(1)[0]
+
+    def handler(method, path, body): # pylint: disable=unused-argument
+        return status_code, {"message": "Try again"}
+
+    with StubNewStoreServer(handler) as server:
+        with OrderJournal(str(tmp_path / "orders.journal")) as journal:
+            with pytest.raises(requests.HTTPError):
+                _order_injection(server, journal).create_order(payload=order)
+            entries = journal.entries(IN_FLIGHT)
+
+    assert [entry.status_code for entry in entries] == [status_code]
+
+
+@pytest.mark.parametrize("payload", ['[1, 2]', b'"order"', {"shop": "storefront"}])
+def test_create_order_rejects_payloads_it_cant_journal(tmp_path, payload):
+    """
+    Test that payloads without an external_id are rejected with a ValueError
+    before they are journaled or sent
+    """
+    with StubNewStoreServer(_fulfill_order_handler) as server:
+        with OrderJournal(str(tmp_path / "orders.journal")) as journal:
+            with pytest.raises(ValueError) as error:
+                _order_injection(server, journal).create_order(payload=payload)
+            counts = journal.counts()
+
+        assert not server.requests
+
+    assert "external_id" in error.value.args[0]
+    assert counts == {IN_FLIGHT: 0, SUCCEEDED: 0, FAILED: 0}
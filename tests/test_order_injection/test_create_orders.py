@@ -0,0 +1,109 @@
+"""
+Test OrderInjectionV01.create_orders against a local stub server
+"""
+import os
+import json
+import copy
+
+import requests
+
+from newstore_connector.order_injection import OrderInjectionV01
+from tests.stub_server import StubNewStoreServer
+
+
+def _load_valid_payload():
+    fixtures_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+    with open(os.path.join(fixtures_path, "valid_order_payload.json"),
+              "r", encoding='utf-8') as file:
+        return json.load(file)
+
+
+def _fulfill_order_handler(method, path, body):
+    """
+    Accept every order except external_id "reject-me"
+    """
+    payload = json.loads(body)
+    if method == "POST" and path == "/v0/d/fulfill_order":
+        if payload['external_id'] == "reject-me":
+            return 400, {"message": "rejected"}
+        return 200, {"id": f"uuid-{payload['external_id']}"}
+
+    return 404, {}
+
+
+def _build_orders(count):
+    valid_payload = _load_valid_payload()
+    orders = []
+    for i in range(count):
+        order = copy.deepcopy(valid_payload)
+        order['external_id'] = f"order-{i}"
+        orders.append(order)
+
+    return orders
+
+
+def test_create_orders_yields_result_per_order():
+    """
+    Test that every order produces one result keyed by external_id
+    """
+    orders = _build_orders(20)
+
+    with StubNewStoreServer(_fulfill_order_handler) as server:
+        order_injection = OrderInjectionV01(base_url=server.base_url,
+                                            session=requests.Session(),
+                                            headers={})
+        results = order_injection.create_orders(orders, max_in_flight=4)
+        by_external_id = {result['external_id']: result for result in results}
+
+    assert len(by_external_id) == 20
+    assert all(result['success'] for result in by_external_id.values())
+    assert by_external_id['order-3']['response'] == {"id": "uuid-order-3"}
+    assert results.stats.succeeded == 20
+    assert results.stats.per_second > 0
+
+
+def test_create_orders_failures_do_not_abort_batch():
+    """
+    Test that validation and HTTP failures are reported without stopping the batch
+    """
+    orders = _build_orders(5)
+    orders[1]['external_id'] = "reject-me"
+    orders[2]['shipments'][0]['items'][0]['price']['item_price'] = "64"
+
+    with StubNewStoreServer(_fulfill_order_handler) as server:
+        order_injection = OrderInjectionV01(base_url=server.base_url,
+                                            session=requests.Session(),
+                                            headers={})
+        results = order_injection.create_orders(orders, max_in_flight=2)
+        by_external_id = {result['external_id']: result for result in results}
+
+        # The invalid order is never sent
+        assert len(server.requests) == 4
+
+    assert by_external_id['reject-me']['error']['type'] == "http"
+    assert by_external_id['reject-me']['error']['status_code'] == 400
+    assert by_external_id['order-2']['error']['type'] == "validation"
+    assert results.stats.succeeded == 3
+    assert results.stats.failed == 2
+
+
+def test_create_orders_consumes_orders_lazily():
+    """
+    Test that no more than max_in_flight orders are pulled ahead of the results
+    """
+    pulled = []
+
+    def order_generator():
+        for order in _build_orders(10):
+            pulled.append(order['external_id'])
+            yield order
+
+    with StubNewStoreServer(_fulfill_order_handler) as server:
+        order_injection = OrderInjectionV01(base_url=server.base_url,
+                                            session=requests.Session(),
+                                            headers={})
+        results = iter(order_injection.create_orders(order_generator(), max_in_flight=3))
+        next(results)
+
+        assert len(pulled) <= 4
+        assert len(list(results)) == 9
@@ -0,0 +1,169 @@
+"""
+Test the typed create_order models
+"""
+import os
+import json
+import copy
+
+import pytest
+import requests
+
+from newstore_connector.order_injection import OrderInjectionV01
+from api_toolkit.validate import RuleSet
+
+from newstore_connector.order_injection.models import Order, Address, TaxLine
+from tests.stub_server import StubNewStoreServer
+
+
+def _load_fixture(name):
+    fixtures_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+    with open(os.path.join(fixtures_path, name), "r", encoding='utf-8') as file:
+        return json.load(file)
+
+
+def test_order_round_trips_payload():
+    """
+    Test that a valid payload builds an Order that serializes back to the same payload
+    """
+    payload = _load_fixture("valid_order_payload.json")
+
+    order = Order.from_dict(payload)
+
+    assert isinstance(order.shipping_address, Address)
+    assert isinstance(order.shipments[0].items[0].price.item_tax_lines[0], TaxLine)
+    assert order.to_dict() == payload
+    assert json.loads(order.to_json()) == payload
+
+
+def test_order_rejects_what_validation_rejects():
+    """
+    Test that payloads rejected by validate_create_order_payload can't be built
+    """
+    payload = _load_fixture("invalid_order_payload.json")
+
+    rule_set = OrderInjectionV01().validate_create_order_payload(payload)
+    assert not bool(rule_set)
+    with pytest.raises(ValueError) as error:
+        Order.from_dict(payload)
+
+    assert error.value.args[0] == rule_set.errors
+
+
+def test_models_match_validation_verdicts():
+    """
+    Test that a model is built exactly when validate_create_order_payload
+    accepts the payload, with the same errors
+    """
+    order_injection = OrderInjectionV01()
+    valid_payload = _load_fixture("valid_order_payload.json")
+    payloads = [valid_payload, _load_fixture("invalid_order_payload.json")]
+    for field in valid_payload:
+        for value in (None, True, 1, 1.5, "", [{}]):
+            payloads.append(dict(valid_payload, **{field: value}))
+
+    for payload in payloads:
+        errors = dict(order_injection.validate_create_order_payload(payload).errors)
+        try:
+            Order.from_dict(payload)
+        except ValueError as error:
+            assert error.args[0] == errors
+        else:
+            assert not errors
+
+
+def test_nested_models_are_not_validated_again(monkeypatch):
+    """
+    Test that building a model from child models runs only its own RuleSet,
+    while building it from dicts validates every nested document
+    """
+    payload = _load_fixture("valid_order_payload.json")
+    built = Order.from_dict(payload)
+    children = {name: getattr(built, name) for name in Order._fields # pylint: disable=protected-access
+                if getattr(built, name) is not None}
+    validated = []
+    set_attribute = RuleSet.__setattr__
+
+    def counting_setattr(rule_set, name, value):
+        if name == 'test_dict':
+            validated.append(rule_set)
+        set_attribute(rule_set, name, value)
+
+    monkeypatch.setattr(RuleSet, '__setattr__', counting_setattr)
+
+    order = Order(**children, **built.extra)
+    assert len(validated) == 1
+    assert order.to_dict() == payload
+
+    validated.clear()
+    Order.from_dict(payload)
+    assert len(validated) > 1
+
+
+def test_order_serializes_without_to_dict(monkeypatch):
+    """
+    Test that to_json writes the fields directly, with the same payload as to_dict
+    """
+    payload = _load_fixture("valid_order_payload.json")
+    payload["custom_field"] = {"keep": ["as", "is"]}
+    order = Order.from_dict(payload)
+
+    monkeypatch.setattr(Order, 'to_dict', None)
+
+    assert json.loads(order.to_json()) == payload
+    assert json.loads(order.to_json(lambda value: json.dumps(value))) == payload
+
+
+def test_models_check_field_constraints():
+    """
+    Test types, lengths, bounds and required fields, as the create_order rules check them
+    """
+    with pytest.raises(ValueError) as error:
+        Address(country="USA")
+    assert set(error.value.args[0]) == {"country", "address_line_1"}
+
+    with pytest.raises(ValueError) as error:
+        TaxLine(amount=1, rate=1.5, name="VAT")
+    assert set(error.value.args[0]) == {"rate"}
+
+    assert not hasattr(TaxLine(amount=1, rate=0.2, name="VAT"), "__dict__")
+
+
+def test_models_are_immutable():
+    """
+    Test that a built model can't be changed, and that replace() validates the copy
+    """
+    order = Order.from_dict(_load_fixture("valid_order_payload.json"))
+
+    with pytest.raises(AttributeError):
+        order.shop = 12
+    with pytest.raises(TypeError):
+        order.shipments[0] = {}
+    with pytest.raises(ValueError) as error:
+        order.replace(shop=12)
+    assert set(error.value.args[0]) == {"shop"}
+
+    renamed = order.replace(shop="other-shop")
+    assert renamed.shop == "other-shop"
+    assert renamed.shipments == order.shipments
+    assert order.shop != "other-shop"
+
+
+def test_create_order_sends_order_model():
+    """
+    Test that create_order accepts an Order and sends its payload
+    """
+    payload = _load_fixture("valid_order_payload.json")
+    order = Order.from_dict(copy.deepcopy(payload))
+
+    def handler(method, path, body): # pylint: disable=unused-argument
+        return 200, {"id": "order-uuid"}
+
+    with StubNewStoreServer(handler) as server:
+        order_injection = OrderInjectionV01(base_url=server.base_url,
+                                            session=requests.Session(),
+                                            headers={})
+        response = order_injection.create_order(payload=order, return_json=True)
+
+        assert json.loads(server.requests[0][2]) == payload
+
+    assert response == {"id": "order-uuid"}
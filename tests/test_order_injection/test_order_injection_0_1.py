@@ -3,6 +3,11 @@ Test Order Injection V01
 """
 import os
 import json
+import threading
+
+import pytest
+from api_toolkit.validate import RuleSet
+
 from newstore_connector.order_injection import OrderInjectionV01
 
 
@@ -42,3 +47,166 @@ def test_order_payload_validation_invalid_order():
 
     assert not bool(validation_result)
     assert len(validation_result.errors) == 1
+
+
+def test_validation_ruleset_is_cached():
+    """
+    Test that the ruleset tree is only built once and shared sub-rulesets are
+    the same instance
+    """
+    order_injection = OrderInjectionV01()
+
+    validation_dict = order_injection._create_order_validation_dict()
+
+    assert validation_dict is OrderInjectionV01()._create_order_validation_dict()
+    assert validation_dict['shipping_address'][1] is validation_dict['billing_address'][1]
+
+
+def test_validation_ruleset_cached_per_thread():
+    """
+    Test that each thread validates with its own ruleset tree
+    """
+    order_injection = OrderInjectionV01()
+    validation_dicts = []
+
+    thread = threading.Thread(
+        target=lambda: validation_dicts.append(order_injection._create_order_validation_dict()))
+    thread.start()
+    thread.join()
+
+    assert validation_dicts[0] is not order_injection._create_order_validation_dict()
+
+
+def test_cached_validation_results_are_independent():
+    """
+    Test that validating a second payload does not change the result of the first
+    """
+    fixtures_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+    with open(os.path.join(fixtures_path, "invalid_order_payload.json"),
+              "r", encoding='utf-8') as file:
+        invalid_payload = json.load(file)
+    with open(os.path.join(fixtures_path, "valid_order_payload.json"),
+              "r", encoding='utf-8') as file:
+        valid_payload = json.load(file)
+
+    order_injection = OrderInjectionV01()
+
+    invalid_result = order_injection.validate_create_order_payload(invalid_payload)
+    valid_result = order_injection.validate_create_order_payload(valid_payload)
+
+    assert not bool(invalid_result)
+    assert len(invalid_result.errors) == 1
+    assert bool(valid_result)
+
+
+def test_validate_many_matches_single_validation():
+    """
+    Test that validate_many returns the errors of each payload in input order,
+    in a single process and across processes
+    """
+    fixtures_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+    with open(os.path.join(fixtures_path, "invalid_order_payload.json"),
+              "r", encoding='utf-8') as file:
+        invalid_payload = json.load(file)
+    with open(os.path.join(fixtures_path, "valid_order_payload.json"),
+              "r", encoding='utf-8') as file:
+        valid_payload = json.load(file)
+
+    payloads = [valid_payload, invalid_payload, valid_payload] * 5
+    order_injection = OrderInjectionV01()
+    expected = [order_injection.validate_create_order_payload(payload).errors
+                for payload in payloads]
+
+    assert order_injection.validate_many(payloads, workers=1) == expected
+    assert order_injection.validate_many(payloads, workers=2, chunksize=4) == expected
+    assert list(order_injection.validate_many(iter(payloads), workers=2,
+                                              chunksize=4, lazy=True)) == expected
+
+
+def test_fail_fast_validation_matches_full_validation():
+    """
+    Test that fail-fast validation accepts and rejects the same payloads as
+    full validation, reporting the full errors of a single field
+    """
+    fixtures_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+    with open(os.path.join(fixtures_path, "invalid_order_payload.json"),
+              "r", encoding='utf-8') as file:
+        invalid_payload = json.load(file)
+    with open(os.path.join(fixtures_path, "valid_order_payload.json"),
+              "r", encoding='utf-8') as file:
+        valid_payload = json.load(file)
+
+    order_injection = OrderInjectionV01()
+
+    assert bool(order_injection.validate_create_order_payload(valid_payload, fail_fast=True))
+    result = order_injection.validate_create_order_payload(invalid_payload, fail_fast=True)
+    assert not bool(result)
+    full_errors = order_injection.validate_create_order_payload(invalid_payload).errors
+    assert len(result.errors) == 1
+    field = next(iter(result.errors))
+    assert result.errors == {field: full_errors[field]}
+
+    for field in valid_payload:
+        for value in (None, True, 1.5, "", [{}]):
+            payload = dict(valid_payload, **{field: value})
+            full = bool(order_injection.validate_create_order_payload(payload))
+            fast = bool(order_injection.validate_create_order_payload(payload, fail_fast=True))
+            assert fast == full, (field, value)
+
+
+def test_fail_fast_validation_walks_valid_payloads_once(monkeypatch):
+    """
+    Test that fail-fast validation of a valid payload runs no more RuleSets than
+    full validation, and stops before the nested documents when a field at
+    the top of the order is invalid
+    """
+    fixtures_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+    with open(os.path.join(fixtures_path, "valid_order_payload.json"),
+              "r", encoding='utf-8') as file:
+        valid_payload = json.load(file)
+    order_injection = OrderInjectionV01()
+    order_injection.validate_create_order_payload(valid_payload, fail_fast=True)
+
+    validated = []
+    set_attribute = RuleSet.__setattr__
+
+    def counting_setattr(rule_set, name, value):
+        if name == 'test_dict':
+            validated.append(rule_set)
+        set_attribute(rule_set, name, value)
+
+    monkeypatch.setattr(RuleSet, '__setattr__', counting_setattr)
+
+    def count(payload, fail_fast):
+        validated.clear()
+        result = order_injection.validate_create_order_payload(payload, fail_fast=fail_fast)
+        return len(validated), bool(result)
+
+    full, valid = count(valid_payload, False)
+    fast, fast_valid = count(valid_payload, True)
+    assert valid and fast_valid
+    assert fast <= full
+
+    valid_payload['is_offline'] = "false"
+    fast_invalid, fast_valid = count(valid_payload, True)
+    assert not fast_valid
+    assert fast_invalid < fast
+
+
+def test_fail_fast_validation_checks_required_fields_first():
+    """
+    Test that a missing required field is reported before errors deeper in the payload
+    """
+    fixtures_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+    with open(os.path.join(fixtures_path, "invalid_order_payload.json"),
+              "r", encoding='utf-8') as file:
+        invalid_payload = json.load(file)
+    del invalid_payload['currency']
+
+    order_injection = OrderInjectionV01()
+    result = order_injection.validate_create_order_payload(invalid_payload, fail_fast=True)
+
+    full_errors = order_injection.validate_create_order_payload(invalid_payload).errors
+    assert result.errors == {'currency': full_errors['currency']}
+    with pytest.raises(ValueError):
+        order_injection.create_order(payload=invalid_payload, fail_fast=True)
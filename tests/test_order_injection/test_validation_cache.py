@@ -0,0 +1,102 @@
+"""
+Test memoized validation of repeated sub-documents
+"""
+import os
+import json
+import copy
+
+import pytest
+
+from newstore_connector.order_injection import OrderInjectionV01
+from newstore_connector.validation_cache import (SubDocumentCache, structural_key,
+                                                 enable_subdocument_cache,
+                                                 disable_subdocument_cache)
+
+
+def _load_fixture(name):
+    fixtures_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+    with open(os.path.join(fixtures_path, name), "r", encoding='utf-8') as file:
+        return json.load(file)
+
+
+@pytest.fixture(name="cache")
+def fixture_cache():
+    """
+    Enable the sub-document cache for one test
+    """
+    yield enable_subdocument_cache(maxsize=64)
+    disable_subdocument_cache()
+
+
+def _payload_variants():
+    valid_payload = _load_fixture("valid_order_payload.json")
+    bad_address = copy.deepcopy(valid_payload)
+    bad_address['shipping_address']['country'] = "USA"
+    bad_tax_line = copy.deepcopy(valid_payload)
+    bad_tax_line['shipments'][0]['items'][0]['price']['item_tax_lines'][0]['rate'] = 1
+    return [valid_payload, _load_fixture("invalid_order_payload.json"), bad_address,
+            bad_tax_line]
+
+
+def test_cached_errors_match_uncached_errors():
+    """
+    Test that validation errors are the same with and without the cache, on
+    first use and when answered from the cache
+    """
+    order_injection = OrderInjectionV01()
+    payloads = _payload_variants()
+    expected = [order_injection.validate_create_order_payload(payload).errors
+                for payload in payloads]
+
+    cache = enable_subdocument_cache(maxsize=64)
+    try:
+        for _ in range(3):
+            assert [order_injection.validate_create_order_payload(payload).errors
+                    for payload in payloads] == expected
+    finally:
+        disable_subdocument_cache()
+
+    assert cache.stats()["hits"] > 0
+
+
+def test_cached_errors_are_copies(cache):
+    """
+    Test that changing returned errors does not change the cached result
+    """
+    payload = _payload_variants()[2]
+    order_injection = OrderInjectionV01()
+
+    first = order_injection.validate_create_order_payload(payload)
+    bool(first)
+    expected = copy.deepcopy(first.errors)
+    first.errors.clear()
+
+    second = order_injection.validate_create_order_payload(payload)
+    assert not bool(second)
+    assert second.errors == expected
+    assert cache.stats()["hits"] > 0
+
+
+def test_structural_key_distinguishes_types():
+    """
+    Test that values that compare equal but validate differently get different keys
+    """
+    assert structural_key({"rate": 1}) != structural_key({"rate": 1.0})
+    assert structural_key([1]) != structural_key([True])
+    assert structural_key({"a": 1, "b": [2]}) == structural_key({"b": [2], "a": 1})
+
+
+def test_subdocument_cache_evicts_least_recently_used():
+    """
+    Test that the cache is bounded and evicts the least recently used result
+    """
+    cache = SubDocumentCache(maxsize=2)
+    cache.set("a", True, {})
+    cache.set("b", True, {})
+    cache.get("a")
+    cache.set("c", False, {"name": "required"})
+
+    assert cache.get("b") is None
+    assert cache.get("a") == (True, {})
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["size"] == 2
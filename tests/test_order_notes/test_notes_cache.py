@@ -0,0 +1,99 @@
+"""
+Test the cache of get_order_notes responses
+"""
+import requests
+
+from newstore_connector.order_notes import OrderNotesV010, NotesCache
+from tests.stub_server import StubNewStoreServer
+
+NOTES = {"notes": [{"id": "n1", "text": "Packed"}]}
+
+
+def _order_notes(server, notes_cache):
+    return OrderNotesV010(base_url=server.base_url,
+                          session=requests.Session(),
+                          headers={},
+                          notes_cache=notes_cache)
+
+
+def test_cache_hits_and_invalidation():
+    """
+    Test that cached notes are returned without a request until a note of
+    the order is written
+    """
+    def handler(method, path, body): # pylint: disable=unused-argument
+        return 200, NOTES if method == "GET" else {"id": "n2"}
+
+    notes_cache = NotesCache(ttl=60)
+    server = StubNewStoreServer(handler)
+    with server:
+        order_notes = _order_notes(server, notes_cache)
+        assert order_notes.get_order_notes("A", return_json=True) == NOTES
+        assert order_notes.get_order_notes("A", return_json=True) == NOTES
+        assert order_notes.get_order_notes("B", return_json=True) == NOTES
+        order_notes.create_order_note("A", text="Shipped", tags=["t"])
+        assert order_notes.get_order_notes("A", return_json=True) == NOTES
+        assert order_notes.get_order_notes("B", return_json=True) == NOTES
+
+    assert [(method, path) for method, path, _ in server.requests] == [
+        ("GET", "/v0/d/orders/A/notes"),
+        ("GET", "/v0/d/orders/B/notes"),
+        ("POST", "/v0/d/orders/A/notes"),
+        ("GET", "/v0/d/orders/A/notes")
+    ]
+    stats = notes_cache.stats()
+    assert (stats['hits'], stats['misses'], stats['invalidations']) == (2, 3, 1)
+    assert stats['hit_rate'] == 0.4
+
+
+def test_expired_notes_are_revalidated_with_etag():
+    """
+    Test that expired notes with an ETag are requested with If-None-Match
+    and reused when the server answers 304
+    """
+    def handler(method, path, body): # pylint: disable=unused-argument
+        if server.request_headers[-1].get('If-None-Match') == '"v1"':
+            return 304, None, {"ETag": '"v1"'}
+        return 200, NOTES, {"ETag": '"v1"'}
+
+    notes_cache = NotesCache(ttl=0)
+    server = StubNewStoreServer(handler)
+    with server:
+        order_notes = _order_notes(server, notes_cache)
+        assert order_notes.get_order_notes("A", return_json=True) == NOTES
+        response = order_notes.get_order_notes("A")
+        assert response.status_code == 200
+        assert response.json() == NOTES
+        assert response.headers['ETag'] == '"v1"'
+
+    assert [headers.get('If-None-Match') for headers in server.request_headers] == [None, '"v1"']
+    assert notes_cache.stats()['revalidations'] == 1
+
+
+def test_invalidated_fetch_is_not_cached():
+    """
+    Test that a response requested before a write of the order is not cached
+    """
+    notes_cache = NotesCache()
+    entry, token = notes_cache.lookup("A")
+    assert entry is None
+    notes_cache.invalidate("A")
+    notes_cache.store("A", token, 200, b'{}', {})
+    notes_cache.release("A", token)
+
+    assert notes_cache.lookup("A")[0] is None
+
+
+def test_least_recently_used_order_is_evicted():
+    """
+    Test that the cache keeps at most maxsize orders
+    """
+    notes_cache = NotesCache(maxsize=2)
+    for order_uuid in ("A", "B", "A", "C"):
+        entry, token = notes_cache.lookup(order_uuid)
+        if token is not None:
+            notes_cache.store(order_uuid, token, 200, b'{}', {})
+
+    assert notes_cache.lookup("B")[1] is not None
+    assert notes_cache.lookup("A")[1] is None
+    assert notes_cache.stats()['evictions'] == 1
@@ -0,0 +1,46 @@
+"""
+Test fetching the notes of many orders concurrently
+"""
+import threading
+import time
+
+import requests
+
+from newstore_connector.order_notes import OrderNotesV010
+from tests.stub_server import StubNewStoreServer
+
+
+def test_get_notes_for_orders_bounds_concurrency_and_yields_errors():
+    """
+    Test that every order is yielded once with its notes or its error, with
+    at most max_in_flight requests at once
+    """
+    lock = threading.Lock()
+    running = []
+    peak = []
+
+    def handler(method, path, body): # pylint: disable=unused-argument
+        order_uuid = path.split("/")[4]
+        with lock:
+            running.append(order_uuid)
+            peak.append(len(running))
+        time.sleep(0.02)
+        with lock:
+            running.remove(order_uuid)
+        if order_uuid == "order-3":
+            return 404, {"message": "not found"}
+        return 200, {"notes": [{"text": order_uuid}]}
+
+    order_uuids = (f"order-{i}" for i in range(12))
+    server = StubNewStoreServer(handler)
+    with server:
+        order_notes = OrderNotesV010(base_url=server.base_url,
+                                     session=requests.Session(),
+                                     headers={})
+        results = dict(order_notes.get_notes_for_orders(order_uuids, max_in_flight=3))
+
+    assert len(results) == 12
+    assert isinstance(results.pop("order-3"), requests.HTTPError)
+    assert all(notes == {"notes": [{"text": order_uuid}]}
+               for order_uuid, notes in results.items())
+    assert max(peak) <= 3
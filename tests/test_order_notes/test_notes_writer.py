@@ -0,0 +1,135 @@
+"""
+Test the background writer of order notes
+"""
+import json
+import threading
+
+import pytest
+import requests
+
+from newstore_connector.order_notes import OrderNotesV010, NotesWriter
+from tests.stub_server import StubNewStoreServer
+
+
+def _order_notes(server):
+    return OrderNotesV010(base_url=server.base_url,
+                          session=requests.Session(),
+                          headers={})
+
+
+def test_writer_coalesces_updates_and_sends_orders_concurrently():
+    """
+    Test that queued updates of a note are sent once with the last write,
+    while the notes of another order are not held back
+    """
+    release = threading.Event()
+
+    def handler(method, path, body): # pylint: disable=unused-argument
+        if method == "POST" and "/orders/A/" in path:
+            release.wait(5)
+        return 200, {"id": "note"}
+
+    server = StubNewStoreServer(handler)
+    with server:
+        writer = _order_notes(server).writer(max_in_flight=2)
+        writer.create_order_note("A", text="created", tags=["t"])
+        for text in ("first", "second", "last"):
+            writer.update_note("A", "n1", text=text, tags=["t"])
+        writer.create_order_note("B", text="other", tags=["t"])
+
+        assert writer.flush(timeout=0.5) is False
+        assert sorted(path for _, path, _ in server.requests) == ["/v0/d/orders/A/notes",
+                                                                 "/v0/d/orders/B/notes"]
+        release.set()
+        assert writer.close(timeout=5)
+
+    patches = [json.loads(body) for method, _, body in server.requests if method == "PATCH"]
+    assert [patch['text'] for patch in patches] == ["last"]
+    assert writer.stats() == {"queued": 5, "coalesced": 2, "sent": 3, "failed": 0, "pending": 0}
+
+
+def test_writer_reports_failures():
+    """
+    Test that failed writes are passed to on_error and later writes still run
+    """
+    def handler(method, path, body): # pylint: disable=unused-argument
+        if method == "DELETE":
+            return 404, {"message": "not found"}
+        return 200, {"id": "note"}
+
+    failures = []
+    successes = []
+    server = StubNewStoreServer(handler)
+    with server:
+        with _order_notes(server).writer(
+                on_error=lambda operation, error: failures.append((operation, error)),
+                on_success=lambda operation, response: successes.append(operation)) as writer:
+            writer.delete_note("A", "missing")
+            writer.create_item_note("A", "item-1", text="gift wrap", tags=["t"])
+
+    assert len(failures) == 1
+    assert failures[0][0].method == "delete_note"
+    assert isinstance(failures[0][1], requests.HTTPError)
+    assert [operation.method for operation in successes] == ["create_item_note"]
+
+    with pytest.raises(RuntimeError):
+        writer.create_order_note("A", text="late")
+
+
+def test_writer_keeps_updates_around_a_delete_in_order():
+    """
+    Test that an update queued after a delete of the note is not merged into
+    an update queued before it
+    """
+    release = threading.Event()
+
+    def handler(method, path, body): # pylint: disable=unused-argument
+        if method == "POST":
+            release.wait(5)
+        return 200, {"id": "note"}
+
+    server = StubNewStoreServer(handler)
+    with server:
+        writer = _order_notes(server).writer(max_in_flight=1)
+        writer.create_order_note("A", text="created", tags=["t"])
+        writer.update_note("A", "n1", text="first", tags=["t"])
+        writer.delete_note("A", "n1")
+        writer.update_note("A", "n1", text="second", tags=["t"])
+        release.set()
+        assert writer.close(timeout=5)
+
+    sent = [(method, json.loads(body).get('text') if body else None)
+            for method, _, body in server.requests]
+    assert sent == [("POST", "created"), ("PATCH", "first"), ("DELETE", None),
+                    ("PATCH", "second")]
+    assert writer.stats()["coalesced"] == 0
+
+
+def test_writer_survives_failing_callbacks():
+    """
+    Test that an exception raised by a callback neither stops the writer nor
+    blocks flush
+    """
+    def handler(method, path, body): # pylint: disable=unused-argument
+        return 200, {"id": "note"}
+
+    def on_success(operation, response):
+        raise RuntimeError("callback failed")
+
+    server = StubNewStoreServer(handler)
+    with server:
+        writer = _order_notes(server).writer(max_in_flight=1, on_success=on_success)
+        writer.create_order_note("A", text="first", tags=["t"])
+        writer.create_order_note("A", text="second", tags=["t"])
+        assert writer.close(timeout=5)
+
+    assert len(server.requests) == 2
+    assert writer.stats()["pending"] == 0
+
+
+def test_writer_rejects_invalid_concurrency():
+    """
+    Test that max_in_flight must be positive
+    """
+    with pytest.raises(ValueError):
+        NotesWriter(None, max_in_flight=0)
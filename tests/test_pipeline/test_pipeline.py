@@ -0,0 +1,186 @@
+"""
+Test streaming order ingestion and the newstore-inject command
+"""
+import io
+import os
+import json
+import copy
+
+import pytest
+import requests
+
+from newstore_connector import pipeline
+from newstore_connector.cli import inject
+from newstore_connector.order_injection import OrderInjectionV01
+from tests.stub_server import StubNewStoreServer
+
+
+def _load_valid_payload():
+    fixtures_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                 'test_order_injection', 'fixtures')
+    with open(os.path.join(fixtures_path, "valid_order_payload.json"),
+              "r", encoding='utf-8') as file:
+        return json.load(file)
+
+
+def _build_orders(count):
+    valid_payload = _load_valid_payload()
+    orders = []
+    for i in range(count):
+        order = copy.deepcopy(valid_payload)
+        order['external_id'] = f"order-{i}"
+        orders.append(order)
+
+    return orders
+
+
+def test_stream_orders_ndjson():
+    """
+    Test reading NDJSON, skipping blank lines
+    """
+    file = io.StringIO('{"external_id": "1"}\n\n{"external_id": "2"}\n')
+
+    assert [order["external_id"] for order in pipeline.stream_orders(file)] == ["1", "2"]
+
+
+def test_stream_orders_ndjson_parse_errors():
+    """
+    Test that invalid lines are reported to on_error and skipped
+    """
+    file = io.StringIO('{"external_id": "1"}\nnot json\n{"external_id": "3"}\n')
+    errors = []
+
+    orders = list(pipeline.stream_orders(file, on_error=lambda line, message:
+                                         errors.append(line)))
+
+    assert [order["external_id"] for order in orders] == ["1", "3"]
+    assert errors == [2]
+
+
+def test_stream_orders_json_array(monkeypatch):
+    """
+    Test reading a JSON array in chunks smaller than a single order
+    """
+    monkeypatch.setattr(pipeline, "READ_SIZE", 16)
+    orders = _build_orders(3)
+    file = io.StringIO("  " + json.dumps(orders, indent=2))
+
+    assert list(pipeline.stream_orders(file)) == orders
+
+
+def test_stream_orders_truncated_json_array():
+    """
+    Test that a truncated JSON array raises ValueError
+    """
+    file = io.StringIO('[{"external_id": "1"}, {"external_id": ')
+
+    with pytest.raises(ValueError):
+        list(pipeline.stream_orders(file))
+
+
+def test_inject_orders_writes_results_and_rejections():
+    """
+    Test that injected and rejected orders are streamed to their files
+    """
+    orders = _build_orders(4)
+    del orders[2]['shipments']
+
+    def handler(method, path, body):
+        return 200, {"id": json.loads(body)["external_id"]}
+
+    results_file = io.StringIO()
+    rejections_file = io.StringIO()
+    progress = []
+
+    with StubNewStoreServer(handler) as server:
+        order_injection = OrderInjectionV01(base_url=server.base_url,
+                                            session=requests.Session(),
+                                            headers={})
+        stats = pipeline.inject_orders(order_injection, iter(orders),
+                                       results_file, rejections_file,
+                                       max_in_flight=2, progress=progress.append)
+
+    results = [json.loads(line) for line in results_file.getvalue().splitlines()]
+    rejections = [json.loads(line) for line in rejections_file.getvalue().splitlines()]
+
+    assert sorted(result["external_id"] for result in results) == \
+        ["order-0", "order-1", "order-3"]
+    assert rejections[0]["external_id"] == "order-2"
+    assert rejections[0]["error"]["type"] == "validation"
+    assert stats.succeeded == 3
+    assert progress
+
+
+def test_cli_dry_run(tmp_path):
+    """
+    Test that a dry run validates every order without connecting to NewStore
+    """
+    orders = _build_orders(3)
+    orders[1]['currency'] = "NOT A CURRENCY"
+    input_path = tmp_path / "orders.ndjson"
+    input_path.write_text("\n".join(json.dumps(order) for order in orders) + "\nnot json\n",
+                          encoding='utf-8')
+
+    exit_code = inject([str(input_path), "--tenant", "test", "--dry-run",
+                        "--results", str(tmp_path / "results.ndjson"),
+                        "--rejections", str(tmp_path / "rejections.ndjson")])
+
+    rejections = (tmp_path / "rejections.ndjson").read_text(encoding='utf-8').splitlines()
+    results = (tmp_path / "results.ndjson").read_text(encoding='utf-8').splitlines()
+
+    assert exit_code == 1
+    assert len(results) == 2
+    assert {json.loads(line)["error"]["type"] for line in rejections} == {"validation", "parse"}
+
+
+def test_inject_orders_with_validation_workers():
+    """
+    Test that orders rejected by validation processes are reported and never sent
+    """
+    orders = _build_orders(6)
+    orders[4]['currency'] = "NOT A CURRENCY"
+
+    def handler(method, path, body):
+        return 200, {"id": json.loads(body)["external_id"]}
+
+    results_file = io.StringIO()
+    rejections_file = io.StringIO()
+
+    with StubNewStoreServer(handler) as server:
+        order_injection = OrderInjectionV01(base_url=server.base_url,
+                                            session=requests.Session(),
+                                            headers={})
+        stats = pipeline.inject_orders(order_injection, iter(orders),
+                                       results_file, rejections_file,
+                                       validation_workers=2)
+        assert len(server.requests) == 5
+
+    rejections = [json.loads(line) for line in rejections_file.getvalue().splitlines()]
+
+    assert [rejection["external_id"] for rejection in rejections] == ["order-4"]
+    assert stats.succeeded == 5
+    assert stats.failed == 1
+
+
+def test_validation_worker_rejections_are_written_as_found():
+    """
+    Test that orders rejected by validation processes are written before the
+    next order is validated, so an all invalid input is never held in memory
+    """
+    orders = _build_orders(50)
+    rejections_file = io.StringIO()
+    written = []
+
+    def validate_many(payloads, **kwargs): # pylint: disable=unused-argument
+        for _ in payloads:
+            written.append(len(rejections_file.getvalue().splitlines()))
+            yield {"currency": "Invalid currency"}
+
+    order_injection = OrderInjectionV01(base_url="http://localhost/", headers={})
+    order_injection.validate_many = validate_many
+    stats = pipeline.inject_orders(order_injection, iter(orders), io.StringIO(),
+                                   rejections_file, validation_workers=2)
+
+    assert written == list(range(50))
+    assert len(rejections_file.getvalue().splitlines()) == 50
+    assert stats.failed == 50
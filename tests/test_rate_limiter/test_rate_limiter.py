@@ -0,0 +1,104 @@
+"""
+Test the AdaptiveRateLimiter
+"""
+import time
+
+import requests
+
+from newstore_connector.order_notes import OrderNotesV010
+from newstore_connector.rate_limiter import AdaptiveRateLimiter, RateLimit
+from tests.stub_server import StubNewStoreServer
+
+
+def _send(limiter, endpoint, count, status_code=200):
+    for _ in range(count):
+        with limiter.acquire(endpoint) as bucket:
+            bucket.record(status_code)
+
+
+def test_requests_paced_to_rate():
+    """
+    Test that requests beyond the burst wait for the rate
+    """
+    limiter = AdaptiveRateLimiter(RateLimit(rate=50, burst=1, increase=0))
+
+    start = time.monotonic()
+    _send(limiter, "create_order", 6)
+
+    assert time.monotonic() - start >= 0.09
+
+
+def test_burst_sent_without_waiting():
+    """
+    Test that a burst of requests is sent at once after being idle
+    """
+    limiter = AdaptiveRateLimiter(RateLimit(rate=1, burst=5, increase=0))
+
+    start = time.monotonic()
+    _send(limiter, "create_order", 5)
+
+    assert time.monotonic() - start < 0.5
+
+
+def test_rate_limited_response_decreases_rate():
+    """
+    Test that a 429 halves the rate and pauses for Retry-After
+    """
+    limiter = AdaptiveRateLimiter(RateLimit(rate=40, burst=10))
+
+    with limiter.acquire("create_order") as bucket:
+        bucket.record(429, "0.2")
+
+    assert limiter.rate() == 20
+    start = time.monotonic()
+    _send(limiter, "create_order", 1)
+    assert time.monotonic() - start >= 0.15
+
+
+def test_rate_increases_up_to_max_rate():
+    """
+    Test that successful requests increase the rate up to max_rate
+    """
+    limiter = AdaptiveRateLimiter(RateLimit(rate=10, burst=100, max_rate=11, increase=5))
+
+    _send(limiter, "create_order", 20)
+
+    assert limiter.rate() == 11
+
+
+def test_endpoint_buckets_are_separate():
+    """
+    Test that configured endpoints do not share the default bucket
+    """
+    limiter = AdaptiveRateLimiter(RateLimit(rate=10, burst=10),
+                                  endpoints={"get_order_notes": RateLimit(rate=100, burst=10)})
+
+    _send(limiter, "get_order_notes", 1, status_code=429)
+
+    stats = limiter.stats()
+    assert stats["get_order_notes"]["throttled"] == 1
+    assert stats["default"]["throttled"] == 0
+    assert limiter.rate("create_order") == 10
+
+
+def test_api_class_retries_rate_limited_requests():
+    """
+    Test that API classes send a 429 request again through the limiter
+    """
+    statuses = [429, 200]
+
+    def handler(method, path, body):
+        return statuses.pop(0), {"notes": []}
+
+    limiter = AdaptiveRateLimiter(RateLimit(rate=100, burst=10))
+    with StubNewStoreServer(handler) as server:
+        order_notes = OrderNotesV010(base_url=server.base_url,
+                                     session=requests.Session(),
+                                     headers={},
+                                     rate_limiter=limiter)
+        response = order_notes.get_order_notes("order-uuid")
+
+        assert len(server.requests) == 2
+
+    assert response.status_code == 200
+    assert limiter.stats()["default"]["throttled"] == 1
@@ -0,0 +1,76 @@
+"""
+Test the TrafficRecorder
+"""
+import pytest
+import requests
+
+from newstore_connector import NewStoreConnector
+from newstore_connector.recorder import TrafficRecorder, load_traffic, redact
+from newstore_connector.transports import InMemoryTransport
+
+
+def _handler(method, path, body): # pylint: disable=unused-argument
+    if "missing" in path:
+        return 404, {"message": "not found"}
+    return 200, {"notes": []}
+
+
+def _record(path, payloads):
+    with TrafficRecorder(str(path), payloads=payloads) as recorder:
+        ns_conn = NewStoreConnector(tenant="test", token="secret-token",
+                                    transport=InMemoryTransport(_handler), hooks=[recorder])
+        ns_conn.order_notes.create_order_note("A", text="Call Jane", source="agent",
+                                              tags=["vip"])
+        with pytest.raises(requests.HTTPError):
+            ns_conn.order_notes.get_order_notes("missing")
+
+    return load_traffic(str(path))
+
+
+def test_calls_are_recorded_redacted(tmp_path):
+    """
+    Test that every call is recorded with its timing and status, with the
+    text of the body redacted and no headers
+    """
+    records = _record(tmp_path / "traffic.ndjson.gz", "redact")
+
+    assert [(record["endpoint"], record["method"], record["status"]) for record in records] == [
+        ("create_order_note", "POST", 200),
+        ("get_order_notes", "GET", 404)
+    ]
+    assert records[0]["path"].endswith("/orders/A/notes")
+    assert records[0]["body"] == {"text": "xxxxxxxxx", "source": "xxxxx",
+                                  "source_type": "xxxxxxxxxxx", "tags": ["xxx"]}
+    assert records[0]["redacted"] is True
+    assert records[0]["size"] > 0
+    assert 0 <= records[0]["start"] <= records[1]["start"]
+    assert "secret-token" not in (tmp_path / "traffic.ndjson.gz").read_bytes().decode('latin-1')
+
+
+def test_bodies_are_kept_or_dropped(tmp_path):
+    """
+    Test that bodies are written as sent with "keep", and left out with "drop"
+    """
+    kept = _record(tmp_path / "kept.ndjson", "keep")
+    dropped = _record(tmp_path / "dropped.ndjson", "drop")
+
+    assert kept[0]["body"]["text"] == "Call Jane"
+    assert "redacted" not in kept[0]
+    assert "body" not in dropped[0]
+    assert dropped[0]["size"] == kept[0]["size"]
+
+
+def test_redact_keeps_shape():
+    """
+    Test that redaction keeps keys, numbers and sizes
+    """
+    assert redact({"email": "a@b.c", "items": [{"price": 9.5, "gift": True}]}) == \
+        {"email": "xxxxx", "items": [{"price": 9.5, "gift": True}]}
+
+
+def test_invalid_payloads_option(tmp_path):
+    """
+    Test that an unknown payloads option is rejected
+    """
+    with pytest.raises(ValueError):
+        TrafficRecorder(str(tmp_path / "traffic.ndjson"), payloads="mask")
@@ -0,0 +1,124 @@
+"""
+Test the multi-tenant NewStoreConnectorRegistry
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from newstore_connector import NewStoreConnector, NewStoreConnectorRegistry
+from newstore_connector import registry as registry_module
+from tests.stub_server import StubNewStoreServer
+
+
+def _token_credentials(tenant, env, role): # pylint: disable=unused-argument
+    return {"token": f"token-{tenant}"}
+
+
+def test_registry_creates_one_connector_per_key():
+    """
+    Test that connectors are created lazily and once per tenant, env and role,
+    even when requested from many threads at once
+    """
+    created = []
+    lock = threading.Lock()
+
+    class CountingConnector(NewStoreConnector):
+        """
+        Record every connector created
+        """
+        def __init__(self, **kwargs):
+            super().__init__(**kwargs)
+            with lock:
+                created.append(self.tenant)
+
+    with NewStoreConnectorRegistry(_token_credentials,
+                                   connector_class=CountingConnector) as registry:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            connectors = list(executor.map(lambda _: registry.get("tenant-a"), range(32)))
+
+        assert all(connector is connectors[0] for connector in connectors)
+        assert registry.get("tenant-a", env="s") is not connectors[0]
+        assert connectors[0].token == "token-tenant-a"
+        assert connectors[0].auth_session is registry.auth_session
+        assert created == ["tenant-a", "tenant-a"]
+
+
+def test_registry_forgets_failed_creations():
+    """
+    Test that a connector whose creation raised is created again on the next
+    get, without leaving its key behind
+    """
+    failures = [KeyError("tenant-a")]
+
+    def credentials(tenant, env, role):
+        if failures:
+            raise failures.pop()
+        return _token_credentials(tenant, env, role)
+
+    with NewStoreConnectorRegistry(credentials) as registry:
+        with pytest.raises(KeyError):
+            registry.get("tenant-a")
+        assert not registry._creating # pylint: disable=protected-access
+
+        assert registry.get("tenant-a").token == "token-tenant-a"
+        assert not registry._creating # pylint: disable=protected-access
+
+
+def test_registry_evicts_least_recently_used():
+    """
+    Test that connectors beyond max_connectors are evicted, least recently used first
+    """
+    with NewStoreConnectorRegistry(_token_credentials, max_connectors=2) as registry:
+        first = registry.get("tenant-a")
+        registry.get("tenant-b")
+        registry.get("tenant-a")
+        registry.get("tenant-c")
+
+        assert registry.get("tenant-a") is first
+        assert registry.stats() == {"connectors": 2, "hits": 2, "created": 3, "evicted": 1}
+
+
+def test_registry_evicts_idle_connectors_except_hot_tenants(monkeypatch):
+    """
+    Test that connectors unused for idle_ttl seconds are evicted, but hot tenants are kept
+    """
+    now = [1000.0]
+    monkeypatch.setattr(registry_module.time, "monotonic", lambda: now[0])
+
+    with NewStoreConnectorRegistry(_token_credentials, idle_ttl=60,
+                                   hot_tenants=["tenant-hot"]) as registry:
+        hot = registry.get("tenant-hot")
+        registry.get("tenant-a")
+        now[0] += 61
+
+        assert registry.evict_idle() == 1
+        assert registry.get("tenant-hot") is hot
+        assert registry.stats()["connectors"] == 1
+
+
+def test_registry_warms_hot_tenants():
+    """
+    Test that warm() creates the hot tenant connectors and fetches their tokens
+    """
+    def handler(method, path, body): # pylint: disable=unused-argument
+        return 200, {"access_token": "fresh-token", "expires_in": 3600, "scope": "role"}
+
+    with StubNewStoreServer(handler) as server:
+
+        class StubConnector(NewStoreConnector):
+            """
+            Send token requests to the stub server
+            """
+            def _auth_request(self):
+                _, headers, payload = super()._auth_request()
+                return f"{server.base_url}/auth/{self.tenant}", headers, payload
+
+        credentials = {"tenant-a": {"client_id": "id", "client_secret": "secret"}}
+        with NewStoreConnectorRegistry(credentials, hot_tenants=["tenant-a"],
+                                       connector_class=StubConnector) as registry:
+            registry.warm(background=True).join()
+
+            assert registry.stats()["created"] == 1
+            assert registry.get("tenant-a").token == "fresh-token"
+            assert len(server.requests) == 1
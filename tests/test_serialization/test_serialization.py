@@ -0,0 +1,115 @@
+"""
+Test request body serialization and the pre-serialized and gzip create_order paths
+"""
+import gzip
+import json
+import os
+
+import pytest
+import requests
+
+from newstore_connector import serialization
+from newstore_connector.order_injection import OrderInjectionV01
+from tests.stub_server import StubNewStoreServer
+
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             'test_order_injection', 'fixtures')
+
+
+def _load_fixture(name):
+    with open(os.path.join(FIXTURES_PATH, name), "r", encoding='utf-8') as file:
+        return json.load(file)
+
+
+def _accept_handler(method, path, body): # pylint: disable=unused-argument
+    return 200, {"id": "order-uuid"}
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_dumps_round_trips(monkeypatch, use_orjson):
+    """
+    Test that payloads serialize to compact UTF-8 JSON with and without orjson
+    """
+    if not use_orjson:
+        monkeypatch.setattr(serialization, "orjson", None)
+    payload = {"external_id": "ñ-1", "items": [{"price": 10.5}], "is_offline": False}
+
+    body = serialization.dumps(payload)
+
+    assert isinstance(body, bytes)
+    assert b' ' not in body
+    assert serialization.loads(body) == payload
+
+
+def test_encode_body_passes_serialized_payloads_through():
+    """
+    Test that bytes and str payloads are not serialized again
+    """
+    assert serialization.encode_body(b'{"a":1}') == (b'{"a":1}', None)
+    assert serialization.encode_body('{"a":1}') == (b'{"a":1}', None)
+
+
+def test_encode_body_compresses_above_threshold():
+    """
+    Test that only bodies of at least compress_threshold bytes are gzipped
+    """
+    payload = {"value": "x" * 1000}
+
+    small, small_encoding = serialization.encode_body(payload, compress_threshold=2000)
+    large, large_encoding = serialization.encode_body(payload, compress_threshold=1000)
+
+    assert small_encoding is None
+    assert large_encoding == 'gzip'
+    assert len(large) < len(small)
+    assert gzip.decompress(large) == small
+
+
+def test_create_order_sends_pre_serialized_bytes():
+    """
+    Test that a payload passed as bytes is validated and sent unchanged
+    """
+    body = json.dumps(_load_fixture("valid_order_payload.json")).encode('utf-8')
+
+    with StubNewStoreServer(_accept_handler) as server:
+        order_injection = OrderInjectionV01(base_url=server.base_url,
+                                            session=requests.Session(), headers={})
+        response = order_injection.create_order(payload=body, return_json=True)
+
+    assert response == {"id": "order-uuid"}
+    assert server.requests[0][2] == body
+
+
+def test_create_order_validates_pre_serialized_bytes():
+    """
+    Test that an invalid payload passed as bytes raises the validation errors
+    """
+    body = json.dumps(_load_fixture("invalid_order_payload.json")).encode('utf-8')
+    order_injection = OrderInjectionV01(base_url="http://127.0.0.1:9",
+                                        session=requests.Session(), headers={})
+
+    with pytest.raises(ValueError) as error:
+        order_injection.create_order(payload=body)
+
+    assert 'shipments' in error.value.args[0]
+
+
+def test_create_order_gzips_large_bodies():
+    """
+    Test that bodies above compress_threshold are sent gzipped with Content-Encoding
+    """
+    received = []
+
+    def handler(method, path, body): # pylint: disable=unused-argument
+        received.append(body)
+        return 200, {"id": "order-uuid"}
+
+    payload = _load_fixture("valid_order_payload.json")
+    with StubNewStoreServer(handler) as server:
+        order_injection = OrderInjectionV01(base_url=server.base_url,
+                                            session=requests.Session(), headers={},
+                                            compress_threshold=100)
+        response = order_injection.create_order(payload=payload)
+
+    assert response.request.headers['Content-Encoding'] == 'gzip'
+    assert response.request.headers['Content-Type'] == 'application/json'
+    assert json.loads(gzip.decompress(received[0])) == payload
@@ -0,0 +1,213 @@
+"""
+Test the TokenManager and FileTokenCache
+"""
+import os
+import time
+import tempfile
+import threading
+
+import pytest
+
+from newstore_connector import NewStoreConnector
+from newstore_connector.deadline import Deadline, DeadlineExceeded
+from newstore_connector.token_manager import TokenManager, FileTokenCache
+
+
+class _CountingFetcher:
+    """
+    Token fetcher returning numbered tokens
+    """
+
+    def __init__(self, expires_in=300, delay=0):
+        self.calls = 0
+        self.expires_in = expires_in
+        self.delay = delay
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+            calls = self.calls
+        time.sleep(self.delay)
+        return f"token-{calls}", self.expires_in
+
+
+def test_token_fetched_once_until_refresh_due():
+    """
+    Test that the token is reused until it is inside the refresh margin
+    """
+    fetcher = _CountingFetcher()
+    token_manager = TokenManager(fetcher, refresh_margin=60)
+
+    assert token_manager.get_token() == "token-1"
+    assert token_manager.get_token() == "token-1"
+    assert fetcher.calls == 1
+
+
+def test_token_refreshed_ahead_of_expiry():
+    """
+    Test that a token inside the refresh margin is refreshed before it expires
+    """
+    fetcher = _CountingFetcher()
+    token_manager = TokenManager(fetcher, refresh_margin=60)
+    token_manager.get_token()
+
+    # Move the token inside the refresh margin without expiring it
+    token_manager.refresh_at = time.time() - 1
+
+    assert token_manager.get_token() == "token-2"
+    assert not token_manager.is_expired()
+
+
+def test_failed_refresh_keeps_valid_token():
+    """
+    Test that a refresh failing while the token is still valid returns the
+    current token, and that a failure with an expired token is raised
+    """
+    fetcher = _CountingFetcher()
+    token_manager = TokenManager(fetcher, refresh_margin=60)
+    token_manager.get_token()
+
+    def failing_fetch():
+        raise ConnectionError("identity server down")
+
+    token_manager._fetch_token = failing_fetch # pylint: disable=protected-access
+    token_manager.refresh_at = time.time() - 1
+
+    assert token_manager.get_token() == "token-1"
+
+    token_manager.expires_at = time.time() - 1
+    with pytest.raises(ConnectionError):
+        token_manager.get_token()
+
+
+def test_concurrent_expiry_single_fetch():
+    """
+    Test that many threads seeing an expired token only cause one fetch
+    """
+    fetcher = _CountingFetcher(delay=0.05)
+    token_manager = TokenManager(fetcher)
+    tokens = []
+
+    threads = [threading.Thread(target=lambda: tokens.append(token_manager.get_token()))
+               for _ in range(64)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert fetcher.calls == 1
+    assert set(tokens) == {"token-1"}
+
+
+def test_external_token_not_refreshed():
+    """
+    Test that a token without an expiry is never refreshed
+    """
+    fetcher = _CountingFetcher()
+    token_manager = TokenManager(fetcher)
+    token_manager.set_token("external")
+
+    assert token_manager.get_token() == "external"
+    assert fetcher.calls == 0
+
+
+def test_file_token_cache_shared_between_managers(tmp_path):
+    """
+    Test that a second manager uses the token cached by the first
+    """
+    cache = FileTokenCache(str(tmp_path))
+    key = FileTokenCache.build_key("tenant", "iam:providers:read", "client")
+    first_fetcher = _CountingFetcher()
+    second_fetcher = _CountingFetcher()
+
+    first = TokenManager(first_fetcher, cache=cache, cache_key=key)
+    second = TokenManager(second_fetcher, cache=cache, cache_key=key)
+
+    assert first.get_token() == "token-1"
+    assert second.get_token() == "token-1"
+    assert second_fetcher.calls == 0
+
+
+def test_file_token_cache_ignores_expired_tokens(tmp_path):
+    """
+    Test that an expired cached token is refreshed
+    """
+    cache = FileTokenCache(str(tmp_path))
+    cache.set("key", "stale", time.time() - 10)
+    fetcher = _CountingFetcher()
+
+    token_manager = TokenManager(fetcher, cache=cache, cache_key="key")
+
+    assert token_manager.get_token() == "token-1"
+    assert cache.get("key")[0] == "token-1"
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="Requires user ids")
+@pytest.mark.parametrize("tamper", ["mode", "symlink"])
+def test_file_token_cache_refuses_unsafe_default_directory(tmp_path, monkeypatch, tamper):
+    """
+    Test that the default directory is refused if other users could read or
+    replace it
+    """
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    directory = tmp_path / f"newstore_connector_tokens_{os.getuid()}"
+    if tamper == "mode":
+        directory.mkdir(mode=0o700)
+        directory.chmod(0o777)
+    else:
+        (tmp_path / "elsewhere").mkdir(mode=0o700)
+        directory.symlink_to(tmp_path / "elsewhere")
+
+    with pytest.raises(ValueError) as error:
+        FileTokenCache()
+    assert "directory" in error.value.args[0]
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="Requires user ids")
+def test_file_token_cache_default_directory_is_private(tmp_path, monkeypatch):
+    """
+    Test that the default directory is created for the current user only
+    """
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+
+    cache = FileTokenCache()
+
+    assert cache.directory == str(tmp_path / f"newstore_connector_tokens_{os.getuid()}")
+    assert os.stat(cache.directory).st_mode & 0o777 == 0o700
+
+
+def test_file_token_cache_lock_wait_bounded_by_deadline(tmp_path):
+    """
+    Test that waiting for another process's lock on the token stops at the deadline
+    """
+    fcntl = pytest.importorskip("fcntl")
+    cache = FileTokenCache(str(tmp_path))
+    token_manager = TokenManager(lambda deadline=None: ("token", 300),
+                                 cache=cache, cache_key="key")
+
+    # flock locks of separate open files conflict, like those of two processes
+    lock_path = cache._path("key", "lock") # pylint: disable=protected-access
+    with open(lock_path, "a", encoding='utf-8') as other:
+        fcntl.flock(other, fcntl.LOCK_EX)
+        start = time.monotonic()
+        with pytest.raises(DeadlineExceeded) as error:
+            token_manager.get_token(Deadline(0.2))
+
+    assert error.value.phase == "token"
+    assert time.monotonic() - start < 2
+    assert token_manager.get_token(Deadline(1)) == "token"
+
+
+def test_connector_propagates_new_token():
+    """
+    Test that API classes created before a token change use the new token
+    """
+    ns_conn = NewStoreConnector(tenant="test", token="first")
+    order_notes = ns_conn.order_notes
+    order_injection = ns_conn.order_injection
+
+    ns_conn.token = "second"
+
+    assert order_notes.headers == {"Authorization": "Bearer second"}
+    assert order_injection.headers == {"Authorization": "Bearer second"}
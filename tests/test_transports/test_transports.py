@@ -0,0 +1,99 @@
+"""
+Test the transports sending the requests of the connector
+"""
+import json
+
+import pytest
+import requests
+
+from newstore_connector import NewStoreConnector
+from newstore_connector.transports import InMemoryTransport, CONNECTION_STATS
+from tests.stub_server import StubNewStoreServer
+
+
+def _handler(method, path, body): # pylint: disable=unused-argument
+    if path.startswith("/auth/"):
+        return 200, {"access_token": "abc", "expires_in": 300,
+                     "scope": "iam:providers:read"}
+    if "missing" in path:
+        return 404, {"message": "not found"}
+    return 200, {"notes": []}
+
+
+def test_in_memory_transport_sends_module_and_token_requests():
+    """
+    Test that the token and API Module requests go through the transport
+    """
+    transport = InMemoryTransport(_handler)
+    ns_conn = NewStoreConnector(tenant="test", client_id="id", client_secret="secret",
+                                transport=transport)
+
+    assert ns_conn.token == "abc"
+    assert ns_conn.order_notes.get_order_notes("A", return_json=True) == {"notes": []}
+    ns_conn.order_notes.create_order_note("A", text="Packed", tags=["t"])
+    with pytest.raises(requests.HTTPError):
+        ns_conn.order_notes.get_order_notes("missing")
+
+    assert transport.requests[0][:2] == ("POST", "/auth/realms/test/protocol/openid-connect/token")
+    assert [(method, path.split("/v0/d/")[1]) for method, path, _ in transport.requests[1:]] == [
+        ("GET", "orders/A/notes"),
+        ("POST", "orders/A/notes"),
+        ("GET", "orders/missing/notes")
+    ]
+    assert json.loads(transport.requests[2][2])['text'] == "Packed"
+
+
+def test_warm_up_and_stats_use_the_transport():
+    """
+    Test that warm_up and connection_stats ask the transport instead of the session
+    """
+    class WarmTransport(InMemoryTransport):
+        """
+        InMemoryTransport counting its warm ups
+        """
+        def __init__(self, handler):
+            super().__init__(handler)
+            self.warmed = []
+
+        def warm_up(self, url, connections=1):
+            self.warmed.append((url, connections))
+            return 1
+
+        def stats(self):
+            return dict(super().stats(), requests=len(self.requests))
+
+    transport = WarmTransport(_handler)
+    ns_conn = NewStoreConnector(tenant="test", client_id="id", client_secret="secret",
+                                transport=transport)
+
+    assert ns_conn.warm_up(connections=4) == 1
+    assert transport.warmed == [(ns_conn.base_url, 4)]
+    assert ns_conn.connection_stats() == dict(dict.fromkeys(CONNECTION_STATS, 0), requests=1)
+    assert not ns_conn.session.adapters["https://"].poolmanager.pools.keys()
+
+
+def test_http2_transport_retries_and_decodes():
+    """
+    Test that requests sent with HTTP2Transport are retried and decoded like
+    requests sent with the session
+    """
+    pytest.importorskip("h2")
+    from newstore_connector.transports import HTTP2Transport # pylint: disable=import-outside-toplevel
+
+    attempts = []
+
+    def handler(method, path, body): # pylint: disable=unused-argument
+        attempts.append(path)
+        if len(attempts) < 3:
+            return 503, {}
+        return 200, {"notes": [{"text": "Packed"}]}
+
+    server = StubNewStoreServer(handler)
+    with server, HTTP2Transport() as transport:
+        ns_conn = NewStoreConnector(tenant="test", token="token", transport=transport,
+                                    max_retries=3, backoff_factor=0)
+        ns_conn.order_notes.base_url = server.base_url
+        notes = ns_conn.order_notes.get_order_notes("A", return_json=True)
+
+    assert notes == {"notes": [{"text": "Packed"}]}
+    assert len(attempts) == 3